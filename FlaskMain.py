@@ -9,7 +9,8 @@ import uuid
 from collections import defaultdict
 from config.config import PORT
 from src.queryData import queryMaster
-from src.search_product import master
+from src.search_product import filter_new_listings
+from tool.asin_index import asin_index
 
 
 def setup_logging():
@@ -97,16 +98,25 @@ def get_status():
         "current_running": is_running
     })
 
+@app.route('/api/asin/seen', methods=['POST'])
+def asin_seen():
+    """查询本节点的已采集 asin 索引"""
+    task_data = request.get_json() or {}
+    if 'site' not in task_data or 'asins' not in task_data:
+        return jsonify({'error': '缺少重要参数'}), 400
+    # todo data: {asin: {'crawled_at', 'hash'}}，未采集的 asin 不返回
+    return jsonify({'status': 'success', 'data': asin_index.lookup(task_data['site'], task_data['asins'])})
+
 # 为每个国家创建独立的线程锁
 country_locks = defaultdict(threading.Lock)
 SUPPORTED_COUNTRIES = ['US', 'CN', 'DE', 'JP']
 
 def common_task_function(country_code, site, items):
-    """模拟耗时任务"""
+    """新品过滤 + 卖家精灵数据补全"""
     logger.info(f"[{country_code}] 任务开始执行")
-    newItems = master(site, items)
+    newItems, dropped = filter_new_listings(site, items)
     logger.info(f"[{country_code}] 任务执行完成")
-    return newItems
+    return newItems, dropped
 
 
 @app.route('/api/<country_code>/process', methods=['POST'])
@@ -130,8 +140,9 @@ def country_endpoint(country_code):
                 'status': 'busy',
                 'message': '缺少重要参数，请稍后重试'
             }), 423
-        result = common_task_function(country_code, task_data.get('site'), task_data.get('items', []))
-        return jsonify({'status': 'success', 'data': result})
+        result, dropped = common_task_function(country_code, task_data.get('site'), task_data.get('items', []))
+        # todo dropped: {asin: 被丢弃的阶段}
+        return jsonify({'status': 'success', 'data': result, 'dropped': dropped})
     finally:
         country_locks[country_code].release()
 
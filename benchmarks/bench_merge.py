@@ -0,0 +1,52 @@
+# todo merge_records 微基准: 嵌套循环 vs 哈希连接
+# 运行: python -m benchmarks.bench_merge
+import copy
+import random
+import time
+
+from tool.utils import merge_records
+
+
+def _nested_loop(left, right):
+    """原 merge_list_of_dicts 的嵌套循环实现"""
+    new_list = []
+    for item_left in left:
+        for item_right in right:
+            if item_left.get('asin') == item_right.get('asin'):
+                item_left.update({k: v for k, v in item_right.items() if v is not None})
+        new_list.append(item_left)
+    return new_list
+
+
+def _make_records(n, seed=0):
+    rnd = random.Random(seed)
+    asins = [f'B0{i:08d}' for i in range(n)]
+    left = [{'asin': a, 'image': f'https://img/{a}.jpg', 'rank': i + 1} for i, a in enumerate(asins)]
+    right = [{'asin': a, 'title': f'title {a}', 'rating': rnd.choice([None, '4,5']), 'reviewCount': '12'}
+             for a in rnd.sample(asins, int(n * 0.9))]
+    return left, right
+
+
+def _timeit(fn, left, right, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        l, r = copy.deepcopy(left), right
+        start = time.perf_counter()
+        fn(l, r)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes=(100, 500, 2000, 5000, 10000)):
+    print(f"{'n':>8} {'nested(ms)':>12} {'hash(ms)':>10} {'speedup':>9}")
+    for n in sizes:
+        left, right = _make_records(n)
+        # todo 结果一致性校验
+        assert _nested_loop(copy.deepcopy(left), right) == merge_records(copy.deepcopy(left), right)
+        nested = _timeit(_nested_loop, left, right, repeat=1 if n > 5000 else 3)
+        hashed = _timeit(merge_records, left, right)
+        print(f'{n:>8} {nested * 1000:>12.2f} {hashed * 1000:>10.2f} {nested / hashed:>8.0f}x')
+
+
+if __name__ == '__main__':
+    main()
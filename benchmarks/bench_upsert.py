@@ -0,0 +1,75 @@
+# todo MySQLPipeline.batch_upsert 基准: row (executemany) vs bulk (临时表 + 集合式合并)
+# 运行: python -m benchmarks.bench_upsert  (使用 config.db_config，会创建并删除 bench_upsert_* 表)
+#      python -m benchmarks.bench_upsert sqlite  (本地 SQLite，不需要 MySQL 服务器)
+import os
+import sys
+import tempfile
+import random
+import time
+
+from config.config import db_config
+from tool.pipeline import MySQLPipeline
+from tool.sqlite_pipeline import SQLitePipeline
+
+SCHEMA = {
+    "id": "INT AUTO_INCREMENT PRIMARY KEY",
+    "asin": "VARCHAR(20) NOT NULL UNIQUE",
+    "image": "VARCHAR(255)",
+    "`rank`": "INT",
+    "title": "VARCHAR(500)",
+    "rating": "DECIMAL(2,1)",
+    "reviewCount": "INT",
+    "current_price": "VARCHAR(20)",
+    "description": "TEXT",
+    "item": "TEXT",
+    "updated_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+}
+
+
+def _make_rows(n, seed=0):
+    rnd = random.Random(seed)
+    return [{
+        'asin': f'B0{i:08d}',
+        'image': f'https://m.media-amazon.com/images/I/{i:010d}.jpg',
+        'rank': i + 1,
+        'title': f'title {i} ' * 10,
+        'rating': rnd.choice([None, 4.5, 3.9]),
+        'reviewCount': rnd.randint(0, 20000),
+        'current_price': f'{rnd.uniform(5, 100):.2f}',
+        'description': rnd.choice([None, 'desc ' * 50]),
+        'item': '{"sellers": 3, "bsrList": []}',
+    } for i in range(n)]
+
+
+def _run(pipeline, table, rows, mode, batch_size):
+    pipeline.drop_table(table)
+    pipeline.create_table_if_not_exists(table, SCHEMA)
+    start = time.perf_counter()
+    # todo 第一遍插入，第二遍全部命中 ON DUPLICATE KEY UPDATE
+    pipeline.batch_upsert(table, rows, batch_size=batch_size, mode=mode)
+    pipeline.batch_upsert(table, rows, batch_size=batch_size, mode=mode)
+    elapsed = time.perf_counter() - start
+    checksum = pipeline.execute_query(f"SELECT COUNT(*) AS n, SUM(`rank`) AS r FROM {table}")[0]
+    pipeline.drop_table(table)
+    return elapsed, checksum
+
+
+def main(sizes=(1000, 10000, 50000), backend='mysql'):
+    if backend == 'sqlite':
+        pipeline = SQLitePipeline(os.path.join(tempfile.mkdtemp(), 'bench_upsert.db'))
+    else:
+        pipeline = MySQLPipeline(**db_config, pool_size=1)
+    try:
+        print(f"{'n':>8} {'row(rows/s)':>12} {'bulk(rows/s)':>13} {'speedup':>8}")
+        for n in sizes:
+            rows = _make_rows(n)
+            row_time, row_sum = _run(pipeline, 'bench_upsert_row', rows, 'row', 50)
+            bulk_time, bulk_sum = _run(pipeline, 'bench_upsert_bulk', rows, 'bulk', 5000)
+            assert row_sum == bulk_sum, (row_sum, bulk_sum)
+            print(f'{n:>8} {2 * n / row_time:>12.0f} {2 * n / bulk_time:>13.0f} {row_time / bulk_time:>7.1f}x')
+    finally:
+        pipeline.close()
+
+
+if __name__ == '__main__':
+    main(backend=sys.argv[1] if len(sys.argv) > 1 else 'mysql')
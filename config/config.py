@@ -15,4 +15,55 @@ flask_host = {
 }
 
 # todo flask 服务器端口号
-PORT = 8080
\ No newline at end of file
+PORT = 8080
+
+# todo 卖家精灵 competitor-lookup 本地缓存 (ttl 单位秒，0 为不使用缓存)
+sellersprite_cache = {
+    'path': 'data/cache/sellersprite.db',
+    'ttl': 24 * 3600,
+}
+
+# todo 已采集 asin 索引 (max_age 单位秒，近期采集过的 asin 可跳过)
+asin_index_config = {
+    'path': 'data/cache/asin_index.db',
+    'max_age': 7 * 24 * 3600,
+}
+
+# todo MySQL 存储方式: category 每个类目一张表 {cid}_{site}；consolidated 合并到按站点分区的 amazon_products
+storage_layout = 'category'
+
+# todo 存储后端: mysql 直接写 db_config；sqlite 写本地文件 (WAL)，sync 为 True 时后台同步到 db_config
+storage_backend = 'mysql'
+sqlite_config = {
+    'path': 'data/local/amazon_data.db',
+    'sync': False,
+    'sync_interval': 60,
+}
+
+# todo 类目整合断点续跑日志 (max_age 单位秒，超过后重新开始)
+checkpoint_config = {
+    'path': 'data/checkpoint',
+    'max_age': 3 * 24 * 3600,
+}
+
+# todo 历史采集 JSONL 文件索引 (python -m tool.dump_index)
+dump_index_config = {
+    'path': 'data/cache/dump_index.db',
+    'patterns': ['temp/selection/*.json', 'data/category_integration/*.json'],
+}
+
+# todo Excel 导出图片缩略图缓存 (size 为最长边像素)
+image_cache_config = {
+    'path': 'data/cache/images',
+    'size': 160,
+    'quality': 85,
+    'max_workers': 16,
+}
+
+# todo 翻译缓存 (百度翻译 qps 为账号的每秒请求上限，max_bytes 为每次请求的文本上限)
+translation_config = {
+    'path': 'data/cache/translation.db',
+    'qps': 1,
+    'max_bytes': 5000,
+    'max_workers': 4,
+}
@@ -1,6 +1,7 @@
 # todo 项目启动类
 
 import threading
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 import os
@@ -11,10 +12,10 @@ import requests
 from config.config import flask_host, PORT
 from src.amazon_listing_crawler import crawl_search_results
 from src.amazon_product_extractor import get_product_details
-from tool.pipeline import toJson
+from tool.pipeline import JsonlWriter
 from tool.utils import _fetch_category_data, ThreadSafeConstant, SeleniumPool, _get_marketId
 from src.amazon_category_integration_crawler import category_integration_master
-from src.amazon_selection_crawler import selection_master, selection_slave
+from src.amazon_selection_crawler import fetch_selection_pages, selection_slave
 
 
 def setup_logging():
@@ -144,7 +145,6 @@ def selection_core(cid, site):
         pageMax = 5
     else:
         pageMax = int(int(categoryItem.get('products')) // 100) + 1
-    items = []
     conf = {
         'site': site,
         'category_id': categoryItem.get('id'),
@@ -152,18 +152,36 @@ def selection_core(cid, site):
         'maxWeights': 960,
         'category_name': categoryItem.get('label').split(':')[-1],
     }
-    for i in (1, pageMax + 1):
-        conf['page'] = i
-        newItems = selection_master(conf, items)
-        # todo 合并数据
-        items.extend(newItems)
-
-    reItems = selection_slave(conf, pool, items)
-    pool.close_all()
-    # todo 调用存储管道
+    # todo 调用存储管道，每页处理完成后立即写入
     current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    path = f'temp\\selection\\amazon_{cid}_{site}_{current_time}.json'
-    toJson(reItems, os.path.join(os.getcwd(), path))
+    path = os.path.join(os.getcwd(), 'temp', 'selection', f'amazon_{cid}_{site}_{current_time}.json')
+    # todo 并发获取 1..pageMax 页，按 asin 去重；每页到达后立即开始补全与详情抓取
+    # todo 同时处理的页数不超过 workers，处理完一页才从数据流取下一页，数据流缓冲区满时停止请求新页面
+    workers = 2
+    with JsonlWriter(path, mode='w') as writer, ThreadPoolExecutor(max_workers=workers) as executor:
+        def write_result(future):
+            try:
+                # todo 写入数据 (按页顺序)
+                writer.write_many(future.result())
+            except Exception as e:
+                logger.error(f'选品数据处理失败: {e}')
+
+        futures = deque()
+        for newItems in fetch_selection_pages(conf, pageMax):
+            if not newItems:
+                continue
+            futures.append(executor.submit(selection_slave, conf, newItems, pool))
+            if len(futures) >= workers:
+                write_result(futures.popleft())
+        while futures:
+            write_result(futures.popleft())
+    pool.close_all()
+    # todo 导出 Parquet 供分析使用 (pyarrow 只在这里需要)
+    try:
+        from tool.parquet_export import export_jsonl
+        export_jsonl(writer.files)
+    except Exception as e:
+        logger.error(f'导出 Parquet 失败: {e}')
 
     # todo 计算时间差
     end_time = datetime.now()
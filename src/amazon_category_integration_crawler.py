@@ -1,6 +1,7 @@
 import logging
 import os
 import random
+from functools import partial
 import threading
 import time
 
@@ -9,14 +10,39 @@ from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from bs4 import BeautifulSoup
 
-from config.config import flask_host, PORT
+from config.config import flask_host, PORT, storage_layout
 from src.amazon_selection_crawler import crawl_item_info
 from src.search_product import master
-from tool.pipeline import MySQLPipeline, toJson
-from tool.utils import _get_site_url, merge_list_of_dicts, SeleniumPool, update_database_items
+from tool.checkpoint import RunJournal
+from tool.pipeline import create_storage, consolidated_table, consolidated_key
+from tool.rank_history import RankHistory
+from tool.sink import WriteBehindSink
+from tool.utils import _get_site_url, SeleniumPool
 
 logger = logging.getLogger(__name__)
 
+# 表结构定义
+product_schema = {
+    "id": "INT AUTO_INCREMENT PRIMARY KEY",
+    "asin": "VARCHAR(20) NOT NULL UNIQUE",
+    "image": "VARCHAR(255)",
+    "`rank`": "INT",
+    "title": "VARCHAR(500)",
+    "rating": "DECIMAL(2,1)",
+    "reviewCount": "INT",  # 保持一致
+    "current_price": "VARCHAR(20)",
+    "discount_percentage": "VARCHAR(20)",
+    "original_price": "VARCHAR(20)",
+    "material": "TEXT",
+    "description": "TEXT",
+    "similarList": "TEXT",
+    'aliexpress': "TEXT",
+    'item': "TEXT",
+    "created_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+    "updated_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP",
+    "INDEX idx_rank": "(`rank`)"
+}
+
 
 def category_integration_master(cid, site, m=True):
     """
@@ -29,13 +55,16 @@ def category_integration_master(cid, site, m=True):
     start_time = datetime.now()
 
     pool = SeleniumPool(pool_size=8, site=site)
+    # todo 断点日志: 同一 (cid, site) 未完成的运行从中断处继续
+    journal = RunJournal(cid, site)
 
     # todo 异步加载
-    items = []  # 处理完成的 items
+    items = journal.enriched_items  # 处理完成的 items
     batchItems = [] # 分批次处理 items
+    batchPages = [] # 当前批次的页码
     data_lock = threading.Lock()  # 保护结果列表
     stop_event = threading.Event()  # 用于通知所有线程停止
-    SAFE_CONST = ThreadSafeConstant(10)
+    SAFE_CONST = ThreadSafeConstant(journal.maxPage or 10)
     # todo 定义一个异步执行方法
     def process_batch_category(c, g, p):
         """
@@ -47,10 +76,14 @@ def category_integration_master(cid, site, m=True):
         try:
             if stop_event.is_set(): # todo 关键
                 return False
-            items_json = crawl_category_integration(c, g, p)
+            items_json = journal.page(g)
+            if items_json is None:
+                items_json = crawl_category_integration(c, g, p)
+                journal.record_page(g, items_json.get('items'), items_json.get('maxPage'))
             with data_lock:
                 pageItems = items_json.get('items')
                 batchItems.extend(pageItems)
+                batchPages.append(g)
                 maxPage = items_json.get('maxPage')
                 pageIndex = items_json.get('page')
                 if not maxPage is None:
@@ -64,7 +97,7 @@ def category_integration_master(cid, site, m=True):
 
     # todo 使用线程池控制并发数 (暂时只能一个 安全 线程)
     with ThreadPoolExecutor(max_workers=4) as executor:
-        page = 1    # 第一页开始
+        page = journal.next_page    # 第一个未补全的页开始
         batch_size = 4  # 每批4个线程
         while page <= 10000:
             if len(items) > 500:
@@ -75,8 +108,10 @@ def category_integration_master(cid, site, m=True):
                 if stop_event.is_set():
                     logger.info("已达到数据上限，停止提交新任务。")
                     break
+                cached = journal.page(page) is not None
                 futures.append(executor.submit(process_batch_category, cid, page, pool))
-                time.sleep(random.uniform(1,2)) # 时间间隔提交
+                if not cached:
+                    time.sleep(random.uniform(1,2)) # 时间间隔提交
                 page += 1
             if not futures:  # 如果没有任务可提交，退出循环
                 break
@@ -107,9 +142,12 @@ def category_integration_master(cid, site, m=True):
                     logger.info('处理完成！')
                 except Exception as e:
                     logger.error(f'请求数据失败 位置：{cid},页码{str(page)} {e}')
+            if resItems and batchPages:
+                journal.record_enriched(batchPages, resItems)
             if len(items) < 500:
-                items.extend(resItems)
+                items.extend(resItems or [])
                 batchItems = []
+                batchPages = []
                 continue
 
 
@@ -117,67 +155,38 @@ def category_integration_master(cid, site, m=True):
     # todo 数据去重 排序 重构
     ranked_items = process_and_rank_items(items)
 
-    # todo 获取详细数据
-    processed_data = crawl_item_info(ranked_items, pool, site)
-
-    # todo 更新items
-    reItems = merge_list_of_dicts(ranked_items, processed_data)
-
-    # todo 下沉
-    fileJSON = f"data\\category_integration\\{cid}_{site}.json"
-    toJson(reItems, os.path.join(os.getcwd(), fileJSON))
-
-    reItems = update_database_items(reItems)
-
-    # todo 释放浏览器
-    pool.close_all()
-
-    # todo 计算时间差
-    end_time = datetime.now()
-    time_diff = end_time - start_time
-    logger.info(f'类目 {cid} 综合数据抓取完成！总用时: {time_diff.total_seconds()} 秒')
-
-
-    # todo MySQL 转存
-    from config.config import db_config
-
-    # 表结构定义
-    product_schema = {
-        "id": "INT AUTO_INCREMENT PRIMARY KEY",
-        "asin": "VARCHAR(20) NOT NULL UNIQUE",
-        "image": "VARCHAR(255)",
-        "`rank`": "INT",
-        "title": "VARCHAR(500)",
-        "rating": "DECIMAL(2,1)",
-        "reviewCount": "INT",  # 保持一致
-        "current_price": "VARCHAR(20)",
-        "discount_percentage": "VARCHAR(20)",
-        "original_price": "VARCHAR(20)",
-        "material": "TEXT",
-        "description": "TEXT",
-        "similarList": "TEXT",
-        'aliexpress': "TEXT",
-        'item': "TEXT",
-        "created_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
-        "updated_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
-    }
-
-    # 使用管道
-    pipeline = MySQLPipeline(**db_config, pool_size=3)
-
+    # todo 获取详细数据，每个 asin 完成后由后台写入 JSONL 与 MySQL
+    fileJSON = os.path.join(os.getcwd(), 'data', 'category_integration', f'{cid}_{site}.json')
+    pipeline = create_storage(pool_size=3)
+    # todo 每批同时追加当天的排名快照 (产品表中的 rank 会被覆盖)
+    history = partial(RankHistory(pipeline).record, site, cid)
+    if storage_layout == 'consolidated':
+        pipeline.create_consolidated_table()
+        sink = WriteBehindSink(pipeline, consolidated_table, fileJSON,
+                               extra={'site': site, 'cid': cid}, key_columns=consolidated_key, on_batch=history)
+    else:
+        sink = WriteBehindSink(pipeline, f"{cid}_{site}", fileJSON, schema=product_schema, on_batch=history)
     try:
-        # 批量插入/更新数据
-        pipeline.batch_upsert(
-            table_name=f"{cid}_{site}",
-            data=reItems,
-            primary_key="asin",
-            batch_size=50,
-            schema=product_schema
-        )
+        crawl_item_info(ranked_items, pool, site, sink=sink, journal=journal)
+        # todo 先写完队列中的剩余数据，全部写入成功后才删除断点日志；有失败批次时保留，下次运行重新提交
+        sink.close()
+        if sink.stats()['failed'] == 0:
+            journal.complete()
+        else:
+            logger.error(f'类目 {cid} 有 {sink.stats()["failed"]} 条数据写入失败，保留断点日志 {journal.path}')
     finally:
+        journal.close()
+        # todo 写完剩余数据 (异常退出时)
+        sink.close()
         pipeline.close()
+        # todo 释放浏览器
+        pool.close_all()
 
-    return reItems
+    # todo 计算时间差
+    end_time = datetime.now()
+    time_diff = end_time - start_time
+    logger.info(f'类目 {cid} 综合数据抓取完成！总用时: {time_diff.total_seconds()} 秒，写入: {sink.stats()}')
+    return sink.stats()
 
 
 
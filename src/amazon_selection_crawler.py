@@ -1,28 +1,35 @@
 # todo 亚马逊选品爬虫
+import asyncio
 import json
 import logging
 import random
 import threading
 import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import Queue, Empty, Full
 
 from bs4 import BeautifulSoup
-from tool.SLC import login_sellersprite
+from tool.SLC import cookie_cache
 from src.amazon_product_extractor import processing_title, processing_image, processing_CustomerReviews, processingPrices, \
     processing_description
-from tool.keywords_amount_utils import export_token
-from tool.utils import _read_user, fetch_amazon_selection_data, fetch_amazon_detailed_data, _get_site_url, \
-    merge_list_of_dicts
+from tool.account_pool import account_pool
+from tool.asin_index import asin_index
+from tool.lookup_cache import lookup_cache
+from tool.token_manager import token_manager
+from tool.utils import fetch_amazon_selection_data, SellerSpriteRejected, fetch_amazon_detailed_data, _get_site_url, \
+    merge_list_of_dicts, SellerSpriteAccountUnavailable
 
 
 
 
 logger = logging.getLogger(__name__)
 
-def selection_master(conf: dict, reItems):
+def selection_master(conf: dict, reItems=None):
     """
+    获取一页卖家精灵选品数据
     :param conf: 配置文件
-    :param reItems: 重构的 items
+    :param reItems: 已采集的 asin 集合 (或 items 列表)，这些 asin 会被过滤
     :return:
     """
     # todo 1. 生成请求 params
@@ -54,55 +61,207 @@ def selection_master(conf: dict, reItems):
         'maxWeights': conf.get('maxWeights')
     }
 
-    # todo 2. 获取账号
-    user = _read_user()
-    cookie = None
-
-    # todo 3. 获取cookie
-    try:
-        cookie = login_sellersprite(user.get('username'), user.get('password'))
-    except Exception as e:
-        logger.error(f'登录 SellerSprite 失败: {e}')
-        selection_master(conf, reItems)
-
-    # todo 4. 获取响应数据
-    items = fetch_amazon_selection_data(cookie=cookie, params=params)
-    logger.info('获取选品数据完成, items 数量: {}'.format(len(items)))
+    # todo 2. 占用账号 (账号池限制每个账号的并发)
+    items = []
+    failed = set()  # 登录失败的账号
+    for _ in range(3):
+        try:
+            with account_pool.lease(exclude=failed) as user:
+                # todo 3. 获取cookie (复用缓存，接口拒绝时才重新登录，最多 3 次)
+                cookie = None
+                try:
+                    cookie = cookie_cache.get(user)
+                except Exception as e:
+                    logger.error(f'登录 SellerSprite 失败: {e}')
+                if not cookie:
+                    failed.add(user.get('username'))
+                    continue
+                # todo 4. 获取响应数据
+                try:
+                    items = fetch_amazon_selection_data(cookie=cookie, params=params, raise_on_reject=True)
+                    account_pool.record_request(user.get('username'))
+                    break
+                except SellerSpriteRejected as e:
+                    logger.warning(f'账号 {user.get("username")} cookie 被拒绝: {e}，重新登录')
+                    cookie_cache.invalidate(user.get('username'), cookie)
+        except Exception as e:
+            logger.error(f'获取卖家精灵账号失败: {e}')
+            break
+    logger.info('第 {} 页选品数据获取完成, items 数量: {}'.format(conf.get('page'), len(items)))
     if not items:
         return []
 
-    # todo 4.2 删除已经采集的数据
-    for item in items:
-        for reItem in reItems:
-            if item.get('asin') in reItem:
-                items.remove(item)
-
-    if not items:
-        return []
+    # todo 4.2 删除已经采集的数据 (asin 集合 O(1) 判断)
+    if reItems:
+        seen = reItems if isinstance(reItems, (set, frozenset)) else {i.get('asin') for i in reItems}
+        items = [item for item in items if item.get('asin') not in seen]
 
     return items
 
-def selection_slave(conf:dict, items, pool=None):
-    # todo 5. 获取 token
-    user = _read_user()
-    token = export_token(user.get('username'), user.get('password'))
 
-    # todo 6. 取 asins
-    asinList = []
-    for item in items:
-        asinList.append(item.get('asin'))
+class SelectionStream:
+    """
+    卖家精灵选品数据流
+
+    多个线程并发请求 1..pageMax 页，每页完成后立即交给消费方，
+    下游的去重、补全、详情抓取可以在后续页面还在请求时开始处理。
+    页面缓冲区有上限 (maxsize)，消费方处理不过来时生产线程阻塞，不再请求新页面。
+
+    使用示例:
+    for item in SelectionStream(conf, pageMax):
+        ...
+
+    async for item in SelectionStream(conf, pageMax):
+        ...
+    """
+
+    _DONE = object()
+
+    def __init__(self, conf: dict, pageMax: int, seen=None, max_workers=None, maxsize=2):
+        """
+        :param conf: 配置文件 (不含 page)
+        :param pageMax: 最大页码
+        :param seen: 已采集的 asin 集合，产出的 asin 会加入该集合
+        :param max_workers: 并发数，默认为健康账号数量
+        :param maxsize: 最多缓冲的页数
+        """
+        self.conf = conf
+        self.pageMax = pageMax
+        self.seen = set() if seen is None else seen
+        self.max_workers = max_workers
+        self._results = Queue(maxsize=maxsize)
+        self._pages = Queue()
+        self._closed = threading.Event()
+        self._workers = 0
+        self._finished = 0
+        self._buffer = deque()
+        self._started = False
+
+    def _start(self):
+        if self._started:
+            return
+        self._started = True
+        if self.pageMax < 1:
+            return
+        for page in range(1, self.pageMax + 1):
+            self._pages.put(page)
+        self._workers = min(self.max_workers or max(account_pool.healthy_count(), 1), self.pageMax)
+        for _ in range(self._workers):
+            threading.Thread(target=self._produce, daemon=True).start()
+
+    def _produce(self):
+        """生产线程: 逐页请求，缓冲区满时阻塞"""
+        try:
+            while not self._closed.is_set():
+                try:
+                    page = self._pages.get_nowait()
+                except Empty:
+                    break
+                try:
+                    pageItems = selection_master(dict(self.conf, page=page))
+                except Exception as e:
+                    logger.error(f'第 {page} 页选品数据获取失败: {e}')
+                    pageItems = []
+                self._put((page, pageItems))
+        finally:
+            self._put(self._DONE)
+
+    def _put(self, obj):
+        while not self._closed.is_set():
+            try:
+                self._results.put(obj, timeout=1)
+                return
+            except Full:
+                continue
+
+    def next_page(self):
+        """
+        阻塞获取下一页去重后的 items
+        :return: (page, items)，全部完成返回 None
+        """
+        self._start()
+        while self._finished < self._workers:
+            obj = self._results.get()
+            if obj is self._DONE:
+                self._finished += 1
+                continue
+            page, pageItems = obj
+            # todo 只在消费线程去重，seen 不需要加锁
+            newItems = []
+            for item in pageItems:
+                asin = item.get('asin')
+                if asin is None or asin in self.seen:
+                    continue
+                self.seen.add(asin)
+                newItems.append(item)
+            return page, newItems
+        return None
+
+    def pages(self):
+        """按页完成顺序产出 items 列表"""
+        while True:
+            result = self.next_page()
+            if result is None:
+                return
+            yield result[1]
+
+    def _next_item(self):
+        while not self._buffer:
+            result = self.next_page()
+            if result is None:
+                return self._DONE
+            self._buffer.extend(result[1])
+        return self._buffer.popleft()
+
+    def __iter__(self):
+        while True:
+            item = self._next_item()
+            if item is self._DONE:
+                return
+            yield item
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await asyncio.to_thread(self._next_item)
+        if item is self._DONE:
+            raise StopAsyncIteration
+        return item
+
+    def close(self):
+        """停止请求新页面"""
+        self._closed.set()
+
+
+def fetch_selection_pages(conf: dict, pageMax: int, seen=None, max_workers=None):
+    """
+    并发获取 1..pageMax 页选品数据，按页完成顺序逐批产出
+    :param conf: 配置文件 (不含 page)
+    :param pageMax: 最大页码
+    :param seen: 已采集的 asin 集合，产出的 asin 会加入该集合
+    :param max_workers: 并发数，默认为健康账号数量
+    :return: 生成器，每次产出一页去重后的 items
+    """
+    stream = SelectionStream(conf, pageMax, seen=seen, max_workers=max_workers)
+    try:
+        yield from stream.pages()
+    finally:
+        stream.close()
 
+
+def selection_slave(conf:dict, items, pool=None):
+    # todo 5. token 由账号池按批次分配
     if pool is None:
-        newItems = updataItems(items, asinList, token, conf, t=True)
+        newItems = enrich_items(items, conf.get('site'), t=True)
         return newItems
 
     # todo 7. 第一次更新 items
-    newItems = updataItems(items, asinList, token, conf, t=False)
+    newItems = enrich_items(items, conf.get('site'), t=False)
     logger.info('第一次更新 items 完成, newItems 数量: {}'.format(len(newItems)))
 
     # todo 8. 第二次更新 items
-    asinList = [i.get('asin') for i in newItems if i]
-    finalItems = updataItems(newItems, asinList, token, conf, t=True)
+    finalItems = enrich_items(newItems, conf.get('site'), t=True)
     logger.info('第二次更新 items 完成, finalItems 数量: {}'.format(len(finalItems)))
 
     processed_data = crawl_item_info(finalItems, pool, conf.get('site'))
@@ -119,12 +278,14 @@ def selection_slave(conf:dict, items, pool=None):
 
 
 
-def crawl_item_info(finalItems, pool , site):
+def crawl_item_info(finalItems, pool , site, sink=None, journal=None):
     """
     爬取商品详细信息
     :param finalItems:
     :param pool: selenium pool
     :param site:
+    :param sink: WriteBehindSink (可选)，每个 asin 完成后立即提交合并后的 item
+    :param journal: RunJournal (可选)，记录已完成的 asin，断点续跑时跳过
     :return:
     """
     # todo 9.1 定义 cookies 变量
@@ -134,6 +295,18 @@ def crawl_item_info(finalItems, pool , site):
     # todo 9.3 定义数据 存储列表
     processed_data = []
     data_lock = threading.Lock()  # 保护结果列表
+    itemMap = {item.get('asin'): item for item in finalItems if item.get('asin') is not None}
+    pending = set(itemMap) if sink is not None else set()
+    done = {}
+    if journal is not None:
+        # todo 断点续跑: 上次已完成的 asin 不再采集，重新提交一次 (upsert 幂等，防止上次未写完一批)
+        done = {asin: item for asin, item in journal.details.items() if asin in itemMap}
+        for asin, item in done.items():
+            pending.discard(asin)
+            if sink is not None:
+                sink.put(item)
+        if done:
+            logger.info(f'断点续跑: 跳过已采集详情 {len(done)} 个')
 
     # todo 9.4 定义一个异步执行方法
     def process_batch(a, i, s, p):
@@ -167,6 +340,14 @@ def crawl_item_info(finalItems, pool , site):
                 product_data['aliexpress'] = json.dumps(productJSON.get('aliexpress'))
                 # todo 存储数据
                 processed_data.append(product_data)
+                pending.discard(a)
+            if sink is not None:
+                # todo 合并规则与 merge_list_of_dicts 一致，队列满时在锁外阻塞
+                merged = dict(itemMap[a])
+                merged.update({k: v for k, v in product_data.items() if v is not None})
+                sink.put(merged)
+                if journal is not None:
+                    journal.record_detail(a, merged)
             return {
                 'asin': a,
                 'm': 'success',
@@ -175,12 +356,12 @@ def crawl_item_info(finalItems, pool , site):
             logger.error(f"处理 {a} 失败: {e}")
             raise  # 重新抛出异常以便主线程捕获
 
-    # todo 9.5 使用线程池控制并发数
+    # todo 9.5 使用线程池控制并发数，未采集 / 最久未采集的 asin 优先
     with ThreadPoolExecutor(max_workers=5) as executor:
         # 提交所有任务
         futures = []
-        for item in finalItems:
-            if item.get('asin') is not None:
+        for item in asin_index.prioritize(site, finalItems):
+            if item.get('asin') is not None and item.get('asin') not in done:
                 imageUrl = item.get('image')
                 if imageUrl is None:
                     imageUrl = item.get('imageUrl')
@@ -193,6 +374,16 @@ def crawl_item_info(finalItems, pool , site):
                 future.result()  # 获取结果（会抛出线程中的异常）
             except Exception as e:
                 logger.error(f"任务执行出错: {e}")
+    # todo 9.6 未取得详情的 item 也要写入
+    if sink is not None:
+        for asin in pending:
+            sink.put(itemMap[asin])
+    # todo 9.7 记录已采集 asin
+    try:
+        changed = asin_index.mark(site, processed_data)
+        logger.info(f'详情采集完成 {len(processed_data)} 个，内容有变化 {len(changed)} 个')
+    except Exception as e:
+        logger.error(f'记录 asin 索引失败: {e}')
     return processed_data
 
 
@@ -226,49 +417,91 @@ def deconstruct_pageSource(pageSource, asin):
 
 
 
-def updataItems(items, asinList, token, conf, t):
-    asinList = asinList
-    newItems = []
-    token = token
-    # todo 1. 循环筛选数据
-    while True:
-        asins = ','.join([asin for asin in asinList[0:101] if asin is not None])
-        if len(asinList) < 100:
-            asins = ','.join([asin for asin in asinList[0:len(asinList)+1] if asin is not None])
-        # todo 2. 获取数据
-        dataJson = fetch_amazon_detailed_data(token=token, asins=asins, site=conf.get('site'), t=t)
-        if dataJson.get('message'):
+def enrich_items(items, site, t=False, asins=None, chunk_size=100, max_retries=2, max_workers=None):
+    """
+    卖家精灵 competitor-lookup 并发批量补全 items
+    asin 按 chunk_size 分批，多账号并发请求，结果按 asin 索引合并
+    未返回数据的 asin 重新排队，最多重试 max_retries 轮
+    :param items: 待补全的 items
+    :param site: 站点
+    :param t: 是否为 quick-view 接口 默认否
+    :param asins: 需要补全的 asin，默认 items 中全部 asin
+    :param chunk_size: 每次请求的 asin 数量
+    :param max_retries: 缺失 asin 的重试轮数
+    :param max_workers: 并发数，默认为健康账号数量
+    :return: 补全成功的 items (非空字段覆盖原值，未匹配的 item 不返回)
+    """
+    # todo 1. asin 索引，重复 asin 只更新第一个 item
+    index = {}
+    for item in items:
+        asin = item.get('asin')
+        if asin is not None:
+            index.setdefault(asin, item)
+    if asins is None:
+        asins = list(index)
+    order = list(dict.fromkeys(a for a in asins if a in index))
+    matched = set()
+    pending = order
+    workers = max_workers or max(account_pool.healthy_count(), 1)
+
+    for attempt in range(max_retries + 1):
+        if not pending:
             break
-        token = dataJson.get('token')
-        new_datas = dataJson.get('data')
-        for data in new_datas:
-            for item in items:
-                if data.get('asin') == item.get('asin'):
+        # todo 2. 分批并发请求
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            futures = [executor.submit(_lookup_chunk, chunk, site, t) for chunk in chunks]
+            # todo 3. 合并结果 (只在当前线程写 items，不需要加锁)
+            for future in as_completed(futures):
+                try:
+                    datas = future.result()
+                except Exception as e:
+                    logger.error(f'批量请求 asin 数据失败: {e}')
+                    continue
+                for data in datas:
+                    asin = data.get('asin')
+                    item = index.get(asin)
+                    if item is None or asin in matched:
+                        continue
                     item.update({k: v for k, v in data.items() if v})
-                    newItems.append(item)
-                    # todo 3. 关键 删除 asinList 中已处理的 asin
-                    asinList.remove(item.get('asin'))
-                    break
-        if not asinList:
-            break
+                    matched.add(asin)
+        # todo 4. 缺失的 asin 重新排队
+        pending = [a for a in pending if a not in matched]
+        if pending and attempt < max_retries:
+            logger.warning(f'{len(pending)} 个 asin 未返回数据，第 {attempt + 1} 次重新请求')
 
-    # todo 4. 处理未完成的 asin
-    # if asinList:
-    #     for a in asinList:
-    #         dataJson = fetch_amazon_detailed_data(token=token, asins=a, site=conf.get('site'), t=t)
-    #         time.sleep(random.uniform(2,5))
-    #         if dataJson.get('message'):
-    #             continue
-    #         token = dataJson.get('token')
-    #         try:
-    #             new_data = dataJson.get('data')[0]
-    #             for item in items:
-    #                 if new_data.get('asin') == item.get('asin'):
-    #                     item.update(new_data)
-    #                     newItems.append(item)
-    #                     break
-    #         except Exception as e:
-    #             logger.error(f"获取 {a} 单个商品数据失败: {e}")
-    #             continue
-
-    return newItems
+    if pending:
+        logger.warning(f'{len(pending)} 个 asin 多次请求仍无数据: {",".join(pending[:20])}')
+    return [index[a] for a in order if a in matched]
+
+
+def _lookup_chunk(asins, site, t):
+    """
+    占用一个账号请求一批 asin
+    :param asins: asin 列表
+    :param site: 站点
+    :param t: 是否为 quick-view 接口
+    :return: 接口返回的数据列表
+    """
+    # todo 先查本地缓存，全部命中时不占用账号、不获取令牌
+    cached = lookup_cache.get_many(site, 'quick-view' if t else 'competitor-lookup', asins)
+    misses = [a for a in asins if a not in cached]
+    if not misses:
+        return list(cached.values())
+    # todo 账号被限流或配额用完时归还账号，换一个账号重新占用 (最多 3 个账号)
+    excluded = set()
+    for _ in range(3):
+        with account_pool.lease(exclude=excluded) as user:
+            token = token_manager.get_token(user)
+            try:
+                dataJson = fetch_amazon_detailed_data(token=token, asins=','.join(misses), site=site, t=t)
+                break
+            except SellerSpriteAccountUnavailable as e:
+                logger.warning(f'{e}，切换账号')
+                excluded.add(e.username or user.get('username'))
+    else:
+        raise Exception(f'{len(misses)} 个 asin 连续 3 个账号不可用')
+    # todo 请求失败时仍返回缓存命中的数据，缺失的 asin 由调用方重新排队
+    if dataJson.get('message') and not dataJson.get('data') and not cached:
+        raise Exception(dataJson.get('message'))
+    return list(cached.values()) + (dataJson.get('data') or [])
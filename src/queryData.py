@@ -4,10 +4,12 @@ import os
 import pymysql
 import json
 from datetime import datetime, date
-from config.config import db_config
+from config.config import db_config, storage_layout, storage_backend, sqlite_config
 from src.amazon_selection_crawler import selection_slave
 from tool.JSONToExcel import AmazonExcelExporter
-from tool.pipeline import toJson
+from tool.pipeline import JsonlWriter, consolidated_table
+from tool.records import ProductRecord
+from tool.sqlite_pipeline import iter_query
 
 logger = logging.getLogger(__name__)
 
@@ -18,27 +20,21 @@ def queryMaster(cid, site):
     :param site:
     :return:
     """
-
-    json_data = query_data_to_json_list(
-        host=db_config.get('host'),
-        user=db_config.get('user'),
-        password=db_config.get('password'),
-        database=db_config.get('database'),
-        table_name=f'{cid}_{site}'
-    )
     conf = {
         'cid': cid,
         'site': site,
     }
-    results = [data.updata(data.get('item')).pop('item') for data in json_data]
-    items = selection_slave(conf, results)
-
     # todo 下沉 文件
-    fileJSON = os.path.join(os.getcwd(), f'temp\\cn\\{cid}_{site}.json')
-    toJson(items, fileJSON, wb="w")
+    fileJSON = os.path.join(os.getcwd(), 'temp', 'cn', f'{cid}_{site}.json')
+
+    # todo 按批读取，每批读到后立即补全并写入文件，全部完成后原子替换旧文件
+    with JsonlWriter(fileJSON, mode="w") as writer:
+        for rows in iter_best_rows(cid, site, **db_config):
+            results = [ProductRecord.from_mysql_row(row).to_item() for row in rows]
+            writer.write_many(selection_slave(conf, results))
 
     # try:
-    #     filename = os.path.join(os.getcwd(), f'temp\\cn\\{cid}_{site}.xlsx')
+    #     filename = os.path.join(os.getcwd(), 'temp', 'cn', f'{cid}_{site}.xlsx')
     #     ex = AmazonExcelExporter(filename=filename)
     #     ex.create_worksheet("产品数据")
     #     for item in items:
@@ -50,17 +46,61 @@ def queryMaster(cid, site):
     #     logger.error(f'转存成 excel 失败！{e}')
 
 
+def _better(row, best):
+    """同一 rank 内: description 不为 NULL 的优先，其次更新时间最早的"""
+    def key(r):
+        updated_at = r.get('updated_at')
+        return r.get('description') is None, updated_at is not None, updated_at or 0
+    return key(row) < key(best)
 
-def query_data_to_json_list(host, user, password, database, table_name):
+
+def _processed(row):
+    """日期转换为字符串"""
+    return {k: v.isoformat() if isinstance(v, (datetime, date)) else v for k, v in row.items()}
+
+
+def _best_per_rank(rows, batch_size):
+    """rows 已按 rank 排序，边读边选出每个 rank 的最佳记录，按批返回"""
+    batch, best = [], None
+    for row in rows:
+        if best is not None and row.get('rank') != best.get('rank'):
+            batch.append(_processed(best))
+            best = None
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if best is None or _better(row, best):
+            best = row
+    if best is not None:
+        batch.append(_processed(best))
+    if batch:
+        yield batch
+
+
+def iter_best_rows(cid, site, host, user, password, database, port=3306, batch_size=200, **kwargs):
     """
-    查询数据库表并按条件转换为JSON list
+    流式读取类目数据，每个 rank 只保留一条，按 rank 升序分批返回
+
+    只读，不执行 DDL；旧分表缺少 `rank` 索引时运行 MySQLPipeline.add_rank_indexes 补建
+    使用服务端游标 (SSDictCursor) 按 `rank` 索引顺序读取，相同 rank 的行相邻，
+    边读边选出每个 rank 的最佳记录，不需要窗口函数和 fetchall，内存占用与表大小无关；
+    storage_backend 为 sqlite 时读取本地库
     参数:
-        host: 数据库主机
-        user: 用户名
-        password: 密码
-        database: 数据库名
-        table_name: 表名
+        cid: 类目ID
+        site: 站点
+        batch_size: 每批条数
+    返回:
+        生成器，每次返回一批 dict
     """
+    if storage_layout == 'consolidated':
+        table_name, where, params = consolidated_table, " WHERE site = %s AND cid = %s", (site, cid)
+    else:
+        table_name, where, params = f'{cid}_{site}', "", ()
+    if storage_backend == 'sqlite':
+        # todo 本地 SQLite 存储，表名需要加引号
+        rows = iter_query(sqlite_config['path'], f'SELECT * FROM "{table_name}"{where} ORDER BY "rank" ASC', params)
+        yield from _best_per_rank(rows, batch_size)
+        return
     connection = None
     try:
         connection = pymysql.connect(
@@ -68,51 +108,38 @@ def query_data_to_json_list(host, user, password, database, table_name):
             user=user,
             password=password,
             database=database,
+            port=port,
             charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
+            cursorclass=pymysql.cursors.SSDictCursor
         )
 
         with connection.cursor() as cursor:
-            # 使用更简单的查询，避免字段名冲突
-            sql = f"""
-                WITH RankedData AS (
-                    SELECT 
-                    *,
-                    -- 主排序：按 rank 升序
-                    -- 组内次级排序：优先取 description 不为 NULL 的记录（标志为0）
-                    -- 组内最终排序：按更新时间取最早的一条
-                    ROW_NUMBER() OVER (
-                        PARTITION BY `rank` 
-                        ORDER BY 
-                        CASE WHEN description IS NOT NULL THEN 0 ELSE 1 END ASC,
-                        COALESCE(updated_at, '1970-01-01') ASC
-                    ) AS rn
-                    FROM {table_name}
-                )
-                SELECT 
-                *
-                FROM RankedData
-                WHERE rn = 1
-                ORDER BY `rank` ASC; -- 最终结果再按 rank 排序以确保整体顺序
-                """
-            cursor.execute(sql)
-            results = cursor.fetchall()
-
-            json_list = []
-            for row in results:
-                processed_row = {}
-                for key, value in row.items():
-                    if isinstance(value, (datetime, date)):
-                        processed_row[key] = value.isoformat()
-                    else:
-                        processed_row[key] = value
-                json_list.append(processed_row)
-
-            return json_list
+            # todo 批次之间会执行补全，放宽服务端等待客户端读取的超时
+            cursor.execute("SET SESSION net_write_timeout = 3600")
+            cursor.execute(f"SELECT * FROM {table_name}{where} ORDER BY `rank` ASC", params)
+            yield from _best_per_rank(cursor, batch_size)
 
     except pymysql.Error as e:
+        # todo 可能已经返回了部分批次，向上抛出，调用方不能把不完整的结果当作完整结果
         logger.error(f"数据库查询错误: {e}")
-        return []
+        raise
     finally:
         if connection:
             connection.close()
+
+
+def query_data_to_json_list(host, user, password, database, table_name):
+    """
+    查询数据库表并按条件转换为JSON list
+    参数:
+        host: 数据库主机
+        user: 用户名
+        password: 密码
+        database: 数据库名
+        table_name: 表名 ({cid}_{site})
+    """
+    cid, site = table_name.rsplit('_', 1)
+    json_list = []
+    for rows in iter_best_rows(cid, site, host=host, user=user, password=password, database=database):
+        json_list.extend(rows)
+    return json_list
@@ -1,37 +1,125 @@
 import logging
+from datetime import datetime
 
-from src.amazon_selection_crawler import updataItems
-from tool.keywords_amount_utils import export_token
-from tool.utils import _read_user
+from src.amazon_selection_crawler import enrich_items
 
 logger = logging.getLogger(__name__)
 
-def master(site, items):
+# todo 过滤阶段: 搜索页提示 -> quick-view -> competitor-lookup
+STAGE_SEARCH = 'search'
+STAGE_QUICK_VIEW = 'quick-view'
+STAGE_LOOKUP = 'competitor-lookup'
+STAGE_NO_DATA = 'no-data'
+
+
+class ListingFilter:
     """
-    :param site:
-    :param items:
-    :return:
+    新品过滤条件 (上架天数 < max_days)
+
+    尽早在便宜的数据上判断，只对通过或无法判断的 asin 请求完整 competitor-lookup:
+    - search: 上游已带 available_days / availableDays / available / availableDate 时判断 (亚马逊搜索页本身没有这些字段)
+    - quick-view: 卖家精灵 quick-view 接口，返回 availableDate 时才能判断
+    - competitor-lookup: 完整数据 (availableDate)
     """
-    # todo 5. 获取 token
-    user = _read_user()
-    token = export_token(user.get('username'), user.get('password'))
-
-    # todo 6. 取 asins
-    asinList = []
-    for item in items:
-        asinList.append(item.get('asin'))
-    conf = {'site':site}
-    newItems = updataItems(items, asinList, token, conf, t=False)
-    results = []
-    for item in newItems:
+
+    def __init__(self, max_days=183, quick_view=False):
+        """
+        :param max_days: 上架天数上限 (不含)
+        :param quick_view: 是否先用 quick-view 数据过滤，默认否
+                           (未确认 quick-view 返回上架日期，开启后无法判断的 asin 会多一次 quick-view 请求)
+        """
+        self.max_days = max_days
+        self.quick_view = quick_view
+
+    @staticmethod
+    def listing_days(item):
+        """
+        从已有字段推算上架天数
+        :return: 天数，字段缺失返回 None
+        """
+        for key in ('available_days', 'availableDays'):
+            days = item.get(key)
+            if days is not None and days != '':
+                return int(days)
+        for key in ('available', 'availableDate'):
+            timestamp = item.get(key)
+            if timestamp:
+                return (datetime.now() - datetime.fromtimestamp(int(timestamp) / 1000)).days
+        return None
+
+    def evaluate(self, item):
+        """
+        :return: True 保留 / False 丢弃 / None 无法判断
+        """
         try:
-            days = item.get('available_days')
-            if int(days) < 183:
-                results.append(item)
+            days = self.listing_days(item)
         except Exception as e:
-            logger.error(f'日期错误 {e}')
+            logger.error(f'日期错误 {item.get("asin")}: {e}')
+            return None
+        if days is None:
+            return None
+        return days < self.max_days
 
-    return results
+    def apply(self, items, stage, dropped, final=False):
+        """
+        按当前阶段已有的数据过滤
+        :param items: items
+        :param stage: 阶段名
+        :param dropped: {asin: stage} 记录被丢弃的 asin
+        :param final: 最后阶段，无法判断的 item 也丢弃
+        :return: 保留 (含无法判断) 的 items
+        """
+        kept = []
+        for item in items:
+            keep = self.evaluate(item)
+            if keep is False or (keep is None and final):
+                dropped[item.get('asin')] = stage
+            else:
+                kept.append(item)
+        return kept
 
 
+def filter_new_listings(site, items, spec=None):
+    """
+    过滤新品并补全卖家精灵数据，过滤条件尽量在便宜的阶段执行
+    :param site: 站点
+    :param items: 搜索页 items
+    :param spec: ListingFilter，默认上架 183 天内
+    :return: (results, dropped) dropped 为 {asin: 丢弃阶段}
+    """
+    spec = spec or ListingFilter()
+    dropped = {}
 
+    # todo 1. 搜索页已有字段
+    candidates = spec.apply(items, STAGE_SEARCH, dropped)
+
+    # todo 2. quick-view 数据，只对无法判断的 asin 请求 (需显式开启)
+    if spec.quick_view:
+        undecided = [item for item in candidates if spec.evaluate(item) is None]
+        if undecided:
+            enrich_items(undecided, site, t=True)
+            candidates = spec.apply(candidates, STAGE_QUICK_VIEW, dropped)
+
+    # todo 3. 只对剩余 asin 请求完整 competitor-lookup (账号与 token 由账号池分配)
+    newItems = enrich_items(candidates, site, t=False)
+    matched = {item.get('asin') for item in newItems}
+    for item in candidates:
+        if item.get('asin') not in matched:
+            dropped[item.get('asin')] = STAGE_NO_DATA
+    results = spec.apply(newItems, STAGE_LOOKUP, dropped, final=True)
+
+    stages = {}
+    for stage in dropped.values():
+        stages[stage] = stages.get(stage, 0) + 1
+    logger.info(f'新品过滤完成: 输入 {len(items)}，保留 {len(results)}，丢弃 {stages}')
+    return results, dropped
+
+
+def master(site, items):
+    """
+    :param site:
+    :param items:
+    :return:
+    """
+    results, _ = filter_new_listings(site, items)
+    return results
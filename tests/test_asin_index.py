@@ -0,0 +1,89 @@
+# todo BloomFilter / AsinIndex 测试
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from tool.asin_index import AsinIndex, BloomFilter
+
+
+class BloomFilterTest(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(bits=1 << 16, hashes=5)
+        keys = [f'US:B0{i:08d}' for i in range(2000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(bits=1 << 16, hashes=5)
+        for i in range(2000):
+            bloom.add(f'US:B0{i:08d}')
+        false_positives = sum(f'DE:B0{i:08d}' in bloom for i in range(10000))
+        self.assertLess(false_positives / 10000, 0.01)
+
+
+class AsinIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'seen.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_mark_and_lookup(self):
+        index = AsinIndex(self.path, bloom_bits=1 << 16)
+        try:
+            self.assertFalse(index.might_contain('US', 'A'))
+            self.assertEqual(index.mark('US', [{'asin': 'A', 'price': 1}, {'asin': 'B'}, {'title': 'no asin'}]),
+                             ['A', 'B'])
+            self.assertTrue(index.might_contain('US', 'A'))
+            self.assertFalse(index.might_contain('DE', 'A'))
+            self.assertEqual(set(index.lookup('US', ['A', 'B', 'C'])), {'A', 'B'})
+            self.assertEqual(index.lookup('DE', ['A']), {})
+            # todo 内容未变化的 asin 不返回
+            self.assertEqual(index.mark('US', [{'asin': 'A', 'price': 1}, {'asin': 'B', 'price': 2}]), ['B'])
+        finally:
+            index.close()
+
+    def test_bloom_reloaded_from_disk(self):
+        index = AsinIndex(self.path, bloom_bits=1 << 16)
+        index.mark('US', [{'asin': 'A'}])
+        index.close()
+        index = AsinIndex(self.path, bloom_bits=1 << 16)
+        try:
+            self.assertTrue(index.might_contain('US', 'A'))
+            self.assertIn('A', index.lookup('US', ['A']))
+        finally:
+            index.close()
+
+    def test_filter_unseen_and_prioritize(self):
+        index = AsinIndex(self.path, bloom_bits=1 << 16, max_age=3600)
+        try:
+            index.mark('US', [{'asin': 'A'}])
+            items = [{'asin': 'A'}, {'asin': 'B'}]
+            self.assertEqual(index.filter_unseen('US', items), [{'asin': 'B'}])
+            self.assertEqual(index.filter_unseen('US', items, max_age=0), items)
+            self.assertEqual(index.prioritize('US', items), [{'asin': 'B'}, {'asin': 'A'}])
+        finally:
+            index.close()
+
+    def test_lookup_many(self):
+        """超过 SQLite 变量上限时分批查询"""
+        index = AsinIndex(self.path, bloom_bits=1 << 16)
+        try:
+            items = [{'asin': f'B0{i:08d}'} for i in range(1200)]
+            index.mark('US', items)
+            before = time.time()
+            result = index.lookup('US', [item['asin'] for item in items])
+            self.assertEqual(len(result), 1200)
+            self.assertTrue(all(row['crawled_at'] <= before for row in result.values()))
+        finally:
+            index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# todo RunJournal 测试 (回放、损坏的最后一行、过期、完成后删除)
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from tool.checkpoint import RunJournal
+
+
+class RunJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _journal(self, max_age=0):
+        return RunJournal('123', 'US', directory=self.dir, max_age=max_age)
+
+    def _fill(self):
+        journal = self._journal()
+        journal.record_page(1, [{'asin': 'A'}], maxPage=3)
+        journal.record_page(2, [{'asin': 'B'}])
+        journal.record_enriched([2, 1], [{'asin': 'A', 'units': 1}, {'asin': 'B', 'units': 2}])
+        journal.record_detail('A', {'asin': 'A', 'title': 'a'})
+        journal.close()
+        return journal.path
+
+    def test_new_run(self):
+        journal = self._journal()
+        try:
+            self.assertFalse(journal.resumed)
+            self.assertIsNone(journal.page(1))
+            self.assertEqual(journal.next_page, 1)
+            self.assertEqual(journal.enriched_items, [])
+        finally:
+            journal.close()
+
+    def test_replay(self):
+        self._fill()
+        journal = self._journal()
+        try:
+            self.assertTrue(journal.resumed)
+            self.assertEqual(journal.page(1), {'items': [{'asin': 'A'}], 'page': 1, 'maxPage': 3})
+            self.assertEqual(journal.maxPage, 3)
+            self.assertEqual(journal.next_page, 3)
+            self.assertEqual(journal.enriched_items, [{'asin': 'A', 'units': 1}, {'asin': 'B', 'units': 2}])
+            self.assertEqual(journal.details, {'A': {'asin': 'A', 'title': 'a'}})
+        finally:
+            journal.close()
+
+    def test_torn_last_line(self):
+        """最后一行写入中断: 回放时跳过并截掉，后续记录不会与其拼在一起"""
+        path = self._fill()
+        size = os.path.getsize(path)
+        with open(path, 'ab') as f:
+            f.write(b'{"e": "detail", "asin": "B", "it')
+        journal = self._journal()
+        try:
+            self.assertTrue(journal.resumed)
+            self.assertEqual(os.path.getsize(path), size)
+            self.assertEqual(set(journal.details), {'A'})
+            journal.record_detail('C', {'asin': 'C'})
+        finally:
+            journal.close()
+        journal = self._journal()
+        try:
+            self.assertEqual(set(journal.details), {'A', 'C'})
+        finally:
+            journal.close()
+
+    def test_last_line_without_newline(self):
+        """完整的 JSON 但缺少换行: 记录有效，但会被截掉以免与下一条拼接"""
+        path = self._fill()
+        with open(path, 'ab') as f:
+            f.write(b'{"e": "detail", "asin": "B", "item": {"asin": "B"}}')
+        journal = self._journal()
+        try:
+            journal.record_detail('C', {'asin': 'C'})
+        finally:
+            journal.close()
+        journal = self._journal()
+        try:
+            self.assertIn('C', journal.details)
+        finally:
+            journal.close()
+
+    def test_expired(self):
+        path = self._fill()
+        old = time.time() - 3600
+        os.utime(path, (old, old))
+        journal = self._journal(max_age=60)
+        try:
+            self.assertFalse(journal.resumed)
+            self.assertIsNone(journal.page(1))
+        finally:
+            journal.close()
+
+    def test_complete_removes_journal(self):
+        path = self._fill()
+        journal = self._journal()
+        journal.complete()
+        self.assertFalse(os.path.exists(path))
+        journal.close()  # todo 可重复关闭
+
+
+if __name__ == '__main__':
+    unittest.main()
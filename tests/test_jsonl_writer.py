@@ -0,0 +1,92 @@
+# todo JsonlWriter 测试 (缓冲、轮转、.part 原子重命名、出错时放弃)
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tool.pipeline import JsonlWriter
+
+
+def read_lines(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class JsonlWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'out', 'items.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_write_mode_uses_part_file(self):
+        """w 模式写入 .part，close 后才替换目标文件"""
+        with open(os.path.join(self.dir, 'old.json'), 'w') as f:
+            f.write('{"asin": "OLD"}\n')
+        path = os.path.join(self.dir, 'old.json')
+        writer = JsonlWriter(path, mode='w', buffer_size=1)
+        writer.write({'asin': 'A'})
+        self.assertTrue(os.path.exists(path + '.part'))
+        self.assertEqual(read_lines(path), [{'asin': 'OLD'}])
+        writer.close()
+        self.assertFalse(os.path.exists(path + '.part'))
+        self.assertEqual(read_lines(path), [{'asin': 'A'}])
+        self.assertEqual(writer.files, [path])
+
+    def test_abort_keeps_old_file(self):
+        path = os.path.join(self.dir, 'old.json')
+        with open(path, 'w') as f:
+            f.write('{"asin": "OLD"}\n')
+        with self.assertRaises(RuntimeError):
+            with JsonlWriter(path, mode='w', buffer_size=1) as writer:
+                writer.write({'asin': 'A'})
+                raise RuntimeError('crawl failed')
+        self.assertFalse(os.path.exists(path + '.part'))
+        self.assertEqual(read_lines(path), [{'asin': 'OLD'}])
+
+    def test_append_mode(self):
+        with JsonlWriter(self.path) as writer:
+            writer.write({'asin': 'A'})
+        with JsonlWriter(self.path) as writer:
+            writer.write_many([{'asin': 'B'}, {'asin': 'C'}])
+        self.assertEqual([row['asin'] for row in read_lines(self.path)], ['A', 'B', 'C'])
+
+    def test_buffer_and_flush(self):
+        writer = JsonlWriter(self.path)
+        writer.write({'asin': 'A'})
+        self.assertFalse(os.path.exists(self.path))  # todo 未满 buffer_size 不写文件
+        writer.flush()
+        self.assertEqual(read_lines(self.path), [{'asin': 'A'}])
+        writer.close()
+
+    def test_rotate_bytes(self):
+        with JsonlWriter(self.path, mode='w', buffer_size=1, rotate_bytes=40) as writer:
+            writer.write_many([{'asin': f'B0{i:08d}'} for i in range(5)])
+        root = os.path.join(self.dir, 'out', 'items')
+        self.assertEqual(writer.files, [f'{root}.{i:04d}.json' for i in range(3)])
+        rows = [row for path in writer.files for row in read_lines(path)]
+        self.assertEqual([row['asin'] for row in rows], [f'B0{i:08d}' for i in range(5)])
+        self.assertFalse([name for name in os.listdir(os.path.dirname(root)) if name.endswith('.part')])
+
+    def test_gzip(self):
+        with JsonlWriter(self.path, mode='w', compression='gzip') as writer:
+            writer.write({'asin': 'A', 'title': '中文'})
+        self.assertEqual(writer.files, [self.path + '.gz'])
+        self.assertEqual(read_lines(self.path + '.gz'), [{'asin': 'A', 'title': '中文'}])
+
+    def test_empty_close_creates_file(self):
+        JsonlWriter(self.path, mode='w').close()
+        self.assertEqual(read_lines(self.path), [])
+
+    def test_unsupported_compression(self):
+        with self.assertRaises(ValueError):
+            JsonlWriter(self.path, compression='bz2')
+
+
+if __name__ == '__main__':
+    unittest.main()
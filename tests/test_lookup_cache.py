@@ -0,0 +1,74 @@
+# todo LookupCache 测试
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from tool.lookup_cache import LookupCache
+
+
+class LookupCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_put_and_get(self):
+        cache = LookupCache(self.path, ttl=3600)
+        try:
+            cache.put_many('US', 'competitor-lookup', [{'asin': 'A', 'units': 1, 'title': '中文'}, {'units': 2}])
+            self.assertEqual(cache.get_many('US', 'competitor-lookup', ['A', 'B']),
+                             {'A': {'asin': 'A', 'units': 1, 'title': '中文'}})
+            # todo 站点、接口分别缓存
+            self.assertEqual(cache.get_many('DE', 'competitor-lookup', ['A']), {})
+            self.assertEqual(cache.get_many('US', 'quick-view', ['A']), {})
+            self.assertEqual(cache.get_many('US', 'competitor-lookup', []), {})
+        finally:
+            cache.close()
+
+    def test_overwrite(self):
+        cache = LookupCache(self.path, ttl=3600)
+        try:
+            cache.put_many('US', 'quick-view', [{'asin': 'A', 'units': 1}])
+            cache.put_many('US', 'quick-view', [{'asin': 'A', 'units': 5}])
+            self.assertEqual(cache.get_many('US', 'quick-view', ['A'])['A']['units'], 5)
+        finally:
+            cache.close()
+
+    def test_expired_entries(self):
+        cache = LookupCache(self.path, ttl=3600)
+        try:
+            cache.put_many('US', 'quick-view', [{'asin': 'A'}, {'asin': 'B'}])
+            cache._connect().execute("UPDATE lookup_cache SET updated_at = ? WHERE asin = 'A'", (time.time() - 7200,))
+            self.assertEqual(set(cache.get_many('US', 'quick-view', ['A', 'B'])), {'B'})
+            cache.purge()
+            count = cache._connect().execute("SELECT COUNT(*) FROM lookup_cache").fetchone()[0]
+            self.assertEqual(count, 1)
+        finally:
+            cache.close()
+
+    def test_disabled(self):
+        cache = LookupCache(self.path, ttl=0)
+        try:
+            cache.put_many('US', 'quick-view', [{'asin': 'A'}])
+            self.assertEqual(cache.get_many('US', 'quick-view', ['A']), {})
+        finally:
+            cache.close()
+
+    def test_many_asins(self):
+        """超过 SQLite 变量上限时分批查询"""
+        cache = LookupCache(self.path, ttl=3600)
+        try:
+            asins = [f'B0{i:08d}' for i in range(1200)]
+            cache.put_many('US', 'quick-view', [{'asin': a} for a in asins])
+            self.assertEqual(len(cache.get_many('US', 'quick-view', asins)), 1200)
+        finally:
+            cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
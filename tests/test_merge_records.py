@@ -0,0 +1,62 @@
+# todo merge_records / merge_list_of_dicts 测试
+import unittest
+
+from tool.utils import merge_list_of_dicts, merge_records
+
+
+class MergeRecordsTest(unittest.TestCase):
+
+    def test_left_join_non_none(self):
+        left = [{'asin': 'A', 'price': 1, 'title': 'a'}, {'asin': 'B', 'price': 2}]
+        right = [{'asin': 'A', 'price': 3, 'title': None, 'units': 10}, {'asin': 'C', 'price': 9}]
+        result = merge_records(left, right)
+        self.assertEqual(result, [
+            {'asin': 'A', 'price': 3, 'title': 'a', 'units': 10},  # None 不覆盖
+            {'asin': 'B', 'price': 2},
+        ])
+        # todo 左侧记录原地更新
+        self.assertIs(result[0], left[0])
+
+    def test_left_wins(self):
+        left = [{'asin': 'A', 'price': 1}]
+        right = [{'asin': 'A', 'price': 3, 'units': 10}]
+        self.assertEqual(merge_records(left, right, policy='left_wins'), [{'asin': 'A', 'price': 1, 'units': 10}])
+
+    def test_inner_and_outer(self):
+        def data():
+            return [{'asin': 'A'}, {'asin': 'B'}], [{'asin': 'A', 'x': 1}, {'asin': 'C', 'x': 2}, {'x': 3}]
+
+        self.assertEqual(merge_records(*data(), how='inner'), [{'asin': 'A', 'x': 1}])
+        self.assertEqual(merge_records(*data(), how='outer'), [
+            {'asin': 'A', 'x': 1}, {'asin': 'B'}, {'asin': 'C', 'x': 2}, {'x': 3},
+        ])
+
+    def test_duplicates(self):
+        """右侧重复的 key 按顺序依次合并，左侧重复的 key 每条都合并"""
+        left = [{'asin': 'A'}, {'asin': 'A'}]
+        right = [{'asin': 'A', 'x': 1, 'y': 1}, {'asin': 'A', 'x': 2, 'y': None}]
+        self.assertEqual(merge_records(left, right), [{'asin': 'A', 'x': 2, 'y': 1}] * 2)
+
+    def test_none_key_not_matched(self):
+        left = [{'asin': None, 'x': 0}]
+        right = [{'asin': None, 'x': 1}]
+        self.assertEqual(merge_records(left, right), [{'asin': None, 'x': 0}])
+        self.assertEqual(merge_records([{'asin': None}], [{'asin': None}], how='inner'), [])
+
+    def test_custom_key(self):
+        self.assertEqual(merge_records([{'id': 1}], [{'id': 1, 'v': 'x'}], key='id'), [{'id': 1, 'v': 'x'}])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            merge_records([], [], how='right')
+        with self.assertRaises(ValueError):
+            merge_records([], [], policy='right_wins')
+
+    def test_merge_list_of_dicts(self):
+        left = [{'asin': 'A', 'price': 1}, {'asin': 'B'}]
+        right = [{'asin': 'A', 'price': None, 'units': 5}]
+        self.assertEqual(merge_list_of_dicts(left, right), [{'asin': 'A', 'price': 1, 'units': 5}, {'asin': 'B'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# todo 记录模型与数值转换测试
+import json
+import unittest
+
+from tool.records import ProductRecord, _to_float, _to_int, _to_price
+
+
+class ConvertTest(unittest.TestCase):
+
+    def test_to_int(self):
+        cases = [
+            (None, None), (True, None), (7, 7), (12.9, 12), ('349', 349), ('-3', -3), ('+3', 3),
+            ('4.5', 4), ('4,5', 4), ('1,234', 1234), ('1.234', 1234), ('1.234.567', 1234567),
+            ('1 234', 1234), ('1,234.56', 1234), ('1.234,56', 1234), ('', None), ('abc', None),
+            ('349 ratings', None), (float('nan'), None), ('inf', None),
+        ]
+        for value, expected in cases:
+            with self.subTest(value=value):
+                self.assertEqual(_to_int(value), expected)
+
+    def test_to_float(self):
+        self.assertEqual(_to_float('4,5'), 4.5)
+        self.assertEqual(_to_float('4.5'), 4.5)
+        self.assertEqual(_to_float(4), 4.0)
+        self.assertIsNone(_to_float('n/a'))
+        self.assertIsNone(_to_float(None))
+
+    def test_to_price(self):
+        cases = [
+            ('16,99 €', 16.99), ('$1,234.56', 1234.56), ('1.234,56 €', 1234.56), ('HKD152,.33', 152.33),
+            ('€ 1.234', 1234.0), (26.95, 26.95), ('free', None), (None, None),
+        ]
+        for value, expected in cases:
+            with self.subTest(value=value):
+                self.assertEqual(_to_price(value), expected)
+
+
+class ProductRecordTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        item = {'asin': 'A', 'rank': '12', 'rating': '4,5', 'similarList': [{'asin': 'B'}], 'units': 10}
+        record = ProductRecord.from_item(item)
+        self.assertEqual(record.rank, 12)
+        self.assertEqual(record.rating, 4.5)
+        self.assertEqual(record.similar_list, [{'asin': 'B'}])
+        self.assertEqual(record.get('units'), 10)
+        self.assertEqual(record.get('title', 'x'), 'x')
+        self.assertEqual(ProductRecord.from_jsonl(record.to_jsonl()).to_item(), record.to_item())
+
+    def test_mysql_row_keeps_item_json(self):
+        row = {'asin': 'A', 'rank': 3, 'item': json.dumps({'units': 10})}
+        record = ProductRecord.from_mysql_row(row)
+        self.assertEqual(record.to_mysql_row()['item'], row['item'])  # todo 未访问时不重新序列化
+        self.assertEqual(record.extras, {'units': 10})
+
+
+if __name__ == '__main__':
+    unittest.main()
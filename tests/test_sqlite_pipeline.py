@@ -0,0 +1,156 @@
+# todo SQLitePipeline 测试 (upsert 规则与 MySQLPipeline 一致、待同步记录、占位符转换)
+import os
+import shutil
+import tempfile
+import unittest
+
+from tool.pipeline import Storage
+from tool.sqlite_pipeline import SQLitePipeline, _sqlite_sql, iter_query
+
+SCHEMA = {
+    "id": "INT AUTO_INCREMENT PRIMARY KEY",
+    "asin": "VARCHAR(20) NOT NULL UNIQUE",
+    "`rank`": "INT",
+    "title": "VARCHAR(500)",
+    "price": "DECIMAL(10,2)",
+    "updated_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP",
+    "INDEX idx_rank": "(`rank`)",
+}
+
+
+class MemoryStorage(Storage):
+    """记录同步结果的目标存储"""
+
+    def __init__(self):
+        self.tables = {}
+
+    def create_table_if_not_exists(self, table_name, schema, options=''):
+        self.tables.setdefault(table_name, {})
+
+    def batch_upsert(self, table_name, data, primary_key='asin', batch_size=100, schema=None, mode='row',
+                     key_columns=None):
+        for row in data:
+            self.tables[table_name][tuple(row[k] for k in key_columns or [primary_key])] = row
+
+    def execute_query(self, query, params=None):
+        return []
+
+    def drop_table(self, table_name):
+        self.tables.pop(table_name, None)
+
+    def close(self):
+        pass
+
+
+class SQLitePipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'data.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _rows(self, pipeline, table='t'):
+        return {row['asin']: row for row in pipeline.execute_query(f"SELECT * FROM {table} ORDER BY asin")}
+
+    def test_upsert_rules(self):
+        """rank 必须更新，其他字段只有新值不为 NULL 时才更新"""
+        pipeline = SQLitePipeline(self.path)
+        try:
+            pipeline.batch_upsert('t', [{'asin': 'A', 'rank': 1, 'title': 'a', 'price': 9.5}], schema=SCHEMA)
+            pipeline.batch_upsert('t', [{'asin': 'A', 'rank': None, 'title': None, 'price': 8},
+                                        {'asin': 'B', 'rank': 2, 'title': 'b', 'price': None}])
+            rows = self._rows(pipeline)
+            self.assertEqual(len(rows), 2)
+            self.assertIsNone(rows['A']['rank'])
+            self.assertEqual(rows['A']['title'], 'a')
+            self.assertEqual(rows['A']['price'], 8)
+            self.assertEqual(rows['B']['title'], 'b')
+            self.assertIsNotNone(rows['A']['updated_at'])
+        finally:
+            pipeline.close()
+
+    def test_batches_and_duplicates(self):
+        """分批写入，同一 asin 多次出现时以最后一条为准"""
+        pipeline = SQLitePipeline(self.path)
+        try:
+            data = [{'asin': f'A{i % 5}', 'rank': i, 'title': f't{i}', 'price': None} for i in range(23)]
+            pipeline.batch_upsert('t', data, batch_size=4, schema=SCHEMA)
+            rows = self._rows(pipeline)
+            self.assertEqual(len(rows), 5)
+            self.assertEqual(rows['A0']['rank'], 20)
+            self.assertEqual(rows['A2']['title'], 't22')
+        finally:
+            pipeline.close()
+
+    def test_composite_key(self):
+        schema = {
+            "site": "VARCHAR(8) NOT NULL",
+            "asin": "VARCHAR(20) NOT NULL",
+            "`rank`": "INT",
+            "PRIMARY KEY": "(site, asin)",
+        }
+        pipeline = SQLitePipeline(self.path)
+        try:
+            pipeline.batch_upsert('h', [{'asin': 'A', 'site': 'US', 'rank': 1}, {'asin': 'A', 'site': 'DE', 'rank': 2}],
+                                  schema=schema, key_columns=['site', 'asin'])
+            pipeline.batch_upsert('h', [{'asin': 'A', 'site': 'US', 'rank': 3}], key_columns=['site', 'asin'])
+            rows = pipeline.execute_query("SELECT site, `rank` FROM h WHERE asin = %s ORDER BY site", ('A',))
+            self.assertEqual(rows, [{'site': 'DE', 'rank': 2}, {'site': 'US', 'rank': 3}])
+        finally:
+            pipeline.close()
+
+    def test_no_pending_without_sync_target(self):
+        pipeline = SQLitePipeline(self.path)
+        try:
+            pipeline.batch_upsert('t', [{'asin': 'A', 'rank': 1}], schema=SCHEMA)
+            self.assertEqual(pipeline.execute_query("SELECT COUNT(*) AS n FROM _sync_pending")[0]['n'], 0)
+        finally:
+            pipeline.close()
+
+    def test_sync_once(self):
+        """待同步的行写入目标存储，同步后清空；自增 id 和时间戳不同步"""
+        remote = MemoryStorage()
+        pipeline = SQLitePipeline(self.path, remote=remote)
+        try:
+            pipeline.batch_upsert('t', [{'asin': 'A', 'rank': 1, 'title': 'a'}], schema=SCHEMA)
+            pipeline.batch_upsert('t', [{'asin': 'A', 'rank': 2}, {'asin': 'B', 'rank': 3}])
+            self.assertEqual(pipeline.execute_query("SELECT COUNT(*) AS n FROM _sync_pending")[0]['n'], 2)
+            self.assertEqual(pipeline.sync_once(), 2)
+            self.assertEqual(remote.tables['t'][('A',)], {'asin': 'A', 'rank': 2, 'title': 'a', 'price': None})
+            self.assertEqual(pipeline.sync_once(), 0)
+        finally:
+            pipeline.close()
+
+    def test_drop_table(self):
+        pipeline = SQLitePipeline(self.path, remote=MemoryStorage())
+        try:
+            pipeline.batch_upsert('t', [{'asin': 'A', 'rank': 1}], schema=SCHEMA)
+            pipeline.drop_table('t')
+            self.assertEqual(pipeline.execute_query("SELECT COUNT(*) AS n FROM _sync_pending")[0]['n'], 0)
+            pipeline.batch_upsert('t', [{'asin': 'A', 'rank': 1}], schema=SCHEMA)
+            self.assertEqual(len(self._rows(pipeline)), 1)
+        finally:
+            pipeline.close()
+
+    def test_iter_query(self):
+        pipeline = SQLitePipeline(self.path)
+        try:
+            pipeline.batch_upsert('t', [{'asin': 'A', 'rank': 1}, {'asin': 'B', 'rank': 2}], schema=SCHEMA)
+        finally:
+            pipeline.close()
+        rows = list(iter_query(self.path, "SELECT asin FROM t WHERE `rank` > %s", (1,)))
+        self.assertEqual(rows, [{'asin': 'B'}])
+
+    def test_sqlite_sql(self):
+        self.assertEqual(_sqlite_sql("SELECT * FROM t WHERE a = %s AND b LIKE '%s%' AND c LIKE 'x%%'", (1,)),
+                         "SELECT * FROM t WHERE a = ? AND b LIKE '%s%' AND c LIKE 'x%'")
+        self.assertEqual(_sqlite_sql('SELECT "a%s" FROM t WHERE b = %s', (1,)), 'SELECT "a%s" FROM t WHERE b = ?')
+        self.assertEqual(_sqlite_sql("SELECT 'it''s %s' WHERE a = %s", (1,)), "SELECT 'it''s %s' WHERE a = ?")
+        # todo 与 pymysql 一致: 没有参数时不转换
+        self.assertEqual(_sqlite_sql("SELECT '%%'"), "SELECT '%%'")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+# todo tk 签名 (js/export_tk.js 的 Python 实现) 测试
+# 运行: python -m unittest discover -s tests -t .
+import os
+import unittest
+
+from tool.keywords_amount_utils import _to_int32, check_tk_corpus, export_tk, sellersprite_token
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TkTest(unittest.TestCase):
+
+    def test_corpus(self):
+        """录制的 js 输出逐条一致"""
+        mismatches = check_tk_corpus(os.path.join(ROOT, 'js', 'export_tk_corpus.json'))
+        self.assertEqual(mismatches, [])
+
+    def test_to_int32(self):
+        self.assertEqual(_to_int32(0x7FFFFFFF), 2147483647)
+        self.assertEqual(_to_int32(0x80000000), -2147483648)
+        self.assertEqual(_to_int32(0xFFFFFFFF), -1)
+        self.assertEqual(_to_int32(1 << 32), 0)
+        self.assertEqual(_to_int32(-1), -1)
+
+    def test_js_argument_handling(self):
+        """期望值由 node 运行 js/export_tk.js 得到"""
+        cases = [
+            ((['B0A', 'B0B'],), '906315.772586'),   # 列表按元素展开
+            ((['x', None, 2],), '606723.1007522'),  # 列表中的 None 为空串
+            ((123,), '265090.136739'),
+            ((1.5,), '6922.394923'),
+            ((True,), '334640.198289'),
+            (('a', None, 'b'), '822044.693949'),    # 空值跳过
+            (('a', 'b', 'c', 'd', 'e'), '889234.756787'),  # 只取前 4 个参数
+            (('\ud800x',), '790679.658742'),        # 孤立代理
+            (('x' * 5000,), '229671.367750'),       # 多次 int32 溢出
+        ]
+        for args, tk in cases:
+            with self.subTest(args=args if len(str(args)) < 50 else 'long'):
+                self.assertEqual(sellersprite_token(*args), tk)
+
+    def test_empty(self):
+        self.assertEqual(sellersprite_token(), '')
+        self.assertEqual(sellersprite_token(0), '')
+        self.assertEqual(sellersprite_token('', None), '')
+
+    def test_export_tk(self):
+        self.assertEqual(export_tk('B0F6XY94QC'), '641710.1038095')
+        self.assertEqual(export_tk('B0A', ''), sellersprite_token('B0A'))
+
+
+if __name__ == '__main__':
+    unittest.main()
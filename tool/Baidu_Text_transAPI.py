@@ -37,7 +37,8 @@ class BaiduTranslation:
             'Content-Type': 'application/x-www-form-urlencoded'
         }
         try:
-            r = requests.post(self.apiURL, params=data, headers=headers)
+            # todo 文本放在请求体中，批量翻译时 URL 不会超长
+            r = requests.post(self.apiURL, data=data, headers=headers, timeout=30)
             result = r.json()
             return result
         except Exception as e:
@@ -49,14 +50,18 @@ class BaiduTranslation:
             }
 
 
-    def to_text(self, text):
+    def to_text(self, text, to_lang=None):
+        """
+        :param text: 翻译文本，多行时 trans_result 每行一条
+        :param to_lang: 目标语言，默认 self.to_lang
+        """
         salt = random.randint(32768, 65536)
         sign = self.make_md5(self.appid + text + str(salt) + self.appkey)
         payload = {
             'appid': self.appid,
             'q': text,
             'from': self.from_lang,
-            'to': self.to_lang,
+            'to': to_lang or self.to_lang,
             'salt': salt,
             'sign': sign
         }
@@ -7,17 +7,13 @@ from openpyxl.drawing.image import Image
 from openpyxl.styles import  PatternFill, Alignment
 import json
 import os
-import requests
-from io import BytesIO
 
-from src.amazon_selection_crawler import updataItems
-from tool.Baidu_Text_transAPI import BaiduTranslation
+from src.amazon_selection_crawler import enrich_items
+from tool.image_cache import image_cache
+from tool.translation import translator
 from openpyxl.styles import colors
 from openpyxl.styles import Font
 
-from tool.keywords_amount_utils import export_token
-from tool.utils import _read_user
-
 logger = logging.getLogger(__name__)
 
 
@@ -52,33 +48,76 @@ class AmazonExcelExporter:
         self.row_heights = {
             'data_row': 80  # 数据行高度
         }
-        # get_image 重试次数
-        self.i_img = 0
-        # 卖家精灵 token
-        user = _read_user()
-        self.token = export_token(user.get('username'), user.get('password'))
         # 站点
         self.site = site
 
 
     def download_image(self, url):
-        """下载图片并返回BytesIO对象"""
+        """返回缩略图 BytesIO 对象 (优先使用 prefetch_images 的缓存)"""
+        img_data = image_cache.get(url)
+        if img_data is None:
+            raise Exception(f"下载图片失败 {url}")
+        return img_data
+
+    @staticmethod
+    def _image_urls(item):
+        """一行数据用到的图片: 主图、同款图、1688 图"""
+        urls = [item.get("imageUrl") or item.get("image")]
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10, verify=False)
-            response.raise_for_status()
-            self.i_img = 0
-            return BytesIO(response.content)
-        except Exception as e:
-            logger.error(f"下载图片失败 {url}: {e}, 正在重试")
-            self.i_img += 1
-            if self.i_img >= 5:
-                # 返回一个简单的占位符
-                return BytesIO(
-                    b'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8/5+hHgAHggJ/PchI7wAAAABJRU5ErkJggg==')
-            return self.download_image(url)
+            # todo 同款图按销量取前三，写入前不知道是哪三个，全部预取
+            for similar in json.loads(item.get("similarList") or "[]") or []:
+                urls.append(similar.get("imageUrl"))
+        except (ValueError, AttributeError, TypeError):
+            pass
+        try:
+            for ai_item in json.loads(item.get("aliexpress") or "[]")[:3]:
+                urls.append(ai_item.get("imageUrl"))
+        except (ValueError, AttributeError, TypeError):
+            pass
+        return urls
+
+    @staticmethod
+    def _business_address(item):
+        """卖家地址原文"""
+        seller_dto = item.get('sellerDto')
+        if not seller_dto:
+            seller_dto = item.get("seller_dto")
+        if not seller_dto:
+            return ""
+        business_address = seller_dto.get("businessAddress", "")
+        if not business_address:
+            business_address = seller_dto.get("business_address", "")
+        return (business_address or "").replace("<br/>", "\n")
+
+    @staticmethod
+    def _material_text(item):
+        """材料信息原文"""
+        material = item.get("overviews", {})
+        if not material:
+            return ""
+        materialJSON = json.loads(material)
+        return "; ".join([f"{k}: {v}" for k, v in materialJSON.items()])
+
+    def prefetch_translations(self, items):
+        """写入行之前批量翻译整个工作簿的卖家地址、材料信息、五点描述 (结果缓存在本地)"""
+        texts = []
+        for item in items:
+            for get_text in (self._business_address, self._material_text, lambda i: i.get("description")):
+                try:
+                    texts.append(get_text(item))
+                except Exception as e:
+                    logger.error(f'读取翻译文本失败 {item.get("asin")}: {e}')
+        translator.translate_many(texts)
+
+    def prefetch_images(self, items, similars=None):
+        """
+        写入行之前并发下载整个工作簿的图片 (缩略图缓存在本地，重复导出不再下载)
+        :param items: 产品数据列表
+        :param similars: 补全后的同款列表 (imageUrl 可能与原始数据不同)
+        """
+        urls = [url for item in items for url in self._image_urls(item)]
+        urls.extend(similar.get("imageUrl") for similar in similars or [])
+        image_cache.prefetch(urls)
 
     def create_worksheet(self, sheet_name="产品数据"):
         """
@@ -260,17 +299,10 @@ class AmazonExcelExporter:
         # todo卖家地址
         businessAddress = ""
         try:
-            seller_dto = item.get('sellerDto')
-            if not seller_dto:
-                seller_dto = item.get("seller_dto")
-            if seller_dto:
-                # 需要翻译
-                business_address = seller_dto.get("businessAddress", "")
-                if not business_address:
-                    business_address = seller_dto.get("business_address", "")
-                fanyi = BaiduTranslation().to_text(business_address.replace("<br/>", "\n"))
-                if fanyi['trans_result']:
-                    businessAddress = "".join([k['dst'] for k in fanyi['trans_result']])
+            # 需要翻译
+            business_address = self._business_address(item)
+            if business_address:
+                businessAddress = "".join(translator.translate(business_address))
         except Exception as e:
             logger.error(f'卖家地址解析失败！{asin} : {str(e)}')
         self.ws.cell(row=row_idx, column=15, value=businessAddress)
@@ -286,15 +318,13 @@ class AmazonExcelExporter:
                 item_info += f"搜索推荐词: {str(relationKeyword['recommend'])}\n"
         except Exception as e:
             logger.error(e)
-        material = item.get("overviews", {})
-        if material:
-            materialJSON = json.loads(material)
-            materialText = "; ".join([f"{k}: {v}" for k, v in materialJSON.items()])
+        materialText = self._material_text(item)
+        if materialText:
             try:
-                # 百度翻译
-                fanyi = BaiduTranslation().to_text(materialText)
-                if fanyi['trans_result']:
-                    materialText = "".join([k['dst'] for k in fanyi['trans_result']])
+                # 百度翻译 (命中缓存时不请求)
+                fanyi = translator.translate(materialText)
+                if fanyi:
+                    materialText = "".join(fanyi)
                     item_info = f"材料信息: {materialText}\n" + item_info
             except Exception as e:
                 logger.error(f'材料信息翻译失败：{e}')
@@ -305,8 +335,7 @@ class AmazonExcelExporter:
         try:
             similarList = item.get("similarList")
             if similarList:
-                asinList = [similar.get('asin') for similar in json.loads(similarList)]
-                newSimilarList = updataItems(json.loads(similarList), asinList, self.token, {'site': self.site}, t=False)
+                newSimilarList = enrich_items(json.loads(similarList), self.site, t=False)
                 # todo 按销量 排序
                 sorted_data = sorted(newSimilarList,
                                      key=lambda x: x.get('units', 0) or 0,
@@ -377,9 +406,9 @@ class AmazonExcelExporter:
             description = item.get("description", "")
             if not description:
                 raise Exception('description为空')
-            PF = BaiduTranslation().to_text(description)
-            if PF and PF.get('trans_result'):
-                Product_information = "\n".join([k['dst'] for k in PF['trans_result']])
+            PF = translator.translate(description)
+            if PF:
+                Product_information = "\n".join(PF)
         except Exception as e:
             logger.error(f"获取描述失败 {asin}: {e}")
         self.ws.cell(row=row_idx, column=22, value=Product_information)
@@ -447,15 +476,22 @@ class AmazonExcelExporter:
             self.ws.cell(row=row_idx, column=28, value="")
 
     def add_products_batch(self, items):
-        All_same = []
+        All_same = {}
         for item in items:
             if item.get('similarList'):
                 similarList = json.loads(item.get('similarList'))
                 for similar in similarList:
-                    if similar.get('asin') not in [same.get('asin') for same in All_same]:
-                        All_same.append(similar)
-        asinList = [same.get('asin') for same in All_same]
-        newAllSame = updataItems(All_same, asinList, self.token, {'site': self.site}, t=False)
+                    All_same.setdefault(similar.get('asin'), similar)
+        newAllSame = enrich_items(list(All_same.values()), self.site, t=False)
+        # todo 图片与翻译并行预取，写入行时只读缓存
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(self.prefetch_images, items, newAllSame),
+                       executor.submit(self.prefetch_translations, items)]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f'预取失败: {e}')
         for item in items:
             self.add_product_data(item, newAllSame)
 
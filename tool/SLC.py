@@ -1,4 +1,6 @@
+import json
 import os
+import threading
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -19,9 +21,25 @@ def login_sellersprite(username, password):
         :param password: 卖家精灵密码
         :return: cookie
     """
+    cookies = _login_cookies(username, password)
+    if cookies is None:
+        return None
+    return _cookie_header(cookies)
+
+
+def _cookie_header(cookies):
+    """转换 headers 能用的cookie"""
+    return "; ".join([f"{cookie['name']}={cookie['value']}" for cookie in cookies])
+
+
+def _login_cookies(username, password):
+    """
+        selenium 登录卖家精灵
+        :return: selenium cookie 列表，失败返回 None
+    """
     logger.info(f'{username} 开始登录卖家精灵...')
     options = _get_browser_options()
-    driver_path = os.path.join(os.getcwd(), 'drivers\\chromedriver.exe')
+    driver_path = os.path.join(os.getcwd(), 'drivers', 'chromedriver.exe')
     service = Service(executable_path=driver_path)
     driver = webdriver.Chrome(
         options=options,
@@ -62,10 +80,7 @@ def login_sellersprite(username, password):
         logger.info("登录成功!")
         time.sleep(1)
         # 获取 cookie
-        cookies = driver.get_cookies()
-        # 转换 headers 能用的cookie
-        cookie_str = "; ".join([f"{cookie['name']}={cookie['value']}" for cookie in cookies])
-        return cookie_str
+        return driver.get_cookies()
 
     except Exception as e:
         logger.error(f"登录过程中出现错误: {str(e)}")
@@ -74,3 +89,124 @@ def login_sellersprite(username, password):
     finally:
         # 关闭浏览器
         driver.quit()
+
+
+# todo 统计类 cookie (寿命很短，与登录状态无关)，不参与过期时间计算
+_TRACKING_COOKIES = ('_ga', '_gid', '_gat', '_gcl', 'Hm_', '_fbp', '_clck', '_clsk', '_uet')
+# todo 登录后 10 分钟内过期的 cookie 也视为临时 cookie
+_MIN_COOKIE_LIFETIME = 600
+
+
+def _session_expiry(cookies):
+    """
+    登录 cookie 的过期时间: 忽略统计类和短寿命 cookie，取其余 cookie 中最早的过期时间
+    提前失效时由接口拒绝 (invalidate) 触发重新登录
+    """
+    threshold = time.time() + _MIN_COOKIE_LIFETIME
+    expiries = [c['expiry'] for c in cookies
+                if c.get('expiry') and c['expiry'] > threshold
+                and not c.get('name', '').startswith(_TRACKING_COOKIES)]
+    return min(expiries) if expiries else None
+
+
+class SellerSpriteCookieCache:
+    """
+    卖家精灵登录 cookie 缓存
+
+    功能特点:
+    - 按账号缓存 selenium 登录得到的 cookie，并落盘供下次运行复用 (文件权限 0600，只有当前用户可读写)
+    - 有效性检查只看登录 cookie 的 expiry (不请求服务器)，过期后重新登录 (忽略统计类、短寿命 cookie)
+    - 服务端提前使会话失效时，由调用方在接口拒绝后 invalidate，同一账号同一时间只登录一次
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: 落盘文件，默认 data/cache/sellersprite_cookies.json
+        """
+        self.path = path or os.path.join(os.getcwd(), 'data', 'cache', 'sellersprite_cookies.json')
+        self._lock = threading.Lock()
+        self._login_locks = {}  # username -> Lock
+        self._cookies = None  # username -> {'cookie', 'expires_at'}
+
+    def _load(self):
+        if self._cookies is not None:
+            return
+        self._cookies = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._cookies = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f'读取 cookie 缓存失败: {e}')
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + '.tmp'
+            # todo cookie 是登录凭证，只允许当前用户读写
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.chmod(tmp, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._cookies, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.warning(f'保存 cookie 缓存失败: {e}')
+
+    @staticmethod
+    def _valid(entry):
+        """有效性检查: 存在且未到登录 cookie 的过期时间 (只比较本地记录的 expiry)"""
+        if not entry or not entry.get('cookie'):
+            return False
+        expires_at = entry.get('expires_at')
+        return expires_at is None or expires_at > time.time() + 60
+
+    def get(self, user):
+        """
+        获取账号的登录 cookie，缓存失效时登录
+        :param user: {'username', 'password'}
+        :return: cookie 字符串，登录失败返回 None
+        """
+        username = user.get('username')
+        with self._lock:
+            self._load()
+            entry = self._cookies.get(username)
+            if self._valid(entry):
+                return entry['cookie']
+            login_lock = self._login_locks.setdefault(username, threading.Lock())
+
+        with login_lock:
+            # todo 其它线程可能已经完成登录
+            with self._lock:
+                entry = self._cookies.get(username)
+                if self._valid(entry):
+                    return entry['cookie']
+            cookies = _login_cookies(username, user.get('password'))
+            if not cookies:
+                return None
+            entry = {
+                'cookie': _cookie_header(cookies),
+                'expires_at': _session_expiry(cookies),
+            }
+            with self._lock:
+                self._cookies[username] = entry
+                self._save()
+            return entry['cookie']
+
+    def invalidate(self, username, cookie=None):
+        """
+        接口拒绝 cookie 后丢弃缓存
+        :param username: 账号
+        :param cookie: 被拒绝的 cookie，已被其它线程刷新时不再丢弃
+        """
+        with self._lock:
+            self._load()
+            entry = self._cookies.get(username)
+            if entry and (cookie is None or entry.get('cookie') == cookie):
+                self._cookies.pop(username, None)
+                self._save()
+                logger.info(f'账号 {username} 的 cookie 已失效')
+
+
+# todo 全局单例
+cookie_cache = SellerSpriteCookieCache()
@@ -0,0 +1,219 @@
+# todo 卖家精灵 账号池
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+
+class SellerSpriteAccountPool:
+    """
+    卖家精灵账号池 (进程内共享)
+
+    功能特点:
+    - config/users.txt 只读取一次
+    - 记录每个账号的请求次数、剩余日配额
+    - 触发 "使用过于频繁" 后账号冷却
+    - 按负载分配最空闲的健康账号
+
+    users.txt 每行格式: 账号,密码[,日配额]
+    """
+
+    def __init__(self, path=None, daily_quota=None, cooldown=600):
+        """
+        :param path: 账号文件，默认 config/users.txt
+        :param daily_quota: 默认日配额，None 为不限制 (users.txt 第三列优先)
+        :param cooldown: 限流后的冷却时间(秒)
+        """
+        self.path = path or os.path.join(os.getcwd(), 'config', 'users.txt')
+        self.daily_quota = daily_quota
+        self.cooldown = cooldown
+        self._lock = threading.Condition()
+        self._accounts = None  # username -> 账号状态
+
+    def _load(self):
+        """首次使用时加载账号"""
+        if self._accounts is not None:
+            return
+        accounts = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = [p.strip() for p in line.strip().split(',')]
+                if len(parts) < 2 or not parts[0]:
+                    continue
+                quota = int(parts[2]) if len(parts) > 2 and parts[2] else self.daily_quota
+                accounts[parts[0]] = {
+                    'username': parts[0],
+                    'password': parts[1],
+                    'quota': quota,  # 日配额
+                    'used': 0,  # 当日请求次数
+                    'total': 0,  # 累计请求次数
+                    'in_use': 0,  # 正在使用的并发数
+                    'day': date.today(),
+                    'exhausted': False,  # 当日配额已被接口判定用完
+                    'cooldown_until': 0.0,
+                }
+        if not accounts:
+            raise Exception(f'没有可用的卖家精灵账号: {self.path}')
+        self._accounts = accounts
+        logger.info(f'卖家精灵账号池加载完成，账号数量: {len(accounts)}')
+
+    def _reset_day(self, account):
+        today = date.today()
+        if account['day'] != today:
+            account['day'] = today
+            account['used'] = 0
+            account['exhausted'] = False
+
+    def _has_quota(self, account):
+        self._reset_day(account)
+        if account['exhausted']:
+            return False
+        return account['quota'] is None or account['used'] < account['quota']
+
+    def _healthy(self, account, now):
+        return account['cooldown_until'] <= now and self._has_quota(account)
+
+    def _select(self, exclude):
+        """最空闲的健康账号，没有则返回 None"""
+        now = time.time()
+        candidates = [a for a in self._accounts.values()
+                      if a['username'] not in exclude and self._healthy(a, now)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda a: (a['in_use'], a['used']))
+
+    def _next_available(self, exclude):
+        """最近一个结束冷却的时间，全部配额用完返回 None"""
+        waits = [a['cooldown_until'] for a in self._accounts.values()
+                 if a['username'] not in exclude and self._has_quota(a)]
+        return min(waits) if waits else None
+
+    @staticmethod
+    def _user(account):
+        return {
+            'username': account['username'],
+            'password': account['password'],
+        }
+
+    def pick(self, exclude=()):
+        """
+        选取当前最空闲的健康账号 (不占用)
+        全部账号冷却或配额用完时，返回负载最低的账号
+        :param exclude: 排除的账号
+        :return: {'username', 'password'}
+        """
+        with self._lock:
+            self._load()
+            account = self._select(exclude)
+            if account is None:
+                logger.warning('没有健康的卖家精灵账号，使用负载最低的账号')
+                pool = [a for a in self._accounts.values() if a['username'] not in exclude] \
+                    or list(self._accounts.values())
+                account = min(pool, key=lambda a: (a['cooldown_until'], a['used']))
+            return self._user(account)
+
+    def acquire(self, exclude=(), timeout=None):
+        """
+        占用一个健康账号，没有时等待冷却结束
+        :param exclude: 排除的账号
+        :param timeout: 最长等待时间(秒)，None 为一直等待
+        :return: {'username', 'password'}
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            self._load()
+            while True:
+                account = self._select(exclude)
+                if account is not None:
+                    account['in_use'] += 1
+                    return self._user(account)
+                until = self._next_available(exclude)
+                if until is None:
+                    raise Exception('卖家精灵账号日配额已全部用完')
+                if deadline is not None:
+                    until = min(until, deadline)
+                    if time.time() >= deadline:
+                        raise Exception('等待卖家精灵账号超时')
+                self._lock.wait(max(until - time.time(), 0.1))
+
+    def release(self, username):
+        """归还 acquire 占用的账号"""
+        with self._lock:
+            account = self._accounts.get(username) if self._accounts else None
+            if account and account['in_use'] > 0:
+                account['in_use'] -= 1
+            self._lock.notify_all()
+
+    @contextmanager
+    def lease(self, exclude=(), timeout=None):
+        """
+        账号占用的上下文管理器
+
+        使用示例:
+        with account_pool.lease() as user:
+            token = token_manager.get_token(user)
+        """
+        user = self.acquire(exclude=exclude, timeout=timeout)
+        try:
+            yield user
+        finally:
+            self.release(user['username'])
+
+    def record_request(self, username, count=1):
+        """记录账号的请求次数"""
+        with self._lock:
+            account = self._accounts.get(username) if self._accounts else None
+            if account is None:
+                return
+            self._reset_day(account)
+            account['used'] += count
+            account['total'] += count
+
+    def mark_rate_limited(self, username, cooldown=None):
+        """账号被限流 (使用过于频繁)，进入冷却"""
+        with self._lock:
+            account = self._accounts.get(username) if self._accounts else None
+            if account is None:
+                return
+            account['cooldown_until'] = time.time() + (cooldown or self.cooldown)
+            logger.warning(f'账号 {username} 使用过于频繁，冷却 {cooldown or self.cooldown} 秒')
+
+    def mark_exhausted(self, username):
+        """账号当日配额已用完"""
+        with self._lock:
+            account = self._accounts.get(username) if self._accounts else None
+            if account is None:
+                return
+            self._reset_day(account)
+            account['exhausted'] = True
+            logger.warning(f'账号 {username} 当日配额已用完')
+
+    def healthy_count(self):
+        """当前健康账号数量"""
+        with self._lock:
+            self._load()
+            now = time.time()
+            return sum(1 for a in self._accounts.values() if self._healthy(a, now))
+
+    def stats(self):
+        """账号状态快照"""
+        with self._lock:
+            self._load()
+            now = time.time()
+            return [{
+                'username': a['username'],
+                'used': a['used'],
+                'total': a['total'],
+                'in_use': a['in_use'],
+                'remaining': 0 if a['exhausted'] else (
+                    None if a['quota'] is None else max(a['quota'] - a['used'], 0)),
+                'cooldown': max(a['cooldown_until'] - now, 0),
+            } for a in self._accounts.values()]
+
+
+# todo 全局单例
+account_pool = SellerSpriteAccountPool()
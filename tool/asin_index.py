@@ -0,0 +1,198 @@
+# todo 已采集 asin 索引 (跨运行 / 跨节点)
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Any
+
+import requests
+
+from config.config import asin_index_config, flask_host, PORT
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    内存 Bloom 过滤器，用于快速排除从未采集过的 asin
+    返回 False 一定不存在；返回 True 需要再查 SQLite 确认
+    """
+
+    def __init__(self, bits=1 << 23, hashes=7):
+        """
+        :param bits: 位数 (默认 8M 位 = 1MB，约 80 万条时误判率 1%)
+        :param hashes: 哈希函数个数
+        """
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray((bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self._array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class AsinIndex:
+    """
+    按 asin + 站点 记录最后采集时间和内容哈希 (SQLite + Bloom 过滤器)
+
+    不同类目、站点会反复发现同一 asin，采集前可用来跳过近期已采集的 asin，
+    或让未采集 / 最久未采集的 asin 优先
+    """
+
+    def __init__(self, path: str, bloom_bits: int = 1 << 23, max_age: int = 7 * 24 * 3600):
+        """
+        :param path: SQLite 文件路径 (相对路径基于当前工作目录)
+        :param bloom_bits: Bloom 过滤器位数
+        :param max_age: 默认的 "近期已采集" 时间(秒)
+        """
+        self.path = path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+        self.bloom_bits = bloom_bits
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = None
+        self._bloom = None
+
+    def _connect(self):
+        """首次使用时打开数据库并加载 Bloom 过滤器"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS seen_asin (
+                    site TEXT NOT NULL,
+                    asin TEXT NOT NULL,
+                    crawled_at REAL NOT NULL,
+                    content_hash TEXT,
+                    PRIMARY KEY (site, asin)
+                ) WITHOUT ROWID
+            """)
+            conn.commit()
+            bloom = BloomFilter(self.bloom_bits)
+            count = 0
+            for site, asin in conn.execute("SELECT site, asin FROM seen_asin"):
+                bloom.add(f'{site}:{asin}')
+                count += 1
+            logger.info(f'asin 索引加载完成，记录数量: {count}')
+            self._conn = conn
+            self._bloom = bloom
+        return self._conn
+
+    @staticmethod
+    def content_hash(item: Dict[str, Any]) -> str:
+        """item 内容哈希，用于判断商品数据是否变化"""
+        data = json.dumps(item, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def might_contain(self, site: str, asin: str) -> bool:
+        """Bloom 过滤器判断，False 表示一定未采集过"""
+        with self._lock:
+            self._connect()
+            return f'{site}:{asin}' in self._bloom
+
+    def lookup(self, site: str, asins: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量查询采集记录
+        :param site: 站点
+        :param asins: asin 列表
+        :return: {asin: {'crawled_at': 时间戳, 'hash': 内容哈希}}，未采集的 asin 不在结果中
+        """
+        result = {}
+        with self._lock:
+            conn = self._connect()
+            candidates = [a for a in dict.fromkeys(asins) if a and f'{site}:{a}' in self._bloom]
+            # todo SQLite 变量上限 999，分批查询
+            for i in range(0, len(candidates), 500):
+                chunk = candidates[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT asin, crawled_at, content_hash FROM seen_asin "
+                    f"WHERE site = ? AND asin IN ({', '.join(['?'] * len(chunk))})",
+                    [site, *chunk]
+                ).fetchall()
+                for asin, crawled_at, content_hash in rows:
+                    result[asin] = {'crawled_at': crawled_at, 'hash': content_hash}
+        return result
+
+    def filter_unseen(self, site: str, items: List[Dict[str, Any]], max_age=None) -> List[Dict[str, Any]]:
+        """
+        去掉近期已采集的 items
+        :param max_age: 近期的时间(秒)，默认 self.max_age
+        """
+        max_age = self.max_age if max_age is None else max_age
+        seen = self.lookup(site, [item.get('asin') for item in items])
+        expire = time.time() - max_age
+        return [item for item in items
+                if item.get('asin') not in seen or seen[item.get('asin')]['crawled_at'] <= expire]
+
+    def prioritize(self, site: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """未采集的 items 在前，其余按最后采集时间从早到晚"""
+        seen = self.lookup(site, [item.get('asin') for item in items])
+        return sorted(items, key=lambda item: seen.get(item.get('asin'), {}).get('crawled_at', 0))
+
+    def mark(self, site: str, items: List[Dict[str, Any]]) -> List[str]:
+        """
+        记录 items 已采集
+        :param site: 站点
+        :param items: 采集结果 (需包含 asin)
+        :return: 内容有变化 (含首次采集) 的 asin 列表
+        """
+        now = time.time()
+        rows = {}
+        for item in items:
+            asin = item.get('asin')
+            if asin:
+                rows[asin] = (site, asin, now, self.content_hash(item))
+        if not rows:
+            return []
+        previous = self.lookup(site, list(rows))
+        changed = [asin for asin, row in rows.items() if previous.get(asin, {}).get('hash') != row[3]]
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO seen_asin (site, asin, crawled_at, content_hash) VALUES (?, ?, ?, ?)",
+                list(rows.values())
+            )
+            conn.commit()
+            for asin in rows:
+                self._bloom.add(f'{site}:{asin}')
+        return changed
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self._bloom = None
+
+
+def query_remote(node: str, site: str, asins: List[str], timeout=30) -> Dict[str, Dict[str, Any]]:
+    """
+    查询其他节点 (master / DE) 的 asin 索引
+    :param node: flask_host 中的节点名
+    :return: 同 AsinIndex.lookup
+    """
+    url = f'http://{flask_host.get(node)}:{PORT}/api/asin/seen'
+    try:
+        response = requests.post(url, json={'site': site, 'asins': asins}, timeout=timeout)
+        return response.json().get('data', {})
+    except Exception as e:
+        logger.error(f'查询节点 {node} asin 索引失败: {e}')
+        return {}
+
+
+# todo 全局单例
+asin_index = AsinIndex(**asin_index_config)
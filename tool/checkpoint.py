@@ -0,0 +1,149 @@
+# todo 类目整合断点续跑日志 (每个 cid + site 一个文件)
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config.config import checkpoint_config
+
+logger = logging.getLogger(__name__)
+
+
+class RunJournal:
+    """
+    类目整合运行日志 (追加写 JSONL，每条事件写入后 fsync)
+
+    记录三类进度:
+    - page: 已抓取的搜索页 (含该页 items 与 maxPage)
+    - enriched: 已完成卖家精灵补全的页及结果
+    - detail: 已完成详情采集的 asin (含合并后的 item)
+
+    同一 (cid, site) 重新运行时回放日志，从中断处继续；运行完成后删除日志
+
+    使用示例:
+    journal = RunJournal(cid, site)
+    if journal.page(3) is None:
+        journal.record_page(3, items, maxPage)
+    ...
+    journal.complete()
+    """
+
+    def __init__(self, cid: str, site: str, directory: Optional[str] = None, max_age: Optional[float] = None):
+        """
+        :param cid: 类目ID
+        :param site: 站点
+        :param directory: 日志目录 (相对路径基于当前工作目录)，默认 checkpoint_config['path']
+        :param max_age: 日志有效期(秒)，超过后重新开始，默认 checkpoint_config['max_age']
+        """
+        directory = directory or checkpoint_config['path']
+        directory = directory if os.path.isabs(directory) else os.path.join(os.getcwd(), directory)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{cid}_{site}.jsonl')
+        self.max_age = checkpoint_config['max_age'] if max_age is None else max_age
+        self._lock = threading.Lock()
+        self.maxPage = None
+        self._pages = {}         # page -> items
+        self._enriched = {}      # page -> 补全后的 items
+        self._details = {}       # asin -> 合并后的 item
+        self.resumed = self._replay()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _replay(self) -> bool:
+        """读取已有日志，返回是否从断点继续"""
+        if not os.path.exists(self.path):
+            return False
+        if self.max_age and time.time() - os.path.getmtime(self.path) > self.max_age:
+            logger.info(f'断点日志已过期，重新开始: {self.path}')
+            os.remove(self.path)
+            return False
+        valid = 0  # 最后一条完整记录的结束位置
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # todo 最后一行可能在写入时中断
+                    logger.warning(f'跳过损坏的断点记录: {self.path}')
+                    continue
+                if line.endswith(b'\n'):
+                    valid = f.tell()
+                kind = event.get('e')
+                if kind == 'page':
+                    self._pages[event['page']] = event['items']
+                    if event.get('maxPage') is not None:
+                        self.maxPage = event['maxPage']
+                elif kind == 'enriched':
+                    for page in event['pages']:
+                        self._enriched[page] = []
+                    self._enriched[event['pages'][0]] = event['items']
+                elif kind == 'detail':
+                    self._details[event['asin']] = event['item']
+        # todo 截掉不完整的最后一行，避免与后续记录拼在一起
+        if valid < os.path.getsize(self.path):
+            os.truncate(self.path, valid)
+        logger.info(f'从断点继续 {self.path}: 页 {len(self._pages)}，已补全页 {len(self._enriched)}，'
+                    f'已采集详情 {len(self._details)}')
+        return True
+
+    def _append(self, event: Dict[str, Any]):
+        line = json.dumps(event, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    # todo ---------- 搜索页 ----------
+    def page(self, page: int) -> Optional[Dict[str, Any]]:
+        """已抓取的页，格式与 crawl_category_integration 返回值相同；未抓取返回 None"""
+        if page not in self._pages:
+            return None
+        return {'items': self._pages[page], 'page': page, 'maxPage': self.maxPage}
+
+    def record_page(self, page: int, items: List[Dict[str, Any]], maxPage: Optional[int] = None):
+        self._pages[page] = items
+        if maxPage is not None:
+            self.maxPage = maxPage
+        self._append({'e': 'page', 'page': page, 'items': items, 'maxPage': maxPage})
+
+    # todo ---------- 补全 ----------
+    @property
+    def next_page(self) -> int:
+        """第一个未补全的页码"""
+        return max(self._enriched, default=0) + 1
+
+    @property
+    def enriched_items(self) -> List[Dict[str, Any]]:
+        """已补全的 items (按页顺序)"""
+        return [item for page in sorted(self._enriched) for item in self._enriched[page]]
+
+    def record_enriched(self, pages: List[int], items: List[Dict[str, Any]]):
+        """一批页补全完成 (补全结果按批返回，记在第一页下)"""
+        pages = sorted(pages)
+        for page in pages:
+            self._enriched[page] = []
+        self._enriched[pages[0]] = items
+        self._append({'e': 'enriched', 'pages': pages, 'items': items})
+
+    # todo ---------- 详情 ----------
+    @property
+    def details(self) -> Dict[str, Dict[str, Any]]:
+        """已采集详情的 asin -> 合并后的 item"""
+        return dict(self._details)
+
+    def record_detail(self, asin: str, item: Dict[str, Any]):
+        self._details[asin] = item
+        self._append({'e': 'detail', 'asin': asin, 'item': item})
+
+    def complete(self):
+        """运行完成，删除日志"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        logger.info(f'运行完成，已删除断点日志 {self.path}')
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
@@ -0,0 +1,341 @@
+# todo 历史采集 JSONL 文件的本地索引 (asin -> 文件 + 偏移，数值列可筛选)
+# 运行:
+#   python -m tool.dump_index build [文件或通配符 ...]      建立 / 增量更新索引
+#   python -m tool.dump_index asin B0XXXXXXXX [--full]      asin 出现在哪些文件
+#   python -m tool.dump_index scan --max-rank 100 --min-price 10 --order-by units --desc --limit 20
+import argparse
+import glob
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import sys
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config.config import dump_index_config
+from tool.records import _to_float, _to_int, _to_price
+
+logger = logging.getLogger(__name__)
+
+# todo (列名, 转换函数, 来源字段)；来源字段依次取第一个不为 None 的
+NUMERIC_COLUMNS = [
+    ('rank', _to_int, ('rank',)),
+    ('bsrRank', _to_int, ('bsrRank',)),
+    ('price', _to_price, ('current_price', 'price')),
+    ('units', _to_int, ('units',)),
+    ('rating', _to_float, ('rating',)),
+    ('reviews', _to_int, ('reviewCount', 'reviews')),
+]
+_NUMERIC_NAMES = [name for name, _, _ in NUMERIC_COLUMNS]
+
+
+def _numeric(item: Dict[str, Any]) -> List[Any]:
+    values = []
+    for _, conv, sources in NUMERIC_COLUMNS:
+        value = next((item[s] for s in sources if item.get(s) is not None), None)
+        try:
+            values.append(conv(value))
+        except (TypeError, ValueError):
+            values.append(None)
+    return values
+
+
+class DumpIndex:
+    """
+    JSONL 采集文件索引 (SQLite)
+
+    功能特点:
+    - 建索引时用 mmap 逐行扫描，每行记录 (文件, 偏移, 长度, asin, 数值列)
+    - 文件只追加时增量索引新增部分，文件变小 / 被替换时重建
+    - 查询只读取命中的行 (mmap 切片)，不需要加载整个文件
+    - gzip / zstd 压缩的分段不能按偏移读取，跳过
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        :param path: 索引文件路径，默认 dump_index_config['path']
+        """
+        path = path or dump_index_config['path']
+        self.path = path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                head TEXT
+            )
+        """)
+        columns = ', '.join(f'"{name}" REAL' for name in _NUMERIC_NAMES)
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS rows (
+                file_id INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                asin TEXT,
+                {columns},
+                PRIMARY KEY (file_id, offset)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rows_asin ON rows (asin)")
+        for name in _NUMERIC_NAMES:
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_rows_{name}" ON rows ("{name}")')
+        self._conn.commit()
+        self._maps = {}  # path -> (file, mmap)
+
+    # todo ---------- 建索引 ----------
+    @staticmethod
+    def _head(mm) -> str:
+        """文件开头 (用于判断文件是否被替换)"""
+        return mm[:256].decode('utf-8', 'replace')
+
+    def build(self, patterns: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        建立 / 增量更新索引
+        :param patterns: 文件路径或通配符，默认 dump_index_config['patterns']
+        :return: 每个文件新增的行数
+        """
+        paths = set()
+        for pattern in patterns or dump_index_config['patterns']:
+            paths.update(glob.glob(pattern, recursive=True))
+        result = {}
+        for path in sorted(paths):
+            if path.endswith(('.gz', '.zst', '.part')) or not os.path.isfile(path):
+                continue
+            try:
+                result[path] = self.index_file(path)
+            except (OSError, ValueError) as e:
+                logger.error(f'索引文件失败 {path}: {e}')
+        # todo 已删除的文件从索引中移除
+        with self._lock:
+            for row in self._conn.execute("SELECT id, path FROM files").fetchall():
+                if not os.path.exists(row['path']):
+                    self._drop_file(row['id'], row['path'])
+            self._conn.commit()
+        return result
+
+    def _drop_file(self, file_id: int, path: str):
+        self._conn.execute("DELETE FROM rows WHERE file_id = ?", (file_id,))
+        self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        self._close_map(path)
+
+    def index_file(self, path: str) -> int:
+        """
+        索引一个 JSONL 文件 (只处理上次索引之后追加的部分)
+        :return: 新增行数
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        if stat.st_size == 0:
+            return 0
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            head = self._head(mm)
+            with self._lock:
+                known = self._conn.execute("SELECT * FROM files WHERE path = ?", (path,)).fetchone()
+                start = 0
+                if known is not None:
+                    if known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+                        return 0
+                    if known['size'] <= stat.st_size and known['head'] == head[:len(known['head'] or '')]:
+                        start = known['size']
+                    else:
+                        self._drop_file(known['id'], path)
+                        known = None
+                if known is None:
+                    cursor = self._conn.execute(
+                        "INSERT INTO files (path, size, mtime, head) VALUES (?, 0, 0, ?)", (path, head))
+                    file_id = cursor.lastrowid
+                else:
+                    file_id = known['id']
+
+                rows = []
+                # todo 最后一行没有换行符时可能还在写入，下次从该行重新索引
+                end = mm.rfind(b'\n', start) + 1 or start
+                for offset, line in self._lines(mm, start):
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(item, dict):
+                        continue
+                    rows.append((file_id, offset, len(line), item.get('asin'), *_numeric(item)))
+                placeholders = ', '.join(['?'] * (4 + len(_NUMERIC_NAMES)))
+                self._conn.executemany(f"INSERT OR REPLACE INTO rows VALUES ({placeholders})", rows)
+                self._conn.execute("UPDATE files SET size = ?, mtime = ?, head = ? WHERE id = ?",
+                                   (end, stat.st_mtime, head, file_id))
+                self._conn.commit()
+        self._close_map(path)
+        if rows:
+            logger.info(f'已索引 {path}: 新增 {len(rows)} 行')
+        return len(rows)
+
+    @staticmethod
+    def _lines(mm, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+        """(偏移, 行内容) ，只返回以换行符结尾的完整行"""
+        pos = start
+        while True:
+            end = mm.find(b'\n', pos)
+            if end == -1:
+                return
+            line = mm[pos:end].rstrip(b'\r')
+            if line.strip():
+                yield pos, line
+            pos = end + 1
+
+    # todo ---------- 查询 ----------
+    def _map(self, path: str):
+        if path not in self._maps:
+            f = open(path, 'rb')
+            self._maps[path] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return self._maps[path][1]
+
+    def _close_map(self, path: str):
+        entry = self._maps.pop(path, None)
+        if entry is not None:
+            entry[1].close()
+            entry[0].close()
+
+    def read(self, path: str, offset: int, length: int) -> Optional[Dict[str, Any]]:
+        """按偏移读取一行"""
+        try:
+            return json.loads(self._map(path)[offset:offset + length])
+        except (OSError, ValueError) as e:
+            logger.error(f'读取失败 {path}@{offset}: {e}')
+            return None
+
+    def lookup(self, asin: str, full: bool = False) -> List[Dict[str, Any]]:
+        """
+        asin 出现的位置
+        :param full: 是否读取完整 item
+        :return: [{path, offset, length, rank, price, ..., item?}]，按文件修改时间排序
+        """
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute("""
+                SELECT f.path, f.mtime, r.* FROM rows r JOIN files f ON f.id = r.file_id
+                WHERE r.asin = ? ORDER BY f.mtime, r.offset
+            """, (asin,))]
+        return [self._result(row, full) for row in rows]
+
+    def scan(self, filters: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+             order_by: Optional[str] = None, limit: Optional[int] = 100, full: bool = False,
+             path_like: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按数值列筛选
+        :param filters: {列名: (最小值, 最大值)}，None 表示不限，例如 {'rank': (None, 100)}
+        :param order_by: 排序列，前缀 - 为降序，例如 '-units'
+        :param limit: 返回条数
+        :param path_like: 只查询路径包含该字符串的文件，例如 '_DE_'
+        """
+        where, params = [], []
+        for name, (low, high) in (filters or {}).items():
+            if name not in _NUMERIC_NAMES:
+                raise ValueError(f'没有索引的列: {name}')
+            if low is not None:
+                where.append(f'r."{name}" >= ?')
+                params.append(low)
+            if high is not None:
+                where.append(f'r."{name}" <= ?')
+                params.append(high)
+        if path_like:
+            where.append("f.path LIKE ?")
+            params.append(f'%{path_like}%')
+        sql = "SELECT f.path, f.mtime, r.* FROM rows r JOIN files f ON f.id = r.file_id"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if order_by:
+            name = order_by.lstrip('-')
+            if name not in _NUMERIC_NAMES:
+                raise ValueError(f'没有索引的列: {name}')
+            sql += f' ORDER BY r."{name}" IS NULL, r."{name}" {"DESC" if order_by.startswith("-") else "ASC"}'
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute(sql, params)]
+        return [self._result(row, full) for row in rows]
+
+    def _result(self, row: Dict[str, Any], full: bool) -> Dict[str, Any]:
+        row.pop('file_id', None)
+        if full:
+            row['item'] = self.read(row['path'], row['offset'], row['length'])
+        return row
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            files = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            rows = self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+            asins = self._conn.execute("SELECT COUNT(DISTINCT asin) FROM rows").fetchone()[0]
+        return {'files': files, 'rows': rows, 'asins': asins}
+
+    def close(self):
+        for path in list(self._maps):
+            self._close_map(path)
+        with self._lock:
+            self._conn.close()
+
+
+def _print(rows: List[Dict[str, Any]], full: bool):
+    for row in rows:
+        if full:
+            print(json.dumps(row, ensure_ascii=False, default=str))
+        else:
+            values = ' '.join(f'{name}={row[name]:g}' for name in _NUMERIC_NAMES if row.get(name) is not None)
+            print(f"{row['asin']}  {row['path']}@{row['offset']}  {values}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tool.dump_index', description='历史采集 JSONL 文件索引')
+    parser.add_argument('--index', help='索引文件路径')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='建立 / 增量更新索引')
+    build.add_argument('patterns', nargs='*', help='文件或通配符，默认配置中的目录')
+
+    asin = sub.add_parser('asin', help='查询 asin 出现的位置')
+    asin.add_argument('asins', nargs='+')
+    asin.add_argument('--full', action='store_true', help='输出完整 item')
+
+    scan = sub.add_parser('scan', help='按数值列筛选')
+    for name in _NUMERIC_NAMES:
+        scan.add_argument(f'--min-{name.lower()}', dest=f'min_{name}', type=float)
+        scan.add_argument(f'--max-{name.lower()}', dest=f'max_{name}', type=float)
+    scan.add_argument('--order-by', help='排序列，例如 units')
+    scan.add_argument('--desc', action='store_true', help='降序')
+    scan.add_argument('--file', dest='path_like', help='只查询路径包含该字符串的文件')
+    scan.add_argument('--limit', type=int, default=50)
+    scan.add_argument('--full', action='store_true', help='输出完整 item')
+
+    sub.add_parser('stats', help='索引统计')
+
+    args = parser.parse_args(argv)
+    index = DumpIndex(args.index)
+    try:
+        if args.command == 'build':
+            result = index.build(args.patterns or None)
+            print(f'新增 {sum(result.values())} 行，{index.stats()}')
+        elif args.command == 'asin':
+            for a in args.asins:
+                _print(index.lookup(a, full=args.full), args.full)
+        elif args.command == 'scan':
+            filters = {name: (getattr(args, f'min_{name}'), getattr(args, f'max_{name}'))
+                       for name in _NUMERIC_NAMES}
+            filters = {k: v for k, v in filters.items() if v != (None, None)}
+            order_by = f"{'-' if args.desc else ''}{args.order_by}" if args.order_by else None
+            _print(index.scan(filters, order_by=order_by, limit=args.limit,
+                              full=args.full, path_like=args.path_like), args.full)
+        elif args.command == 'stats':
+            print(index.stats())
+    finally:
+        index.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# todo 图片下载与缩略图缓存 (Excel 导出使用)
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, Iterable, Optional
+
+import requests
+from PIL import Image as PILImage, UnidentifiedImageError
+from requests.adapters import HTTPAdapter
+
+from config.config import image_cache_config
+
+logger = logging.getLogger(__name__)
+
+
+class ImageCache:
+    """
+    图片缩略图缓存
+
+    功能特点:
+    - prefetch 并发下载一批 url，每张图独立重试
+    - 下载后用 Pillow 缩小为缩略图 (JPEG)，按原图内容哈希存放，不同 url 的同一张图只存一份
+    - url -> 哈希 记录在 SQLite，重复导出时不再下载
+
+    使用示例:
+    image_cache.prefetch(urls)
+    data = image_cache.get(url)  # BytesIO 或 None
+    """
+
+    def __init__(self, path: str, size: int = 160, quality: int = 85, max_workers: int = 16,
+                 timeout: float = 10, retries: int = 3):
+        """
+        :param path: 缓存目录 (相对路径基于当前工作目录)
+        :param size: 缩略图最长边像素 (Excel 中显示 60-80px，取 2 倍保证清晰)
+        :param quality: JPEG 质量
+        :param max_workers: 并发下载数
+        :param timeout: 单次请求超时(秒)
+        :param retries: 每张图的最大尝试次数
+        """
+        self.path = path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+        self.size = size
+        self.quality = quality
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._session = None
+        self._failed = set()  # todo 本进程内失败过的 url 不再重复下载
+
+    def _connect(self):
+        """首次使用时打开索引"""
+        if self._conn is None:
+            os.makedirs(self.path, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.path, 'index.db'), check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS images (
+                    url TEXT PRIMARY KEY,
+                    hash TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _get_session(self) -> requests.Session:
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            self._session = session
+        return self._session
+
+    def _file(self, digest: str) -> str:
+        return os.path.join(self.path, digest[:2], f'{digest}.jpg')
+
+    def _lookup(self, url: str) -> Optional[str]:
+        """已缓存的缩略图文件，没有返回 None"""
+        with self._lock:
+            row = self._connect().execute("SELECT hash FROM images WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        path = self._file(row[0])
+        return path if os.path.exists(path) else None
+
+    def thumbnail(self, content: bytes) -> bytes:
+        """原图 -> JPEG 缩略图 (透明背景填充为白色)"""
+        with PILImage.open(BytesIO(content)) as img:
+            img.draft('RGB', (self.size, self.size))  # todo JPEG 解码时直接缩小，省内存和时间
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('RGBA')
+                background = PILImage.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel('A'))
+                img = background
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+            img.thumbnail((self.size, self.size), PILImage.LANCZOS)
+            out = BytesIO()
+            img.save(out, 'JPEG', quality=self.quality, optimize=True)
+            return out.getvalue()
+
+    def fetch(self, url: str) -> Optional[str]:
+        """
+        下载并缓存一张图
+        :return: 缩略图文件路径，失败返回 None
+        """
+        path = self._lookup(url)
+        if path is not None or url in self._failed:
+            return path
+        for attempt in range(1, self.retries + 1):
+            try:
+                response = self._get_session().get(url, timeout=self.timeout)
+                response.raise_for_status()
+                digest = hashlib.sha1(response.content).hexdigest()
+                path = self._file(digest)
+                if not os.path.exists(path):
+                    data = self.thumbnail(response.content)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp = f'{path}.{threading.get_ident()}.part'
+                    with open(tmp, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmp, path)
+                with self._lock:
+                    conn = self._connect()
+                    conn.execute("INSERT OR REPLACE INTO images (url, hash, fetched_at) VALUES (?, ?, ?)",
+                                 (url, digest, time.time()))
+                    conn.commit()
+                return path
+            except requests.RequestException as e:
+                logger.warning(f'下载图片失败 {url} (第 {attempt} 次): {e}')
+            except (UnidentifiedImageError, OSError, ValueError) as e:
+                # todo 不是图片 (或无法解码) 不必重试
+                logger.error(f'图片无法解析 {url}: {e}')
+                self._failed.add(url)
+                return None
+            if attempt < self.retries:
+                time.sleep(attempt)
+        logger.error(f'下载图片失败 {url}: 已重试 {self.retries} 次')
+        self._failed.add(url)
+        return None
+
+    def prefetch(self, urls: Iterable[Optional[str]]) -> Dict[str, Optional[str]]:
+        """
+        并发下载一批图片 (已缓存的跳过)
+        :return: {url: 缩略图文件路径或 None}
+        """
+        urls = [url for url in dict.fromkeys(urls) if url]
+        if not urls:
+            return {}
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            result = dict(zip(urls, executor.map(self.fetch, urls)))
+        failed = sum(1 for path in result.values() if path is None)
+        logger.info(f'图片预取完成: {len(urls)} 张，失败 {failed} 张，用时 {time.monotonic() - start:.1f} 秒')
+        return result
+
+    def get(self, url: str) -> Optional[BytesIO]:
+        """缩略图内容 (未缓存时同步下载)，失败返回 None"""
+        if not url:
+            return None
+        path = self.fetch(url)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return BytesIO(f.read())
+
+
+image_cache = ImageCache(**image_cache_config)
@@ -1,10 +1,11 @@
 import logging
 import os
 
-import execjs
 import json
 import time
 import hashlib
+from functools import lru_cache
+
 import requests
 
 """
@@ -12,7 +13,7 @@ import requests
     export_tk 函数 
         传入参数 shop_id -> user
                 password
-        返回 js 加密的 tk 值
+        返回 tk 值 (js/export_tk.js 的 Python 实现，按入参缓存)
     md5_encrypt 函数
         传入 password
         返回 password 哈希值
@@ -24,11 +25,109 @@ import requests
 
 logger = logging.getLogger(__name__)
 
+# todo tk 签名常量 对应 js/export_tk.js 中的 '400801.1364508470'
+_TK_SEED = 400801
+_TK_XOR = 1364508470
+
+
+def _to_int32(x):
+    """JS ToInt32"""
+    x &= 0xFFFFFFFF
+    return x - 0x100000000 if x & 0x80000000 else x
+
+
+def _tk_mix(e, ops):
+    """对应 js 中 _cal 内部的 n(e, t) 位运算"""
+    for i in range(0, len(ops) - 2, 3):
+        r = ops[i + 2]
+        r = ord(r) - 87 if 'a' <= r else int(r)
+        # todo >>> 按无符号右移，<< 按有符号 32 位左移
+        r = (e & 0xFFFFFFFF) >> r if ops[i + 1] == '+' else _to_int32(e << r)
+        e = _to_int32(e + r) if ops[i] == '+' else _to_int32(e ^ r)
+    return e
+
+
+def _js_str(v):
+    """JS toString 的常用类型对照"""
+    if isinstance(v, bool):
+        return 'true' if v else 'false'
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def _cal(e):
+    """
+    js/export_tk.js 中 _cal 的 Python 实现，输出与 js 逐位一致
+    :param e: 拼接后的签名原文
+    :return: tk
+    """
+    # todo js 按 UTF-16 处理字符串，先合并代理对，孤立代理按 3 字节编码
+    e = e.encode('utf-16-le', 'surrogatepass').decode('utf-16-le', 'surrogatepass')
+    data = e.encode('utf-8', 'surrogatepass')
+    v = _TK_SEED
+    for b in data:
+        v = _tk_mix(v + b, '+-a^+6')
+    v = _tk_mix(v, '+-3^+b+-f')
+    v = _to_int32(v ^ _TK_XOR)
+    if v < 0:
+        v = 2147483648 + (2147483647 & v)
+    r = v % 1000000
+    return f'{r}.{r ^ _TK_SEED}'
+
+
+def sellersprite_token(*args):
+    """
+    js/export_tk.js 中 sellersprite_token 的 Python 实现
+    :param args: 最多 4 个参数，空值跳过，列表按元素展开
+    :return: tk
+    """
+    a = []
+    for s in args[:4]:
+        if not s:
+            continue
+        if isinstance(s, (list, tuple)):
+            a.extend('' if v is None else _js_str(v) for v in s)
+        elif len(_js_str(s)) > 0:
+            a.append(_js_str(s))
+    return '' if len(a) < 1 else _cal(''.join(a))
+
+
+@lru_cache(maxsize=4096)
 def export_tk(shop_id, password=''):
-    with open(os.path.join(os.getcwd(), 'js\\export_tk.js'), 'r', encoding='utf-8') as f:
+    return sellersprite_token(shop_id, password)
+
+
+def _export_tk_js(shop_id, password=''):
+    """原 js 实现 (需要 PyExecJS 与 js 运行时)，仅用于校验"""
+    import execjs
+    with open(os.path.join(os.getcwd(), 'js', 'export_tk.js'), 'r', encoding='utf-8') as f:
         js_code = f.read()
-    ctx = execjs.compile(js_code).call('sellersprite_token', shop_id, password)
-    return ctx
+    return execjs.compile(js_code).call('sellersprite_token', shop_id, password)
+
+
+def check_tk_corpus(corpus=None, with_js=False):
+    """
+    用录制的语料校验 Python 版 tk 与 js 版输出一致
+    :param corpus: 语料文件，默认 js/export_tk_corpus.json (由 js 版生成)
+    :param with_js: 是否同时调用 js 运行时实时比对
+    :return: 不一致的条目列表
+    """
+    if corpus is None:
+        corpus = os.path.join(os.getcwd(), 'js', 'export_tk_corpus.json')
+    with open(corpus, 'r', encoding='utf-8') as f:
+        cases = json.load(f)
+    mismatches = []
+    for case in cases:
+        args = case.get('args')
+        tk = sellersprite_token(*args)
+        expected = case.get('tk')
+        if with_js and len(args) <= 2:
+            expected = _export_tk_js(*args)
+        if tk != expected:
+            mismatches.append({'args': args, 'expected': expected, 'actual': tk})
+    logger.info(f'tk 语料校验完成: {len(cases)} 条, 不一致 {len(mismatches)} 条')
+    return mismatches
 
 
 def md5_encrypt(data):
@@ -0,0 +1,126 @@
+# todo 卖家精灵 competitor-lookup 结果本地缓存
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Any
+
+from config.config import sellersprite_cache
+
+logger = logging.getLogger(__name__)
+
+
+class LookupCache:
+    """
+    按 asin + 站点 + 接口 缓存卖家精灵查询结果 (SQLite)
+
+    同一次运行中 search_product / selection_slave / Excel 导出会多次查询同一 asin,
+    命中缓存且未过期的 asin 不再请求接口
+    """
+
+    def __init__(self, path: str, ttl: int = 24 * 3600):
+        """
+        :param path: SQLite 文件路径 (相对路径基于当前工作目录)
+        :param ttl: 缓存有效期(秒)
+        """
+        self.path = path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        """首次使用时打开数据库"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lookup_cache (
+                    site TEXT NOT NULL,
+                    endpoint TEXT NOT NULL,
+                    asin TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (site, endpoint, asin)
+                ) WITHOUT ROWID
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, site: str, endpoint: str, asins: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量读取未过期的缓存
+        :param site: 站点
+        :param endpoint: 接口名
+        :param asins: asin 列表
+        :return: {asin: data}
+        """
+        if not asins or self.ttl <= 0:
+            return {}
+        expire = time.time() - self.ttl
+        result = {}
+        with self._lock:
+            conn = self._connect()
+            # todo SQLite 变量上限 999，分批查询
+            for i in range(0, len(asins), 500):
+                chunk = asins[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT asin, data FROM lookup_cache WHERE site = ? AND endpoint = ? "
+                    f"AND updated_at > ? AND asin IN ({', '.join(['?'] * len(chunk))})",
+                    [site, endpoint, expire, *chunk]
+                ).fetchall()
+                for asin, data in rows:
+                    try:
+                        result[asin] = json.loads(data)
+                    except Exception as e:
+                        logger.warning(f'缓存数据损坏 {asin}: {e}')
+        return result
+
+    def put_many(self, site: str, endpoint: str, items: List[Dict[str, Any]]):
+        """
+        批量写入缓存
+        :param site: 站点
+        :param endpoint: 接口名
+        :param items: 接口返回的数据列表 (需包含 asin)
+        """
+        now = time.time()
+        rows = []
+        for item in items:
+            asin = item.get('asin')
+            if not asin:
+                continue
+            try:
+                rows.append((site, endpoint, asin, json.dumps(item, ensure_ascii=False), now))
+            except Exception as e:
+                logger.error(f'序列化缓存数据失败 {asin}: {e}')
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO lookup_cache (site, endpoint, asin, data, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+            conn.commit()
+
+    def purge(self):
+        """删除过期缓存"""
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute("DELETE FROM lookup_cache WHERE updated_at <= ?", (time.time() - self.ttl,))
+            conn.commit()
+            logger.info(f'清理过期缓存 {cursor.rowcount} 条')
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# todo 全局单例
+lookup_cache = LookupCache(**sellersprite_cache)
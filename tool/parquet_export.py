@@ -0,0 +1,283 @@
+# todo 采集结果导出 Parquet (列式存储，分析时只读需要的列)
+# 运行: python -m tool.parquet_export temp/selection/amazon_xxx.json [...]
+import json
+import logging
+import os
+import re
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from tool.records import _to_float, _to_int, _to_price
+
+logger = logging.getLogger(__name__)
+
+
+def _to_str(value):
+    if value is None:
+        return None
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def _to_bool(value):
+    return None if value is None else bool(value)
+
+
+def _to_percent(value):
+    """'-20%' -> -20.0"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r'-?\d+(?:[.,]\d+)?', str(value))
+    return float(match.group().replace(',', '.')) if match else None
+
+
+def _to_list(value):
+    """JSON 字符串或 list -> list"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    return value if isinstance(value, list) else None
+
+
+def _structs(fields):
+    """list<struct> 列: 只保留定义的字段并转换类型"""
+    def convert(value):
+        value = _to_list(value)
+        if value is None:
+            return None
+        return [{name: conv(e.get(name)) for name, _, conv in fields} for e in value if isinstance(e, dict)]
+    return convert
+
+
+def _struct_type(fields):
+    return pa.list_(pa.struct([(name, pa_type) for name, pa_type, _ in fields]))
+
+
+_BSR_FIELDS = [
+    ('id', pa.string(), _to_str),
+    ('label', pa.string(), _to_str),
+    ('rank', pa.int64(), _to_int),
+    ('main', pa.bool_(), _to_bool),
+    ('href', pa.string(), _to_str),
+    ('text', pa.string(), _to_str),
+]
+_SIMILAR_FIELDS = [
+    ('asin', pa.string(), _to_str),
+    ('title', pa.string(), _to_str),
+    ('byLine', pa.string(), _to_str),
+    ('glProductGroup', pa.string(), _to_str),
+    ('imageUrl', pa.string(), _to_str),
+    ('price', pa.float64(), _to_price),
+    ('listPrice', pa.float64(), _to_price),
+    ('averageOverallRating', pa.float64(), _to_float),
+    ('totalReviewCount', pa.int64(), _to_int),
+]
+_SUBCATEGORY_FIELDS = [
+    ('code', pa.string(), _to_str),
+    ('label', pa.string(), _to_str),
+    ('rank', pa.int64(), _to_int),
+]
+_TREND_FIELDS = [
+    ('dk', pa.string(), _to_str),
+    ('sales', pa.int64(), _to_int),
+]
+
+# todo (列名, 类型, 转换函数)，未列出的字段存入 extras (JSON)
+COLUMNS = [
+    ('asin', pa.string(), _to_str),
+    ('parent', pa.string(), _to_str),
+    ('title', pa.string(), _to_str),
+    ('brand', pa.string(), _to_str),
+    ('imageUrl', pa.string(), _to_str),
+    ('itemWEB', pa.string(), _to_str),
+    ('station', pa.string(), _to_str),
+    ('currency', pa.string(), _to_str),
+    ('nodeId', pa.int64(), _to_int),
+    ('nodeLabelPath', pa.string(), _to_str),
+    ('categoryName', pa.string(), _to_str),
+    ('rank', pa.int64(), _to_int),
+    ('bsrRank', pa.int64(), _to_int),
+    ('bsrLabel', pa.string(), _to_str),
+    ('bsrRankCv', pa.int64(), _to_int),
+    ('bsrRankCr', pa.float64(), _to_float),
+    ('price', pa.float64(), _to_price),
+    ('averagePrice', pa.float64(), _to_price),
+    ('current_price', pa.float64(), _to_price),
+    ('original_price', pa.float64(), _to_price),
+    ('discount_percentage', pa.float64(), _to_percent),
+    ('fba', pa.float64(), _to_float),
+    ('profit', pa.float64(), _to_float),
+    ('units', pa.int64(), _to_int),
+    ('totalUnits', pa.int64(), _to_int),
+    ('totalAmount', pa.float64(), _to_float),
+    ('totalUnitsGrowth', pa.float64(), _to_float),
+    ('totalAmountGrowth', pa.float64(), _to_float),
+    ('amzUnit', pa.int64(), _to_int),
+    ('rating', pa.float64(), _to_float),
+    ('reviews', pa.int64(), _to_int),
+    ('reviewCount', pa.int64(), _to_int),
+    ('reviewsRate', pa.float64(), _to_float),
+    ('sellers', pa.int32(), _to_int),
+    ('sellerName', pa.string(), _to_str),
+    ('sellerType', pa.string(), _to_str),
+    ('sellerNation', pa.string(), _to_str),
+    ('variations', pa.int32(), _to_int),
+    ('lqs', pa.int32(), _to_int),
+    ('availableDays', pa.int32(), _to_int),
+    ('availableDate', pa.timestamp('ms'), _to_int),
+    ('updatedTime', pa.timestamp('ms'), _to_int),
+    ('material', pa.string(), _to_str),
+    ('description', pa.string(), _to_str),
+    ('bsrList', _struct_type(_BSR_FIELDS), _structs(_BSR_FIELDS)),
+    ('similarList', _struct_type(_SIMILAR_FIELDS), _structs(_SIMILAR_FIELDS)),
+    ('subcategories', _struct_type(_SUBCATEGORY_FIELDS), _structs(_SUBCATEGORY_FIELDS)),
+    ('trends', _struct_type(_TREND_FIELDS), _structs(_TREND_FIELDS)),
+    ('aliexpress', pa.string(), _to_str),
+]
+SCHEMA = pa.schema([(name, pa_type) for name, pa_type, _ in COLUMNS] + [('extras', pa.string())])
+_COLUMN_NAMES = frozenset(name for name, _, _ in COLUMNS)
+
+
+def _row(item: Dict[str, Any]) -> Dict[str, Any]:
+    row = {}
+    for name, _, conv in COLUMNS:
+        try:
+            row[name] = conv(item.get(name))
+        except (TypeError, ValueError, AttributeError):
+            row[name] = None
+    if row['imageUrl'] is None:
+        row['imageUrl'] = _to_str(item.get('image'))
+    extras = {k: v for k, v in item.items() if k not in _COLUMN_NAMES}
+    row['extras'] = json.dumps(extras, ensure_ascii=False, default=str) if extras else None
+    return row
+
+
+def items_to_table(items: List[Dict[str, Any]]) -> pa.Table:
+    """items -> 固定 schema 的 Arrow 表"""
+    return pa.Table.from_pylist([_row(item) for item in items], schema=SCHEMA)
+
+
+class ParquetExporter:
+    """
+    流式写入 Parquet，每 row_group_size 条写一个 row group，内存占用与总数据量无关
+
+    使用示例:
+    with ParquetExporter('temp/selection/amazon_xxx.parquet') as exporter:
+        exporter.write_many(items)
+
+    读取: pandas.read_parquet(path, columns=['asin', 'price', 'bsrRank', 'units'])
+    """
+
+    def __init__(self, path: str, row_group_size: int = 10000, compression: str = 'zstd'):
+        """
+        :param path: 输出文件
+        :param row_group_size: 每个 row group 的条数
+        :param compression: Parquet 压缩方式
+        """
+        self.path = path
+        self.row_group_size = row_group_size
+        self.rows = 0
+        self._buffer = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._writer = pq.ParquetWriter(path + '.part', SCHEMA, compression=compression)
+
+    def write_many(self, items: Iterable[Dict[str, Any]]):
+        for item in items:
+            self._buffer.append(item)
+            if len(self._buffer) >= self.row_group_size:
+                self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._writer.write_table(items_to_table(self._buffer))
+            self.rows += len(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        """写完剩余数据，完成后原子重命名"""
+        if self._writer is None:
+            return
+        self._flush()
+        self._writer.close()
+        self._writer = None
+        os.replace(self.path + '.part', self.path)
+        logger.info(f'Parquet 导出完成 {self.path}: {self.rows} 条')
+
+    def abort(self):
+        """放弃导出，删除 .part 临时文件，保留旧的 Parquet 文件"""
+        if self._writer is None:
+            return
+        try:
+            self._writer.close()
+        finally:
+            self._writer = None
+            self._buffer = []
+            if os.path.exists(self.path + '.part'):
+                os.remove(self.path + '.part')
+        logger.warning(f'Parquet 导出失败，已放弃 {self.path}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def _open_text(path: str):
+    """按扩展名打开 JsonlWriter 写出的文件 (.gz / .zst / 未压缩)"""
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception(f'读取 zstd 文件需要安装 zstandard: {path}')
+        import io
+        raw = open(path, 'rb')
+        # todo 追加写入会产生多个 zstd frame，需要跨 frame 读取
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def _read_jsonl(path: str):
+    with _open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                logger.error(f'解析 JSON 失败 {path}: {e}')
+
+
+def export_jsonl(paths: List[str], out_path: Optional[str] = None, row_group_size: int = 10000) -> str:
+    """
+    JSONL 文件 (可多个分段) 导出为一个 Parquet 文件
+    :param paths: JSONL 文件列表
+    :param out_path: 输出文件，默认第一个文件名改为 .parquet
+    :return: 输出文件路径
+    """
+    if out_path is None:
+        out_path = re.sub(r'(\.\d{4})?\.json(\.gz|\.zst)?$', '', paths[0]) + '.parquet'
+    with ParquetExporter(out_path, row_group_size=row_group_size) as exporter:
+        for path in paths:
+            exporter.write_many(_read_jsonl(path))
+    return out_path
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    for arg in sys.argv[1:]:
+        export_jsonl([arg])
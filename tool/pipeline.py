@@ -1,5 +1,12 @@
+import gzip
 import json
 import logging
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from queue import Queue, Empty
 from typing import Any
 from typing import List, Dict, Optional
 import pymysql
@@ -8,10 +15,42 @@ from pymysql import Error
 from contextlib import contextmanager
 from mysql.connector import Error
 
-from config.config import db_config
+from config.config import db_config, storage_backend, sqlite_config
 
 logger = logging.getLogger(__name__)
 
+# todo 进程内已确认存在的表 (host, port, database, table)
+_schema_cache = set()
+
+# todo 合并存储: 所有类目、站点的产品存在一张表，按站点分区
+consolidated_table = 'amazon_products'
+consolidated_schema = {
+    "site": "VARCHAR(8) NOT NULL",
+    "cid": "VARCHAR(32) NOT NULL",
+    "asin": "VARCHAR(20) NOT NULL",
+    "image": "VARCHAR(255)",
+    "`rank`": "INT",
+    "title": "VARCHAR(500)",
+    "rating": "DECIMAL(2,1)",
+    "reviewCount": "INT",
+    "current_price": "VARCHAR(20)",
+    "discount_percentage": "VARCHAR(20)",
+    "original_price": "VARCHAR(20)",
+    "material": "TEXT",
+    "description": "TEXT",
+    "similarList": "TEXT",
+    'aliexpress': "TEXT",
+    'item': "TEXT",
+    "created_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+    "updated_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP",
+    "PRIMARY KEY": "(site, cid, asin)",
+    "INDEX idx_rank": "(site, cid, `rank`)",
+    "INDEX idx_updated_at": "(updated_at)",
+}
+consolidated_options = "PARTITION BY KEY(site) PARTITIONS 8"
+consolidated_key = ['site', 'cid', 'asin']
+
+
 def toJson(data: List[Dict[str, Any]], filename: str, wb="a"):
     """
     将数据写入 JSON 文件
@@ -19,23 +58,258 @@ def toJson(data: List[Dict[str, Any]], filename: str, wb="a"):
     :param filename: 文件名
     :param wb: 文件保存方式
     """
-    f = open(filename, wb, encoding='utf-8')
-    for item in data:
-        try:
-            json_str = json.dumps(item, ensure_ascii=False)
-            f.write(json_str + '\n')
-        except Exception as e:
-            logger.error(f"序列化数据失败: {e}")
-            continue
-    f.close()
+    with JsonlWriter(filename, mode=wb) as writer:
+        writer.write_many(data)
+
+
+class JsonlWriter:
+    """
+    JSONL 写入器 (长期持有，多线程安全)
+
+    功能特点:
+    - 内存缓冲，攒够 buffer_size 字节才写文件
+    - 可选 gzip / zstd 压缩 (zstd 需要安装 zstandard)
+    - 按大小或时间轮转分段文件
+    - mode='w' 时先写 .part 临时文件，分段完成后原子重命名
+    - fsync 策略: always 每次刷盘 / rotate 分段完成时 / never 交给系统
+
+    文件名: 不轮转时为 path；轮转时为 {path 去掉扩展名}.{序号:04d}{扩展名}
+    压缩时自动追加 .gz / .zst
+
+    使用示例:
+    with JsonlWriter('data/items.json', rotate_bytes=256 << 20) as writer:
+        writer.write(item)
+    """
+
+    _suffixes = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, path: str, mode: str = 'a', compression: Optional[str] = None,
+                 buffer_size: int = 1 << 20, rotate_bytes: Optional[int] = None,
+                 rotate_seconds: Optional[float] = None, fsync: str = 'rotate'):
+        """
+        :param path: 文件路径
+        :param mode: a 追加 / w 覆盖 (原子重命名)
+        :param compression: None / gzip / zstd
+        :param buffer_size: 缓冲字节数
+        :param rotate_bytes: 单个分段的最大字节数 (压缩前)，None 不按大小轮转
+        :param rotate_seconds: 单个分段的最长时间(秒)，None 不按时间轮转
+        :param fsync: always / rotate / never
+        """
+        if compression not in self._suffixes:
+            raise ValueError(f'不支持的压缩方式: {compression}')
+        self.path = path
+        self.mode = 'w' if mode.startswith('w') else 'a'
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._buffered = 0
+        self._index = 0
+        self._raw = None
+        self._stream = None
+        self._target = None
+        self._written = 0
+        self._opened_at = 0.0
+        self.files = []  # 已完成的文件
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _segment_path(self):
+        rotating = self.rotate_bytes is not None or self.rotate_seconds is not None
+        if rotating:
+            root, ext = os.path.splitext(self.path)
+            path = f'{root}.{self._index:04d}{ext}'
+        else:
+            path = self.path
+        return path + self._suffixes[self.compression]
+
+    def _open(self):
+        self._target = self._segment_path()
+        name = self._target + '.part' if self.mode == 'w' else self._target
+        self._raw = open(name, 'wb' if self.mode == 'w' else 'ab')
+        if self.compression == 'gzip':
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode='wb')
+        elif self.compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise Exception('zstd 压缩需要安装 zstandard')
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+        self._written = 0
+
+    def _flush_buffer(self):
+        if not self._buffer:
+            return
+        if self._stream is None:
+            self._open()
+        self._stream.write(b''.join(self._buffer))
+        self._written += self._buffered
+        self._buffer, self._buffered = [], 0
+        if self.fsync == 'always':
+            self._sync()
+
+    def _sync(self):
+        if self._stream is not self._raw:
+            self._stream.flush()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+
+    def _close_segment(self):
+        """关闭当前分段，w 模式下原子重命名"""
+        self._flush_buffer()
+        if self._stream is None:
+            return
+        if self._stream is not self._raw:
+            self._stream.close()
+        if self.fsync in ('always', 'rotate'):
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+        self._raw.close()
+        if self.mode == 'w':
+            os.replace(self._target + '.part', self._target)
+        self.files.append(self._target)
+        self._raw = self._stream = None
+        self._index += 1
+
+    def _should_rotate(self):
+        if self._stream is None and not self._buffer:
+            return False
+        if self.rotate_bytes is not None and self._written + self._buffered >= self.rotate_bytes:
+            return True
+        return self.rotate_seconds is not None and time.monotonic() - self._opened_at >= self.rotate_seconds
+
+    def write(self, item: Dict[str, Any]):
+        """写入一条数据"""
+        self.write_many([item])
+
+    def write_many(self, items: List[Dict[str, Any]]):
+        """写入多条数据，序列化在锁外完成"""
+        lines = []
+        for item in items:
+            try:
+                lines.append((json.dumps(item, ensure_ascii=False) + '\n').encode('utf-8'))
+            except Exception as e:
+                logger.error(f"序列化数据失败: {e}")
+        with self._lock:
+            for line in lines:
+                if self._stream is None and not self._buffer:
+                    # todo 分段从第一条数据开始计时
+                    self._opened_at = time.monotonic()
+                self._buffer.append(line)
+                self._buffered += len(line)
+                if self._buffered >= self.buffer_size:
+                    self._flush_buffer()
+                if self._should_rotate():
+                    self._close_segment()
+
+    def flush(self):
+        """缓冲写入文件 (不关闭分段)"""
+        with self._lock:
+            self._flush_buffer()
+            if self._stream is not None:
+                self._stream.flush()
+                if self._stream is not self._raw:
+                    self._raw.flush()
+
+    def close(self):
+        """写完缓冲并完成当前分段 (没有任何数据时也创建空文件)"""
+        with self._lock:
+            if self._stream is None and not self._buffer and not self.files:
+                self._open()
+            self._close_segment()
+
+    def abort(self):
+        """放弃当前分段: w 模式删除 .part 临时文件，不替换旧文件；a 模式写完已缓冲的数据"""
+        if self.mode != 'w':
+            self.close()
+            return
+        with self._lock:
+            self._buffer, self._buffered = [], 0
+            if self._stream is None:
+                return
+            try:
+                if self._stream is not self._raw:
+                    self._stream.close()
+                self._raw.close()
+            finally:
+                self._raw = self._stream = None
+                if os.path.exists(self._target + '.part'):
+                    os.remove(self._target + '.part')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # todo 出错时不提交 (不重命名) 不完整的文件
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+class Storage(ABC):
+    """
+    存储接口，MySQLPipeline 与 SQLitePipeline 行为一致:
+    - create_table_if_not_exists: 按 schema 字典建表
+    - batch_upsert: rank 必须更新，其他字段只有新值不为 NULL 时才更新
+    - execute_query: 执行 SQL (%s 占位符) 并返回 dict 列表
+    缺少任一抽象方法的后端在实例化时报错
+    """
+
+    @abstractmethod
+    def create_table_if_not_exists(self, table_name: str, schema: Dict, options: str = ''):
+        ...
+
+    @abstractmethod
+    def batch_upsert(self, table_name: str, data: List[Dict], primary_key: str = 'asin',
+                     batch_size: int = 100, schema: Optional[Dict] = None, mode: str = 'row',
+                     key_columns: Optional[List[str]] = None):
+        ...
 
+    @abstractmethod
+    def execute_query(self, query: str, params: Optional[tuple] = None):
+        ...
+
+    @abstractmethod
+    def drop_table(self, table_name: str):
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+    def create_consolidated_table(self):
+        """创建合并存储的产品表"""
+        self.create_table_if_not_exists(consolidated_table, consolidated_schema, consolidated_options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
-class MySQLPipeline:
+
+def create_storage(pool_size: int = 5) -> Storage:
+    """
+    按配置创建存储: storage_backend 为 mysql 时使用 MySQLPipeline，
+    sqlite 时写本地 SQLite，并按 sqlite_config 在后台同步到 MySQL
+    """
+    if storage_backend == 'sqlite':
+        from tool.sqlite_pipeline import SQLitePipeline
+        return SQLitePipeline(**sqlite_config)
+    return MySQLPipeline(**db_config, pool_size=pool_size)
+
+
+class MySQLPipeline(Storage):
     """
     MySQL 数据管道类 (PyMySQL 实现)
 
     功能特点:
-    - 连接池管理
+    - 连接池管理 (阻塞借出、超时、借出时 ping 校验、连接最大存活时间)
     - 批量插入/更新
     - 自动重试机制
     - 事务支持
@@ -44,7 +318,8 @@ class MySQLPipeline:
 
     def __init__(self, host: str, user: str, password: str, database: str,
                  port: int = 3306, charset: str = 'utf8mb4',
-                 pool_size: int = 5):
+                 pool_size: int = 5, timeout: float = 30,
+                 max_lifetime: float = 3600):
         """
         初始化MySQL管道
 
@@ -56,6 +331,8 @@ class MySQLPipeline:
             port: 端口号，默认3306
             charset: 字符集，默认utf8mb4
             pool_size: 连接池大小
+            timeout: 借出连接的最长等待时间(秒)
+            max_lifetime: 单个连接的最大存活时间(秒)，超过后借出时重建
         """
         self.host = host
         self.user = user
@@ -64,65 +341,165 @@ class MySQLPipeline:
         self.port = port
         self.charset = charset
         self.pool_size = pool_size
-        self.connection_pool = []
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self._max_allowed_packet = None
+        # todo 空闲连接队列，元素为 (conn, 创建时间)，conn 为 None 表示该位置需要重建连接
+        self.connection_pool = Queue(maxsize=pool_size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._metrics = {
+            'checkouts': 0,  # 借出次数
+            'timeouts': 0,  # 等待超时次数
+            'reconnects': 0,  # 重建连接次数
+            'wait_total': 0.0,  # 累计等待时间(秒)
+            'wait_max': 0.0,  # 最长等待时间(秒)
+        }
         self._initialize_pool()
 
+    def _connect(self):
+        """新建一个连接"""
+        return pymysql.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            port=self.port,
+            charset=self.charset,
+            cursorclass=pymysql.cursors.DictCursor
+        )
+
     def _initialize_pool(self):
         """初始化连接池"""
         try:
             for _ in range(self.pool_size):
-                conn = pymysql.connect(
-                    host=self.host,
-                    user=self.user,
-                    password=self.password,
-                    database=self.database,
-                    port=self.port,
-                    charset=self.charset,
-                    cursorclass=pymysql.cursors.DictCursor
-                )
-                self.connection_pool.append(conn)
+                self.connection_pool.put_nowait((self._connect(), time.monotonic()))
             logger.info(f"MySQL连接池初始化成功，大小: {self.pool_size}")
-        except Error as e:
+        except (Error, pymysql.MySQLError) as e:
             logger.error(f"初始化MySQL连接池失败: {e}")
             self._close_all_connections()
             raise
 
     def _close_all_connections(self):
-        """关闭所有连接"""
-        for conn in self.connection_pool:
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                conn, _ = self.connection_pool.get_nowait()
+            except Empty:
+                break
+            try:
+                if conn is not None:
+                    conn.close()
+            except:
+                pass
+
+    def _validate(self, conn, created_at):
+        """
+        借出前校验连接: 超过最大存活时间则重建，否则 ping (断开自动重连)
+        :return: (conn, created_at)
+        """
+        now = time.monotonic()
+        if conn is not None and now - created_at > self.max_lifetime:
             try:
                 conn.close()
             except:
                 pass
-        self.connection_pool = []
+            conn = None
+        if conn is not None:
+            try:
+                conn.ping(reconnect=True)
+                return conn, created_at
+            except pymysql.MySQLError as e:
+                logger.warning(f"MySQL连接失效，重新连接: {e}")
+                try:
+                    conn.close()
+                except:
+                    pass
+        with self._lock:
+            self._metrics['reconnects'] += 1
+        return self._connect(), now
 
     @contextmanager
     def get_connection(self):
         """
-        从连接池获取连接的上下文管理器
+        从连接池获取连接的上下文管理器 (连接池为空时阻塞等待，超时抛出异常)
 
         使用示例:
         with pipeline.get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("SELECT * FROM table")
         """
-        if not self.connection_pool:
-            raise Error("连接池未初始化或已耗尽")
+        start = time.monotonic()
+        try:
+            conn, created_at = self.connection_pool.get(timeout=self.timeout)
+        except Empty:
+            with self._lock:
+                self._metrics['timeouts'] += 1
+            raise Error(f"等待MySQL连接超时 ({self.timeout} 秒)")
+        waited = time.monotonic() - start
+        with self._lock:
+            self._in_use += 1
+            self._metrics['checkouts'] += 1
+            self._metrics['wait_total'] += waited
+            self._metrics['wait_max'] = max(self._metrics['wait_max'], waited)
 
-        conn = self.connection_pool.pop()
+        try:
+            conn, created_at = self._validate(conn, created_at)
+        except Exception:
+            # todo 连接失败时归还空位，避免连接池缩小
+            self._checkin(None, 0)
+            raise
         try:
             yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            # todo 连接级错误，丢弃该连接，下次借出时重建
+            try:
+                conn.close()
+            except:
+                pass
+            conn = None
+            raise
         finally:
-            self.connection_pool.append(conn)
+            self._checkin(conn, created_at)
+
+    def _checkin(self, conn, created_at):
+        """归还连接"""
+        with self._lock:
+            self._in_use -= 1
+        self.connection_pool.put_nowait((conn, created_at))
 
-    def create_table_if_not_exists(self, table_name: str, schema: Dict):
+    def stats(self):
         """
-        创建表（如果不存在）
+        连接池状态快照
+        :return: in_use / idle 数量，借出次数、超时次数、重建次数、平均与最长等待时间
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+            in_use = self._in_use
+        checkouts = metrics['checkouts']
+        return {
+            'size': self.pool_size,
+            'in_use': in_use,
+            'idle': self.connection_pool.qsize(),
+            'checkouts': checkouts,
+            'timeouts': metrics['timeouts'],
+            'reconnects': metrics['reconnects'],
+            'wait_avg': metrics['wait_total'] / checkouts if checkouts else 0.0,
+            'wait_max': metrics['wait_max'],
+        }
+
+    def create_table_if_not_exists(self, table_name: str, schema: Dict, options: str = ''):
+        """
+        创建表（如果不存在），同一进程内已确认存在的表不再重复执行 DDL
 
         参数:
             table_name: 表名
-            schema: 表结构定义字典
+            schema: 表结构定义字典 (键也可以是 PRIMARY KEY / INDEX 名称等约束)
+            options: 追加在表定义后的选项，例如分区定义
         """
+        cache_key = (self.host, self.port, self.database, table_name)
+        if cache_key in _schema_cache:
+            return
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
                 try:
@@ -136,11 +513,12 @@ class MySQLPipeline:
                     create_sql = f"""
                     CREATE TABLE IF NOT EXISTS {table_name} (
                         {', '.join(columns)}
-                    ) ENGINE=InnoDB DEFAULT CHARSET={self.charset};
+                    ) ENGINE=InnoDB DEFAULT CHARSET={self.charset} {options};
                     """
 
                     cursor.execute(create_sql)
                     conn.commit()
+                    _schema_cache.add(cache_key)
                     logger.info(f"表 {table_name} 已创建或已存在")
 
                 except Error as e:
@@ -151,7 +529,9 @@ class MySQLPipeline:
     def batch_upsert(self, table_name: str, data: List[Dict],
                      primary_key: str = 'asin',
                      batch_size: int = 100,
-                     schema: Optional[Dict] = None):
+                     schema: Optional[Dict] = None,
+                     mode: str = 'row',
+                     key_columns: Optional[List[str]] = None):
         """
         批量插入/更新数据（UPSERT操作）
 
@@ -159,8 +539,10 @@ class MySQLPipeline:
             table_name: 表名
             data: 要处理的数据列表
             primary_key: 主键字段名
-            batch_size: 每批次处理的数据量
+            batch_size: 每批次处理的数据量 (row 模式；bulk 模式每条 INSERT 按 max_allowed_packet 切分)
             schema: 表结构定义（可选，用于自动创建表）
+            mode: row 逐行 executemany；bulk 先多行写入临时表，再一条语句合并到目标表
+            key_columns: 唯一键字段 (bulk 模式临时表去重用)，默认 [primary_key]
         """
         if not data:
             logger.info("没有数据需要处理")
@@ -169,6 +551,10 @@ class MySQLPipeline:
         if schema:
             self.create_table_if_not_exists(table_name, schema)
 
+        if mode == 'bulk':
+            self._bulk_upsert(table_name, data, primary_key, key_columns=key_columns)
+            return
+
         total_records = len(data)
         processed = 0
         batches = (total_records // batch_size) + 1
@@ -205,15 +591,7 @@ class MySQLPipeline:
                     all_fields = [k for k in batch[0].keys() if k != primary_key]
 
                     # 构建动态的ON DUPLICATE KEY UPDATE部分
-                    update_clauses = ["`rank`=VALUES(`rank`)"]  # rank必须更新
-
-                    for field in all_fields:
-                        if field != 'rank':  # 已处理rank字段
-                            # 对于其他字段，只有当新值不为NULL时才更新
-                            update_clauses.append(
-                                f"`{field}`=IF(VALUES(`{field}`) IS NOT NULL, VALUES(`{field}`), `{field}`)")
-
-                    update_clause = ', '.join(update_clauses)
+                    update_clause = self._update_clause(all_fields)
 
                     # 构建完整的INSERT ... ON DUPLICATE KEY UPDATE语句
                     placeholders = ', '.join(['%s'] * len(all_fields))
@@ -243,6 +621,173 @@ class MySQLPipeline:
                     raise
 
 
+    @staticmethod
+    def _update_clause(all_fields: List[str], target: Optional[str] = None) -> str:
+        """
+        ON DUPLICATE KEY UPDATE 部分: rank 必须更新，其他字段只有新值不为 NULL 时才更新
+        :param target: INSERT ... SELECT 时用目标表名限定旧值，避免与来源表字段同名产生歧义
+        """
+        prefix = f"{target}." if target else ""
+        update_clauses = ["`rank`=VALUES(`rank`)"]  # rank必须更新
+        for field in all_fields:
+            if field != 'rank':  # 已处理rank字段
+                update_clauses.append(
+                    f"`{field}`=IF(VALUES(`{field}`) IS NOT NULL, VALUES(`{field}`), {prefix}`{field}`)")
+        return ', '.join(update_clauses)
+
+    def _max_packet(self, conn) -> int:
+        """服务端 max_allowed_packet，只查询一次"""
+        if self._max_allowed_packet is None:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT @@max_allowed_packet AS packet")
+                self._max_allowed_packet = int(cursor.fetchone()['packet'])
+        return self._max_allowed_packet
+
+    def _bulk_upsert(self, table_name: str, data: List[Dict], primary_key: str = 'asin',
+                     max_rows: Optional[int] = None, key_columns: Optional[List[str]] = None):
+        """
+        bulk 模式: 多行 INSERT 写入临时表，再用一条 INSERT ... SELECT 合并到目标表
+
+        每条 INSERT 的大小按 max_allowed_packet 自动切分；
+        临时表本身按主键去重，同一 asin 出现多次时与逐行模式的结果一致
+
+        参数:
+            table_name: 表名
+            data: 要处理的数据列表
+            primary_key: 主键字段名
+            max_rows: 每条 INSERT 的最大行数，None 为只按 max_allowed_packet 切分
+            key_columns: 唯一键字段，默认 [primary_key]
+        """
+        all_fields = [k for k in data[0].keys() if k != primary_key]
+        columns = ', '.join([f"`{f}`" for f in [primary_key, *all_fields]])
+        update_clause = self._update_clause(all_fields)
+        staging = f"{table_name}_staging"
+        keys = ', '.join([f"`{k}`" for k in key_columns or [primary_key]])
+
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    # todo 预留 10% 给语句头和 ON DUPLICATE 部分
+                    budget = int(self._max_packet(conn) * 0.9)
+                    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+                    # todo 分区表不能 LIKE 成临时表，只复制用到的列并加唯一键
+                    cursor.execute(f"CREATE TEMPORARY TABLE {staging} (UNIQUE KEY ({keys})) "
+                                   f"SELECT {columns} FROM {table_name} LIMIT 0")
+                    conn.begin()
+
+                    head = f"INSERT INTO {staging} ({columns}) VALUES "
+                    tail = f" ON DUPLICATE KEY UPDATE {update_clause}"
+                    base = len(head.encode('utf-8')) + len(tail.encode('utf-8'))
+                    rows, size, statements = [], base, 0
+
+                    def flush():
+                        nonlocal rows, size, statements
+                        if rows:
+                            cursor.execute(head + ', '.join(rows) + tail)
+                            statements += 1
+                        rows, size = [], base
+
+                    for item in data:
+                        values = [item.get(primary_key), *[item.get(f) for f in all_fields]]
+                        row = '(' + ', '.join(conn.literal(v) for v in values) + ')'
+                        row_size = len(row.encode('utf-8')) + 2
+                        if rows and (size + row_size > budget or (max_rows and len(rows) >= max_rows)):
+                            flush()
+                        rows.append(row)
+                        size += row_size
+                    flush()
+
+                    # todo 集合式合并，规则与逐行模式一致
+                    cursor.execute(f"""
+                    INSERT INTO {table_name} ({columns})
+                    SELECT {columns} FROM {staging}
+                    ON DUPLICATE KEY UPDATE {self._update_clause(all_fields, table_name)}
+                    """)
+                    conn.commit()
+                    logger.info(f"bulk 模式处理完成: {len(data)} 条记录，{statements} 条 INSERT")
+
+                except (Error, pymysql.MySQLError) as e:
+                    conn.rollback()
+                    logger.error(f"bulk 模式处理失败: {e}")
+                    raise
+                finally:
+                    try:
+                        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+                    except pymysql.MySQLError:
+                        pass
+
+    def migrate_category_tables(self, site: Optional[str] = None, drop: bool = False):
+        """
+        把按类目分表 ({cid}_{site}) 的数据迁移到合并表，规则与 batch_upsert 一致
+
+        参数:
+            site: 只迁移该站点，默认全部
+            drop: 迁移成功后删除原表
+        返回:
+            {表名: 受影响行数}
+        """
+        self.create_consolidated_table()
+        fields = [f.strip('`') for f in consolidated_schema
+                  if f.strip('`') not in ('site', 'cid', 'asin', 'created_at', 'updated_at')
+                  and not f.startswith(('PRIMARY', 'INDEX'))]
+        columns = ', '.join([f"`{f}`" for f in ['asin', *fields]])
+        update_clause = self._update_clause(fields, consolidated_table)
+
+        tables = [row[f'Tables_in_{self.database}'] for row in self.execute_query("SHOW TABLES")]
+        migrated = {}
+        for table in tables:
+            match = re.fullmatch(r'(\w+)_([A-Z]{2})', table)
+            if not match or table == consolidated_table or (site and match.group(2) != site):
+                continue
+            cid, table_site = match.groups()
+            with self.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    try:
+                        conn.begin()
+                        cursor.execute(f"""
+                        INSERT INTO {consolidated_table} (`site`, `cid`, {columns})
+                        SELECT %s, %s, {columns} FROM `{table}`
+                        ON DUPLICATE KEY UPDATE {update_clause}
+                        """, (table_site, cid))
+                        conn.commit()
+                        migrated[table] = cursor.rowcount
+                        logger.info(f"表 {table} 已迁移到 {consolidated_table}")
+                    except (Error, pymysql.MySQLError) as e:
+                        conn.rollback()
+                        logger.error(f"迁移表 {table} 失败: {e}")
+                        continue
+            if drop:
+                self.drop_table(table)
+        return migrated
+
+    def add_rank_indexes(self, site: Optional[str] = None):
+        """
+        一次性迁移: 给旧的类目分表 ({cid}_{site}) 补建 `rank` 索引 (新表由 product_schema 建表时创建)
+        查询 (iter_best_rows) 不执行 DDL，需要时手动运行:
+        python -c "from config.config import db_config; from tool.pipeline import MySQLPipeline; \
+                   MySQLPipeline(**db_config).add_rank_indexes()"
+
+        参数:
+            site: 只处理该站点，默认全部
+        返回:
+            补建了索引的表名列表
+        """
+        tables = [row[f'Tables_in_{self.database}'] for row in self.execute_query("SHOW TABLES")]
+        added = []
+        for table in tables:
+            match = re.fullmatch(r'(\w+)_([A-Z]{2})', table)
+            if not match or table == consolidated_table or (site and match.group(2) != site):
+                continue
+            try:
+                if self.execute_query(f"SHOW INDEX FROM `{table}` WHERE Column_name = 'rank' AND Seq_in_index = 1"):
+                    continue
+                self.execute_query(f"ALTER TABLE `{table}` ADD INDEX idx_rank (`rank`)")
+                added.append(table)
+                logger.info(f"表 {table} 已添加 rank 索引")
+            except (Error, pymysql.MySQLError) as e:
+                logger.error(f"表 {table} 添加 rank 索引失败: {e}")
+        return added
+
     def execute_query(self, query: str, params: Optional[tuple] = None):
         """
         执行查询并返回结果
@@ -264,8 +809,13 @@ class MySQLPipeline:
                     logger.error(f"执行查询失败: {e}")
                     raise
 
+    def drop_table(self, table_name: str):
+        """删除表并清除 DDL 缓存"""
+        self.execute_query(f"DROP TABLE IF EXISTS {table_name}")
+        _schema_cache.discard((self.host, self.port, self.database, table_name))
+
     def close(self):
         """关闭所有连接"""
         self._close_all_connections()
-        logger.info("MySQL连接池已关闭")
+        logger.info(f"MySQL连接池已关闭 {self.stats()}")
 
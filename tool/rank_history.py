@@ -0,0 +1,182 @@
+# todo 排名历史 (site, cid, asin, date) 时间序列
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Union
+
+from tool.pipeline import Storage
+from tool.records import _to_float, _to_int, _to_price
+
+logger = logging.getLogger(__name__)
+
+# todo 窄表: 每个 asin 每天一行，同一天多次采集以最后一次的 rank 为准
+history_table = 'rank_history'
+history_schema = {
+    "site": "VARCHAR(8) NOT NULL",
+    "cid": "VARCHAR(32) NOT NULL",
+    "asin": "VARCHAR(20) NOT NULL",
+    "`date`": "DATE NOT NULL",
+    "`rank`": "INT",
+    "bsrRank": "INT",
+    "price": "DECIMAL(10,2)",
+    "units": "INT",
+    "rating": "DECIMAL(2,1)",
+    "reviewCount": "INT",
+    "PRIMARY KEY": "(site, cid, asin, `date`)",
+    "INDEX idx_date": "(site, cid, `date`, `rank`)",
+}
+history_key = ['site', 'cid', 'asin', 'date']
+
+DateLike = Union[str, date, datetime]
+
+
+def _day(value: Optional[DateLike]) -> Optional[str]:
+    """date / datetime / 'YYYY-MM-DD' -> 'YYYY-MM-DD'"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)[:10]
+
+
+class RankHistory:
+    """
+    排名 / 价格 / 销量 历史
+
+    功能特点:
+    - 只追加: 每次采集写入当天的快照，不覆盖历史，趋势不再需要对比旧的 JSON 文件
+    - 与产品表共用 Storage (MySQL / SQLite)，按批写入
+    - range_scan 按时间范围读取，movers 计算两天之间排名变化最大的 asin
+
+    使用示例:
+    history = RankHistory(pipeline)
+    history.record(site, cid, items)
+    history.movers(site, cid, days=7)
+    """
+
+    def __init__(self, storage: Storage, table_name: str = history_table):
+        """
+        :param storage: MySQLPipeline / SQLitePipeline
+        :param table_name: 表名
+        """
+        self.storage = storage
+        self.table_name = table_name
+        self._created = False
+
+    def _ensure_table(self):
+        if not self._created:
+            self.storage.create_table_if_not_exists(self.table_name, history_schema)
+            self._created = True
+
+    @staticmethod
+    def to_row(site: str, cid: str, item: Dict[str, Any], day: Optional[DateLike] = None) -> Optional[Dict[str, Any]]:
+        """采集结果 -> 历史行，没有 asin 时返回 None"""
+        asin = item.get('asin')
+        if not asin:
+            return None
+        price = item.get('current_price')
+        if price is None:
+            price = item.get('price')
+        return {
+            'asin': asin,
+            'site': site,
+            'cid': str(cid),
+            'date': _day(day or date.today()),
+            'rank': _to_int(item.get('rank')),
+            'bsrRank': _to_int(item.get('bsrRank')),
+            'price': _to_price(price),
+            'units': _to_int(item.get('units')),
+            'rating': _to_float(item.get('rating')),
+            'reviewCount': _to_int(item.get('reviewCount')),
+        }
+
+    def record(self, site: str, cid: str, items: List[Dict[str, Any]],
+               day: Optional[DateLike] = None, batch_size: int = 5000) -> int:
+        """
+        写入一批快照
+        :param site: 站点
+        :param cid: 类目ID
+        :param items: 采集结果
+        :param day: 快照日期，默认今天
+        :return: 写入条数
+        """
+        rows = {}
+        for item in items:
+            row = self.to_row(site, cid, item, day)
+            if row is not None:
+                rows[row['asin']] = row  # todo 同一批内重复的 asin 保留最后一条
+        if not rows:
+            return 0
+        self._ensure_table()
+        self.storage.batch_upsert(self.table_name, list(rows.values()), primary_key='asin',
+                                  batch_size=batch_size, mode='bulk', key_columns=history_key)
+        return len(rows)
+
+    # todo ---------- 查询 ----------
+    def range_scan(self, site: str, cid: str, asin: Optional[str] = None,
+                   start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> List[Dict[str, Any]]:
+        """
+        按时间范围读取历史 (按 asin、日期排序)
+        :param asin: 只读取一个 asin，None 为整个类目
+        :param start: 开始日期 (含)
+        :param end: 结束日期 (含)
+        """
+        where, params = ["site = %s", "cid = %s"], [site, str(cid)]
+        if asin is not None:
+            where.append("asin = %s")
+            params.append(asin)
+        if start is not None:
+            where.append("`date` >= %s")
+            params.append(_day(start))
+        if end is not None:
+            where.append("`date` <= %s")
+            params.append(_day(end))
+        self._ensure_table()
+        return self.storage.execute_query(
+            f"SELECT * FROM {self.table_name} WHERE {' AND '.join(where)} ORDER BY asin, `date`",
+            tuple(params))
+
+    def series(self, site: str, cid: str, asin: str, days: int = 30) -> List[Dict[str, Any]]:
+        """最近 days 天单个 asin 的历史"""
+        return self.range_scan(site, cid, asin, start=date.today() - timedelta(days=days))
+
+    def dates(self, site: str, cid: str) -> List[str]:
+        """有快照的日期 (从早到晚)"""
+        self._ensure_table()
+        rows = self.storage.execute_query(
+            f"SELECT DISTINCT `date` FROM {self.table_name} WHERE site = %s AND cid = %s ORDER BY `date`",
+            (site, str(cid)))
+        return [_day(row['date']) for row in rows]
+
+    def movers(self, site: str, cid: str, days: int = 7, end: Optional[DateLike] = None,
+               limit: int = 50, direction: str = 'up') -> List[Dict[str, Any]]:
+        """
+        两次快照之间排名变化最大的 asin
+        :param days: 对比 end 与 days 天前 (取该日期及之前最近的一次快照)
+        :param end: 结束日期，默认最近一次快照
+        :param limit: 返回条数
+        :param direction: up 排名上升 (数值变小) 最多；down 下降最多
+        :return: [{asin, rank_start, rank_end, rank_change, price, units, ...}]，rank_change > 0 为上升
+        """
+        snapshots = self.dates(site, cid)
+        end = _day(end) if end is not None else (snapshots[-1] if snapshots else None)
+        if end is None:
+            return []
+        target = _day(datetime.strptime(end, '%Y-%m-%d').date() - timedelta(days=days))
+        earlier = [d for d in snapshots if d <= target]
+        if not earlier:
+            logger.info(f'{site} {cid} 没有 {target} 之前的排名快照')
+            return []
+        start = earlier[-1]
+        order = 'DESC' if direction == 'up' else 'ASC'
+        return self.storage.execute_query(f"""
+            SELECT b.asin, a.`rank` AS rank_start, b.`rank` AS rank_end, a.`rank` - b.`rank` AS rank_change,
+                   %s AS start_date, %s AS end_date, b.price, b.units, b.bsrRank, b.reviewCount
+            FROM {self.table_name} a
+            JOIN {self.table_name} b ON b.site = a.site AND b.cid = a.cid AND b.asin = a.asin
+            WHERE a.site = %s AND a.cid = %s AND a.`date` = %s AND b.`date` = %s
+              AND a.`rank` IS NOT NULL AND b.`rank` IS NOT NULL
+            ORDER BY rank_change {order}, b.`rank` ASC
+            LIMIT %s
+        """, (start, end, site, str(cid), start, end, limit))
@@ -0,0 +1,184 @@
+# todo 产品记录模型
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+# todo MySQL 表中的独立字段，其余字段存入 item 列
+CORE_FIELDS = (
+    'asin', 'image', 'rank', 'title', 'rating',
+    'reviewCount', 'current_price', 'discount_percentage',
+    'original_price', 'material', 'similarList', 'aliexpress',
+    'description'
+)
+
+
+def _to_int(value):
+    """
+    '1,234' / '1.234' / '349' / '-3' / '4.5' / 12.0 -> int，小数截断，无法解析返回 None
+    只去掉千分位分隔符 (分隔符后正好 3 位数字)，其余按小数解析
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    text = re.sub(r'[\s\xa0]', '', str(value))
+    if re.fullmatch(r'[+-]?\d{1,3}([.,])\d{3}(\1\d{3})*', text):
+        return int(re.sub(r'[.,]', '', text))
+    # todo '1,234.5' / '1.234,5': 最后一个分隔符为小数点，其余为千分位
+    if ',' in text and '.' in text:
+        sep = max(text.rfind(','), text.rfind('.'))
+        text = re.sub(r'[.,]', '', text[:sep]) + '.' + text[sep + 1:]
+    try:
+        return int(float(text.replace(',', '.')))
+    except (ValueError, OverflowError):
+        return None
+
+
+def _to_float(value):
+    """'4,5' / '4.5' / 4 -> float，无法解析返回 None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip().replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def _to_price(value):
+    """'16,99 €' / 'HKD152,.33' / '$1,234.56' / 26.95 -> float"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r'\d[\d.,\s\xa0]*', str(value))
+    if not match:
+        return None
+    number = re.sub(r'[\s\xa0]', '', match.group()).rstrip('.,')
+    # todo 最后一个分隔符后只有 1-2 位数字时视为小数点，其余分隔符为千分位
+    sep = max(number.rfind(','), number.rfind('.'))
+    if sep != -1 and 0 < len(number) - sep - 1 <= 2:
+        integer, decimal = number[:sep], number[sep + 1:]
+    else:
+        integer, decimal = number, '0'
+    integer = re.sub(r'[.,]', '', integer) or '0'
+    return float(f'{integer}.{decimal}')
+
+
+def _dumps(value):
+    """similarList / aliexpress 在管道中以 JSON 字符串传递"""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+@dataclass(slots=True)
+class ProductRecord:
+    """
+    管道中流转的产品记录
+
+    核心字段有固定类型；similarList / aliexpress 保留原始 JSON 字符串，
+    其余字段 (卖家精灵、详情页等) 存为 extras，来自 MySQL / JSONL 时保持原始 JSON，
+    第一次访问时才解码，只转存时不需要反复解析和序列化
+    """
+    asin: str
+    image: Optional[str] = None
+    rank: Optional[int] = None
+    title: Optional[str] = None
+    rating: Optional[float] = None
+    reviewCount: Optional[int] = None
+    current_price: Optional[str] = None
+    discount_percentage: Optional[str] = None
+    original_price: Optional[str] = None
+    material: Optional[str] = None
+    description: Optional[str] = None
+    similarList: Optional[str] = None  # JSON 字符串
+    aliexpress: Optional[str] = None  # JSON 字符串
+    _extras: Any = None  # dict 或未解码的 JSON 字符串
+
+    @property
+    def extras(self) -> Dict[str, Any]:
+        """其余字段，按需解码"""
+        if self._extras is None:
+            self._extras = {}
+        elif isinstance(self._extras, str):
+            self._extras = json.loads(self._extras) if self._extras else {}
+        return self._extras
+
+    @property
+    def similar_list(self):
+        """解码后的同款列表"""
+        return json.loads(self.similarList) if self.similarList else []
+
+    @property
+    def aliexpress_list(self):
+        """解码后的 1688 搜图列表"""
+        return json.loads(self.aliexpress) if self.aliexpress else []
+
+    def get(self, key, default=None):
+        """兼容 dict 风格的读取"""
+        if key in _CORE_SET:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.extras.get(key, default)
+
+    # todo ---------- 转换 ----------
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> 'ProductRecord':
+        """管道中的 dict -> 记录"""
+        return cls(
+            asin=item.get('asin'),
+            image=item.get('image'),
+            rank=_to_int(item.get('rank')),
+            title=item.get('title'),
+            rating=_to_float(item.get('rating')),
+            reviewCount=_to_int(item.get('reviewCount')),
+            current_price=item.get('current_price'),
+            discount_percentage=item.get('discount_percentage'),
+            original_price=item.get('original_price'),
+            material=item.get('material'),
+            description=item.get('description'),
+            similarList=_dumps(item.get('similarList')),
+            aliexpress=_dumps(item.get('aliexpress')),
+            _extras={k: v for k, v in item.items() if k not in _CORE_SET},
+        )
+
+    def to_item(self) -> Dict[str, Any]:
+        """记录 -> 管道中的 dict (核心字段 + extras)"""
+        item = {f: getattr(self, f) for f in CORE_FIELDS}
+        item.update(self.extras)
+        return item
+
+    @classmethod
+    def from_mysql_row(cls, row: Dict[str, Any]) -> 'ProductRecord':
+        """MySQL 行 -> 记录，item 列延迟解码"""
+        record = cls.from_item({k: row.get(k) for k in CORE_FIELDS})
+        record._extras = row.get('item')
+        return record
+
+    def to_mysql_row(self) -> Dict[str, Any]:
+        """记录 -> MySQL 行 (核心字段 + item JSON 列)"""
+        row = {f: getattr(self, f) for f in CORE_FIELDS}
+        if isinstance(self._extras, str):
+            row['item'] = self._extras
+        else:
+            row['item'] = json.dumps(self._extras or {})
+        return row
+
+    @classmethod
+    def from_jsonl(cls, line: str) -> 'ProductRecord':
+        """JSONL 行 -> 记录"""
+        return cls.from_item(json.loads(line))
+
+    def to_jsonl(self) -> str:
+        """记录 -> JSONL 行 (不含换行符)"""
+        return json.dumps(self.to_item(), ensure_ascii=False)
+
+    def to_excel_row(self) -> Dict[str, Any]:
+        """记录 -> AmazonExcelExporter.add_product_data 使用的行数据"""
+        return self.to_item()
+
+
+_CORE_SET = frozenset(CORE_FIELDS)
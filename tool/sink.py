@@ -0,0 +1,159 @@
+# todo 采集结果后台写入 (MySQL + JSONL)
+import atexit
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+from typing import Any, Callable, Dict, List, Optional
+
+from tool.pipeline import Storage, JsonlWriter
+from tool.utils import update_database_items
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindSink:
+    """
+    采集结果的后台写入器
+
+    功能特点:
+    - 采集线程 put 后立即返回，后台线程按条数或时间攒批写入
+    - 每批同时写 JSONL 与 MySQL，崩溃时只丢失未满一批的数据
+    - 有界队列，写入跟不上时阻塞采集线程 (背压)
+    - close / 上下文退出 / 进程退出时把剩余数据全部写完
+
+    使用示例:
+    with WriteBehindSink(pipeline, table_name, json_path, schema=schema) as sink:
+        sink.put(item)
+    """
+
+    def __init__(self, pipeline: Optional[Storage], table_name: str, json_path: Optional[str] = None,
+                 schema: Optional[Dict] = None, batch_size: Optional[int] = None, flush_interval: float = 5,
+                 maxsize: int = 1000, mode: str = 'bulk', extra: Optional[Dict] = None,
+                 key_columns: Optional[List[str]] = None,
+                 on_batch: Optional[Callable[[List[Dict[str, Any]]], Any]] = None):
+        """
+        :param pipeline: MySQLPipeline / SQLitePipeline，None 时只写 JSONL
+        :param table_name: 表名
+        :param json_path: JSONL 文件路径，None 时只写 MySQL
+        :param schema: 表结构定义 (只在第一批时建表)
+        :param batch_size: 每批最大条数，默认 bulk 模式 1000 条 (临时表合并的固定开销分摊到更多行)，row 模式 100 条
+        :param flush_interval: 最长攒批时间(秒)
+        :param maxsize: 队列上限
+        :param mode: batch_upsert 模式
+        :param extra: 写入 MySQL 时每行附加的字段，例如合并表的 site / cid
+        :param key_columns: 唯一键字段，见 batch_upsert
+        :param on_batch: 每批额外的写入 (与 JSONL / MySQL 并行)，例如排名历史
+        """
+        self.pipeline = pipeline
+        self.table_name = table_name
+        self.json_path = json_path
+        self.schema = schema
+        self.batch_size = batch_size or (1000 if mode == 'bulk' else 100)
+        self.flush_interval = flush_interval
+        self.mode = mode
+        self.extra = extra or {}
+        self.key_columns = key_columns
+        self.on_batch = on_batch
+        self._queue = Queue(maxsize=maxsize)
+        self._writers = ThreadPoolExecutor(max_workers=3)
+        self._stats = {'written': 0, 'batches': 0, 'failed': 0}
+        self._closed = False
+        self._jsonl = JsonlWriter(json_path) if json_path else None
+        self._thread = threading.Thread(target=self._run, name=f'sink-{table_name}', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, item: Dict[str, Any]):
+        """提交一条数据，队列满时阻塞"""
+        if self._closed:
+            raise Exception(f'写入器已关闭: {self.table_name}')
+        self._queue.put(item)
+
+    def put_many(self, items: List[Dict[str, Any]]):
+        for item in items:
+            self.put(item)
+
+    def _run(self):
+        """后台线程: 按 batch_size / flush_interval 攒批写入"""
+        stop = False
+        while not stop:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        """JSONL、MySQL 与 on_batch 并行写入一批"""
+        futures = []
+        if self._jsonl is not None:
+            futures.append(self._writers.submit(self._append, batch))
+        if self.pipeline is not None:
+            futures.append(self._writers.submit(self._upsert, batch))
+        if self.on_batch is not None:
+            futures.append(self._writers.submit(self.on_batch, batch))
+        failed = False
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                failed = True
+                logger.error(f'写入批次失败 {self.table_name}: {e}')
+        self._stats['batches'] += 1
+        self._stats['failed' if failed else 'written'] += len(batch)
+
+    def _append(self, batch: List[Dict[str, Any]]):
+        self._jsonl.write_many(batch)
+        # todo 每批写入文件，崩溃时不丢失已完成的批次
+        self._jsonl.flush()
+
+    def _upsert(self, batch: List[Dict[str, Any]]):
+        rows = update_database_items(batch)
+        if self.extra:
+            rows = [{**self.extra, **row} for row in rows]
+        self.pipeline.batch_upsert(
+            table_name=self.table_name,
+            data=rows,
+            primary_key='asin',
+            batch_size=max(self.batch_size, 1),
+            schema=self.schema,
+            mode=self.mode,
+            key_columns=self.key_columns
+        )
+        # todo 建表成功后不再重复执行 DDL
+        self.schema = None
+
+    def stats(self):
+        """写入统计: written 成功条数 / failed 失败条数 / batches 批次数 / pending 队列中条数"""
+        return {**self._stats, 'pending': self._queue.qsize()}
+
+    def close(self):
+        """写完剩余数据并停止后台线程，可重复调用"""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._writers.shutdown(wait=True)
+        if self._jsonl is not None:
+            self._jsonl.close()
+        logger.info(f'写入器已关闭 {self.table_name}: {self.stats()}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
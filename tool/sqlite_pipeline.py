@@ -0,0 +1,308 @@
+# todo 本地 SQLite 存储 (与 MySQLPipeline 相同的 upsert 规则) + 后台同步到 MySQL
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from config.config import db_config
+from tool.pipeline import Storage, MySQLPipeline
+
+logger = logging.getLogger(__name__)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.strip('`').replace('"', '""') + '"'
+
+
+# todo 字符串 / 标识符字面量中的 %s 原样保留，只转换其外的 %s
+_SQL_TOKENS = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|%%|%s""")
+
+
+def _sqlite_sql(query: str, params=None) -> str:
+    """
+    MySQL 风格的 %s 占位符转换为 ?，%% 转换为 % (与 pymysql 一致，字面量中的 %% 也转换)
+    与 pymysql 一致: 没有参数 (None) 时不做转换
+    """
+    if params is None:
+        return query
+
+    def convert(match):
+        token = match.group()
+        if token == '%s':
+            return '?'
+        if token == '%%':
+            return '%'
+        return token.replace('%%', '%')
+
+    return _SQL_TOKENS.sub(convert, query)
+
+
+def iter_query(path: str, query: str, params: Optional[tuple] = None):
+    """
+    使用独立连接流式执行查询，逐行返回 dict (WAL 模式下不阻塞写入)
+    :param path: SQLite 文件路径
+    """
+    path = path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        for row in conn.execute(_sqlite_sql(query, params), params or ()):
+            yield dict(row)
+    finally:
+        conn.close()
+
+
+class SQLitePipeline(Storage):
+    """
+    SQLite 数据管道类 (WAL 模式)
+
+    功能特点:
+    - 与 MySQLPipeline 相同的 batch_upsert / execute_query 行为，单机采集与基准测试不依赖 MySQL 服务器
+    - 建表时把 MySQL 类型定义转换为 SQLite 写法 (AUTO_INCREMENT、ON UPDATE、INDEX 等)
+    - 记录待同步的主键，sync=True 时后台线程定期批量同步到 MySQL
+    """
+
+    def __init__(self, path: str, sync: bool = False, sync_interval: float = 60,
+                 sync_batch_size: int = 1000, remote: Optional[MySQLPipeline] = None):
+        """
+        :param path: SQLite 文件路径 (相对路径基于当前工作目录)
+        :param sync: 是否后台同步到 MySQL
+        :param sync_interval: 同步间隔(秒)
+        :param sync_batch_size: 每次同步的最大条数
+        :param remote: 同步目标，默认按 db_config 创建
+        sync=False 且没有 remote 时不记录待同步主键 (纯本地部署)
+        """
+        self.path = path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+        self.sync_interval = sync_interval
+        self.sync_batch_size = sync_batch_size
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS _sync_tables (
+                table_name TEXT PRIMARY KEY,
+                schema TEXT NOT NULL,
+                options TEXT,
+                key_columns TEXT NOT NULL,
+                primary_key TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS _sync_pending (
+                table_name TEXT NOT NULL,
+                key TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (table_name, key)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+        self._tables = {}  # table_name -> 原始 MySQL schema
+        self._remote = remote
+        self._track = sync or remote is not None
+        self._stop = threading.Event()
+        self._sync_thread = None
+        if sync:
+            self._sync_thread = threading.Thread(target=self._sync_loop, name='sqlite-sync', daemon=True)
+            self._sync_thread.start()
+
+    # todo ---------- 建表 ----------
+    def create_table_if_not_exists(self, table_name: str, schema: Dict, options: str = ''):
+        """
+        创建表（如果不存在），schema 与 MySQLPipeline 相同；分区等 options 在 SQLite 中忽略
+
+        参数:
+            table_name: 表名
+            schema: 表结构定义字典
+            options: MySQL 表选项 (只在同步到 MySQL 时使用)
+        """
+        if table_name in self._tables:
+            return
+        columns, indexes = [], []
+        for col_name, col_def in schema.items():
+            if col_name.upper().startswith(('INDEX ', 'KEY ')):
+                index_name = col_name.split(None, 1)[1]
+                cols = col_def.strip().strip('()').replace('`', '"')
+                indexes.append(f'CREATE INDEX IF NOT EXISTS {_quote(f"{table_name}_{index_name}")} '
+                               f'ON {_quote(table_name)} ({cols})')
+                continue
+            if col_name.upper() == 'PRIMARY KEY':
+                columns.append('PRIMARY KEY ' + col_def.replace('`', '"'))
+                continue
+            col_def = re.sub(r'\s+ON UPDATE CURRENT_TIMESTAMP', '', col_def, flags=re.I)
+            if re.search(r'AUTO_INCREMENT', col_def, re.I):
+                col_def = 'INTEGER PRIMARY KEY AUTOINCREMENT'
+            columns.append(f"{_quote(col_name)} {col_def}")
+        with self._lock:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table_name)} ({', '.join(columns)})")
+            for index_sql in indexes:
+                self._conn.execute(index_sql)
+            self._conn.commit()
+            self._tables[table_name] = (schema, options)
+        logger.info(f"表 {table_name} 已创建或已存在")
+
+    def _columns(self, table_name: str) -> List[str]:
+        return [row['name'] for row in self._conn.execute(f"PRAGMA table_info({_quote(table_name)})")]
+
+    # todo ---------- 写入 ----------
+    def batch_upsert(self, table_name: str, data: List[Dict],
+                     primary_key: str = 'asin',
+                     batch_size: int = 100,
+                     schema: Optional[Dict] = None,
+                     mode: str = 'row',
+                     key_columns: Optional[List[str]] = None):
+        """
+        批量插入/更新数据（UPSERT操作），参数与 MySQLPipeline.batch_upsert 相同
+        本地写入没有网络往返，mode 参数只为接口兼容
+        """
+        if not data:
+            logger.info("没有数据需要处理")
+            return
+
+        if schema:
+            self.create_table_if_not_exists(table_name, schema)
+
+        keys = key_columns or [primary_key]
+        all_fields = [k for k in data[0].keys() if k != primary_key]
+        fields = [primary_key, *all_fields]
+        table = _quote(table_name)
+
+        # todo 与 MySQL 规则一致: rank 必须更新，其他字段只有新值不为 NULL 时才更新
+        update_clauses = ['"rank"=excluded."rank"']
+        for field in all_fields:
+            if field != 'rank' and field not in keys:
+                update_clauses.append(f'{_quote(field)}=COALESCE(excluded.{_quote(field)}, {table}.{_quote(field)})')
+
+        with self._lock:
+            if 'updated_at' in self._columns(table_name) and 'updated_at' not in fields:
+                # todo 模拟 MySQL 的 ON UPDATE CURRENT_TIMESTAMP
+                update_clauses.append('"updated_at"=CURRENT_TIMESTAMP')
+            insert_sql = (
+                f"INSERT INTO {table} ({', '.join(_quote(f) for f in fields)}) "
+                f"VALUES ({', '.join(['?'] * len(fields))}) "
+                f"ON CONFLICT ({', '.join(_quote(k) for k in keys)}) DO UPDATE SET {', '.join(update_clauses)}"
+            )
+            schema_def, options = self._tables.get(table_name, (schema or {}, ''))
+            try:
+                for i in range(0, len(data), max(batch_size, 1)):
+                    batch = data[i:i + batch_size]
+                    self._conn.executemany(insert_sql, [[item.get(f) for f in fields] for item in batch])
+                    if not self._track:
+                        continue
+                    # todo version 用于判断同步期间是否又有更新
+                    self._conn.executemany(
+                        "INSERT INTO _sync_pending (table_name, key) VALUES (?, ?) "
+                        "ON CONFLICT (table_name, key) DO UPDATE SET version = version + 1",
+                        [(table_name, json.dumps([item.get(k) for k in keys])) for item in batch]
+                    )
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO _sync_tables (table_name, schema, options, key_columns, primary_key) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (table_name, json.dumps(schema_def), options, json.dumps(keys), primary_key)
+                    )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                logger.error(f"处理批次失败: {e}")
+                raise
+        logger.info(f"数据处理完成，共处理 {len(data)} 条记录 (SQLite)")
+
+    def execute_query(self, query: str, params: Optional[tuple] = None):
+        """
+        执行查询并返回结果 (dict 列表)，支持 MySQL 风格的 %s 占位符和反引号
+        """
+        with self._lock:
+            try:
+                cursor = self._conn.execute(_sqlite_sql(query, params), params or ())
+                result = [dict(row) for row in cursor.fetchall()]
+                self._conn.commit()
+                return result
+            except sqlite3.Error as e:
+                logger.error(f"执行查询失败: {e}")
+                raise
+
+    def drop_table(self, table_name: str):
+        """删除表及其待同步记录"""
+        with self._lock:
+            self._conn.execute(f"DROP TABLE IF EXISTS {_quote(table_name)}")
+            self._conn.execute("DELETE FROM _sync_pending WHERE table_name = ?", (table_name,))
+            self._conn.execute("DELETE FROM _sync_tables WHERE table_name = ?", (table_name,))
+            self._conn.commit()
+            self._tables.pop(table_name, None)
+
+    # todo ---------- 同步 ----------
+    def sync_once(self) -> int:
+        """
+        把待同步的数据批量写入 MySQL
+        :return: 本次同步条数
+        """
+        if self._remote is None:
+            self._remote = MySQLPipeline(**db_config, pool_size=1)
+        total = 0
+        with self._lock:
+            tables = [dict(row) for row in self._conn.execute("SELECT * FROM _sync_tables")]
+        for meta in tables:
+            table_name = meta['table_name']
+            schema = json.loads(meta['schema'])
+            keys = json.loads(meta['key_columns'])
+            # todo 自增 id 和时间戳由 MySQL 维护
+            skip = {name.strip('`') for name, col_def in schema.items()
+                    if re.search(r'AUTO_INCREMENT|CURRENT_TIMESTAMP', col_def, re.I)}
+            if schema:
+                self._remote.create_table_if_not_exists(table_name, schema, meta['options'] or '')
+            while True:
+                with self._lock:
+                    pending = [(row['key'], row['version']) for row in self._conn.execute(
+                        "SELECT key, version FROM _sync_pending WHERE table_name = ? LIMIT ?",
+                        (table_name, self.sync_batch_size))]
+                    if not pending:
+                        break
+                    where = ' AND '.join(f'{_quote(k)} = ?' for k in keys)
+                    rows = []
+                    for key, _ in pending:
+                        row = self._conn.execute(
+                            f"SELECT * FROM {_quote(table_name)} WHERE {where}", json.loads(key)).fetchone()
+                        if row is not None:
+                            rows.append({k: row[k] for k in row.keys() if k not in skip})
+                if rows:
+                    self._remote.batch_upsert(table_name, rows, primary_key=meta['primary_key'],
+                                              batch_size=self.sync_batch_size, mode='bulk', key_columns=keys)
+                with self._lock:
+                    # todo 同步期间又被更新的 key 保留到下一轮
+                    self._conn.executemany(
+                        "DELETE FROM _sync_pending WHERE table_name = ? AND key = ? AND version = ?",
+                        [(table_name, key, version) for key, version in pending])
+                    self._conn.commit()
+                total += len(rows)
+        if total:
+            logger.info(f"SQLite 同步到 MySQL 完成: {total} 条")
+        return total
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync_once()
+            except Exception as e:
+                logger.error(f"SQLite 同步到 MySQL 失败: {e}")
+
+    def close(self):
+        """停止后台同步 (退出前再同步一次) 并关闭数据库"""
+        if self._sync_thread is not None:
+            self._stop.set()
+            self._sync_thread.join()
+            self._sync_thread = None
+            try:
+                self.sync_once()
+            except Exception as e:
+                logger.error(f"SQLite 同步到 MySQL 失败: {e}")
+        if self._remote is not None:
+            self._remote.close()
+            self._remote = None
+        with self._lock:
+            self._conn.close()
+        logger.info("SQLite 存储已关闭")
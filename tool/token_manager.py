@@ -0,0 +1,141 @@
+# todo 卖家精灵 token 管理
+import base64
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from tool.account_pool import account_pool
+from tool.keywords_amount_utils import export_token
+
+logger = logging.getLogger(__name__)
+
+# todo export_token 登录失败时返回的占位 token
+FAILED_TOKEN = '4480'
+
+
+class SellerSpriteTokenManager:
+    """
+    进程内共享的卖家精灵 token 管理器
+
+    功能特点:
+    - 按账号缓存 token 及过期时间
+    - 临近过期时后台提前刷新
+    - 同一账号的并发刷新合并为一次登录 (single-flight)
+    """
+
+    def __init__(self, ttl: int = 6 * 3600, refresh_margin: int = 10 * 60):
+        """
+        :param ttl: token 无法解析过期时间时的默认有效期(秒)
+        :param refresh_margin: 距过期多少秒内开始后台刷新
+        """
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._tokens = {}  # username -> {'token', 'expires_at'}
+        self._users = {}  # username -> 账号信息 (刷新时复用)
+        self._owners = {}  # token -> username (含已失效的 token)
+        self._inflight = {}  # username -> Future
+
+    def get_token(self, user=None):
+        """
+        获取一个有效 token
+        :param user: 账号 {'username', 'password'}，为空时从账号池选取最空闲的账号
+        :return: token
+        """
+        if user is None:
+            user = self._pick_user()
+        username = user.get('username')
+        with self._lock:
+            self._users[username] = user
+            entry = self._tokens.get(username)
+            now = time.time()
+            if entry and entry['expires_at'] > now:
+                if entry['expires_at'] - now < self.refresh_margin and username not in self._inflight:
+                    # todo 提前刷新，不阻塞当前调用
+                    threading.Thread(target=self._login, args=(user,), daemon=True).start()
+                return entry['token']
+        return self._login(user)
+
+    def refresh(self, stale_token=None, user=None):
+        """
+        令牌失效后刷新
+        如果其它线程已经完成刷新，直接返回新 token，不再重复登录
+        :param stale_token: 失效的 token
+        :param user: 指定账号，为空时使用 stale_token 所属账号
+        :return: 新 token
+        """
+        with self._lock:
+            username = user.get('username') if user else self._owners.get(stale_token)
+            if username:
+                entry = self._tokens.get(username)
+                if entry and entry['token'] != stale_token and entry['expires_at'] > time.time():
+                    return entry['token']
+                if entry and entry['token'] == stale_token:
+                    self._tokens.pop(username, None)
+                user = user or self._users.get(username)
+        if user is None:
+            user = self._pick_user()
+        return self._login(user)
+
+    def owner(self, token):
+        """token 所属账号"""
+        with self._lock:
+            return self._owners.get(token)
+
+    def invalidate(self, username):
+        """丢弃账号的缓存 token"""
+        with self._lock:
+            self._tokens.pop(username, None)
+
+    def _login(self, user):
+        """登录获取 token，同一账号同一时间只有一个登录请求"""
+        username = user.get('username')
+        with self._lock:
+            future = self._inflight.get(username)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[username] = future
+        if not leader:
+            logger.info(f'账号 {username} 正在刷新 token，等待结果')
+            return future.result()
+
+        token = FAILED_TOKEN
+        try:
+            token = export_token(username, user.get('password'))
+        except Exception as e:
+            logger.error(f'账号 {username} 获取 token 失败: {e}')
+        finally:
+            with self._lock:
+                if token != FAILED_TOKEN:
+                    # todo 旧 token 的归属保留，晚到的失效回调仍能找到账号
+                    self._tokens[username] = {
+                        'token': token,
+                        'expires_at': self._expires_at(token),
+                    }
+                    self._owners[token] = username
+                self._inflight.pop(username, None)
+            future.set_result(token)
+        return token
+
+    def _expires_at(self, token):
+        """优先解析 JWT 中的 exp，否则按默认有效期计算"""
+        try:
+            payload = token.split('.')[1]
+            payload += '=' * (-len(payload) % 4)
+            exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+            if exp:
+                return float(exp)
+        except Exception:
+            pass
+        return time.time() + self.ttl
+
+    @staticmethod
+    def _pick_user():
+        return account_pool.pick()
+
+
+# todo 全局单例
+token_manager = SellerSpriteTokenManager()
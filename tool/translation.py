@@ -0,0 +1,192 @@
+# todo 翻译服务 (持久缓存 + 批量请求 + QPS 限制)
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from config.config import translation_config
+from tool.Baidu_Text_transAPI import BaiduTranslation
+
+logger = logging.getLogger(__name__)
+
+# todo 百度翻译可重试的错误码: 请求超时、系统错误、访问频率受限、长 query 频率受限
+_RETRY_CODES = {'52001', '52002', '54003', '54005'}
+
+
+class RateLimiter:
+    """按固定间隔发放请求许可 (多线程共用)"""
+
+    def __init__(self, qps: float):
+        self.interval = 1.0 / qps if qps > 0 else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Translator:
+    """
+    带缓存的批量翻译
+
+    功能特点:
+    - 按行翻译并缓存 (规范化后的原文 + 目标语言)，地址、规格等重复文本跨行、跨运行只翻译一次
+    - 未缓存的行合并成多行 q，每次请求不超过 max_bytes
+    - 多个请求并发执行，总请求速率不超过 qps
+
+    使用示例:
+    translator.translate_many(texts)           # 预先批量翻译整个工作簿
+    lines = translator.translate(text)         # 之后逐行读取 (命中缓存)
+    """
+
+    def __init__(self, path: str, qps: float = 1, max_bytes: int = 5000, max_workers: int = 4,
+                 retries: int = 3, client: Optional[BaiduTranslation] = None):
+        """
+        :param path: 缓存文件路径 (相对路径基于当前工作目录)
+        :param qps: 每秒最多请求数
+        :param max_bytes: 每次请求的文本上限 (UTF-8 字节)
+        :param max_workers: 并发请求数
+        :param retries: 频率受限等错误的最大尝试次数
+        :param client: 翻译接口，默认 BaiduTranslation
+        """
+        self.path = path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self.retries = retries
+        self.client = client or BaiduTranslation()
+        self._limiter = RateLimiter(qps)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        """首次使用时打开缓存"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    src TEXT NOT NULL,
+                    to_lang TEXT NOT NULL,
+                    dst TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (src, to_lang)
+                ) WITHOUT ROWID
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def normalize(line: str) -> str:
+        """合并空白字符"""
+        return re.sub(r'\s+', ' ', line).strip()
+
+    @classmethod
+    def split(cls, text: Optional[str]) -> List[str]:
+        """文本 -> 规范化后的非空行 (<br/> 视为换行)"""
+        if not text:
+            return []
+        lines = (cls.normalize(line) for line in re.split(r'<br\s*/?>|\r?\n', text))
+        return [line for line in lines if line]
+
+    # todo ---------- 缓存 ----------
+    def _cached(self, lines: List[str], to_lang: str) -> Dict[str, str]:
+        result = {}
+        with self._lock:
+            conn = self._connect()
+            # todo SQLite 变量上限 999，分批查询
+            for i in range(0, len(lines), 500):
+                chunk = lines[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT src, dst FROM translations WHERE to_lang = ? AND src IN ({', '.join(['?'] * len(chunk))})",
+                    [to_lang, *chunk]
+                ).fetchall()
+                result.update(rows)
+        return result
+
+    def _store(self, pairs: Dict[str, str], to_lang: str):
+        if not pairs:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO translations (src, to_lang, dst, created_at) VALUES (?, ?, ?, ?)",
+                [(src, to_lang, dst, now) for src, dst in pairs.items()])
+            conn.commit()
+
+    # todo ---------- 请求 ----------
+    def _pack(self, lines: List[str]) -> List[List[str]]:
+        """按 max_bytes 把行分成多个请求 (单行超长时单独一个请求)"""
+        batches, batch, size = [], [], 0
+        for line in lines:
+            length = len(line.encode('utf-8')) + 1
+            if batch and size + length > self.max_bytes:
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(line)
+            size += length
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _request(self, batch: List[str], to_lang: str) -> Dict[str, str]:
+        """翻译一批行，返回 {原文: 译文}；失败的行不在结果中"""
+        for attempt in range(1, self.retries + 1):
+            self._limiter.acquire()
+            result = self.client.to_text('\n'.join(batch), to_lang=to_lang)
+            code = str(result.get('error_code', '')) or ('error' if result.get('error') else '')
+            if not code:
+                trans = result.get('trans_result') or []
+                if len(trans) == len(batch):
+                    return {src: t.get('dst', '') for src, t in zip(batch, trans)}
+                # todo 条数对不上时按 src 匹配
+                by_src = {self.normalize(t.get('src', '')): t.get('dst', '') for t in trans}
+                return {src: by_src[src] for src in batch if src in by_src}
+            if code not in _RETRY_CODES and code != 'error':
+                logger.error(f'翻译失败: {code} {result.get("error_msg", "")}')
+                return {}
+            logger.warning(f'翻译请求失败 (第 {attempt} 次): {code} {result.get("error_msg") or result.get("error")}')
+            if attempt < self.retries:
+                time.sleep(attempt)
+        return {}
+
+    def translate_many(self, texts: Iterable[Optional[str]], to_lang: str = 'zh') -> List[List[str]]:
+        """
+        批量翻译
+        :param texts: 原文列表 (None / 空文本返回空列表)
+        :param to_lang: 目标语言
+        :return: 每个原文的译文行；有任意一行翻译失败时该原文返回空列表 (不缓存失败结果)
+        """
+        split = [self.split(text) for text in texts]
+        unique = list(dict.fromkeys(line for lines in split for line in lines))
+        done = self._cached(unique, to_lang) if unique else {}
+        missing = [line for line in unique if line not in done]
+        if missing:
+            start = time.monotonic()
+            batches = self._pack(missing)
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+                for pairs in executor.map(lambda b: self._request(b, to_lang), batches):
+                    self._store(pairs, to_lang)
+                    done.update(pairs)
+            logger.info(f'翻译完成: {len(missing)} 行 / {len(batches)} 次请求，缓存命中 {len(unique) - len(missing)} 行，'
+                        f'用时 {time.monotonic() - start:.1f} 秒')
+        return [[done[line] for line in lines] if all(line in done for line in lines) else []
+                for lines in split]
+
+    def translate(self, text: Optional[str], to_lang: str = 'zh') -> List[str]:
+        """翻译一段文本，返回译文行"""
+        return self.translate_many([text], to_lang)[0]
+
+
+translator = Translator(**translation_config)
@@ -8,7 +8,11 @@ from typing import List, Dict, Any
 import logging
 import requests
 from queue import Queue
-from tool.keywords_amount_utils import export_tk, export_token
+from tool.account_pool import account_pool
+from tool.keywords_amount_utils import export_tk
+from tool.lookup_cache import lookup_cache
+from tool.records import ProductRecord
+from tool.token_manager import token_manager, FAILED_TOKEN
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
@@ -49,7 +53,7 @@ class SeleniumPool:
         """创建单个浏览器实例"""
         try:
             options = _get_browser_options()
-            driver_path = os.path.join(os.getcwd(), 'drivers\\chromedriver.exe')
+            driver_path = os.path.join(os.getcwd(), 'drivers', 'chromedriver.exe')
             service = Service(executable_path=driver_path)
             driver = webdriver.Chrome(
                 options=options,
@@ -192,7 +196,7 @@ class SeleniumPool:
             ]
         })
         # todo 钩子提前注入，收集 url+body
-        with open(os.path.join(os.getcwd(), 'js\\selenium_hook.js'), 'r', encoding='utf-8') as f:
+        with open(os.path.join(os.getcwd(), 'js', 'selenium_hook.js'), 'r', encoding='utf-8') as f:
             js_hook = f.read()
         result = driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': js_hook})
         script_identifier = result['identifier']  # 保存标识符
@@ -242,7 +246,7 @@ class SeleniumPool:
         # todo 启用网络拦截
         driver.execute_cdp_cmd('Network.enable', {})
         # todo 钩子提前注入，收集 url+body
-        with open(os.path.join(os.getcwd(), 'js\\selenium_hook.js'), 'r', encoding='utf-8') as f:
+        with open(os.path.join(os.getcwd(), 'js', 'selenium_hook.js'), 'r', encoding='utf-8') as f:
             js_hook = f.read().replace('upload?stylesnapToken', 'mtop.mbox.fc.common.gateway')
         result = driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': js_hook})
         script_identifier = result['identifier']  # 保存标识符
@@ -636,11 +640,49 @@ def _selenium_amazon_product(baseurl, site=None):
 
 
 
-def fetch_amazon_selection_data(cookie: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+class SellerSpriteRejected(Exception):
+    """卖家精灵拒绝请求 (cookie 失效或未登录)"""
+
+
+# todo 卖家精灵账号当日查询次数用完时接口返回的 message (完整匹配，接口出现新的提示时补充到这里)
+_QUOTA_MESSAGES = ('今日查询次数已用完，请明天再试。', '您今天的查询次数已用完，请明天再来或升级套餐。')
+
+
+class SellerSpriteAccountUnavailable(Exception):
+    """账号被限流或当日配额已用完，调用方需要换一个账号重新占用"""
+
+    def __init__(self, username, reason):
+        super().__init__(f'账号 {username} {reason}')
+        self.username = username
+
+
+# todo 登录失效时接口返回的 code / message (其它错误码如参数错误、无数据不需要重新登录)
+_AUTH_FAILED_CODES = ('UNAUTHORIZED', 'NOT_LOGIN', 'ERR_NOT_LOGIN', 'ERR_SESSION_EXPIRED')
+_AUTH_FAILED_MESSAGES = ('令牌过期，请退出再重新登录。', '令牌过期，请续签令牌。', '请先登录')
+
+
+def _is_rejected(response, response_json=None):
+    """
+    判断卖家精灵是否因登录状态拒绝请求 (401/403、跳转登录页、登录失效的错误码)
+    :param response: requests 响应
+    :param response_json: 已解析的响应 JSON
+    """
+    if response.status_code in (401, 403):
+        return True
+    if 'login' in response.url:
+        return True
+    if isinstance(response_json, dict):
+        return response_json.get('code') in _AUTH_FAILED_CODES \
+            or response_json.get('message') in _AUTH_FAILED_MESSAGES
+    return False
+
+
+def fetch_amazon_selection_data(cookie: str, params: Dict[str, Any], raise_on_reject=False) -> List[Dict[str, Any]]:
     """
     读取亚马逊选品JSON数据
     :param cookie: heders cookie
     :param params: 请求 body
+    :param raise_on_reject: cookie 被拒绝时抛出 SellerSpriteRejected，由调用方重新登录
     :return: 数据列表
     """
     session: requests.Session = requests.session()
@@ -650,14 +692,20 @@ def fetch_amazon_selection_data(cookie: str, params: Dict[str, Any]) -> List[Dic
     for _ in range(3):
         try:
             response = session.post(url=baseurl, headers=headers, json=params, timeout=20)
+            if raise_on_reject and _is_rejected(response):
+                raise SellerSpriteRejected(f'HTTP {response.status_code}')
             response.raise_for_status()
             response_json = response.json()
+            if raise_on_reject and _is_rejected(response, response_json):
+                raise SellerSpriteRejected(response_json.get('message') or response_json.get('code'))
             data = response_json.get('data')
             if not data:
                 continue
             if not data.get('items'):
                 continue
             return data.get('items')
+        except SellerSpriteRejected:
+            raise
         except Exception as e:
             logger.error(f"获取JSON数据失败: {e}")
     return []
@@ -686,54 +734,75 @@ def _sellersprite_headers(token=None, cookie=None):
     return headers
 
 
-def _read_user():
-    """
-    随机 获取用户
-    :return:
-    """
-
-    with open(os.path.join(os.getcwd(), 'config\\users.txt'), 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    user = random.choice(lines).strip()
-    return {
-        'username': user.split(',')[0],
-        'password': user.split(',')[1]
-    }
-
-
-def fetch_amazon_detailed_data(token: str, asins: str, site: str, t=False) -> Dict[str, Any]:
+def fetch_amazon_detailed_data(token: str, asins: str, site: str, t=False, use_cache=True) -> Dict[str, Any]:
     """
     详细 itme 数据获取
     :param token: 卖家精灵身份令牌
     :param asins: 产生 asins 逗号分割
     :param site: 站点
     :param t: 是否为内容数据 默认否
+    :param use_cache: 是否使用本地缓存 (只请求缓存未命中的 asin)
     :return:
+    :raises SellerSpriteAccountUnavailable: 账号被限流或配额用完，由调用方换账号重试
     """
+    # todo 先查本地缓存，只请求未命中的 asin
+    endpoint = 'quick-view' if t else 'competitor-lookup'
+    cached = {}
+    if use_cache:
+        asinList = [a for a in asins.split(',') if a]
+        cached = lookup_cache.get_many(site, endpoint, asinList)
+        if cached:
+            misses = [a for a in asinList if a not in cached]
+            logger.info(f"缓存命中 {len(cached)} 个 asin，需请求 {len(misses)} 个")
+            if not misses:
+                return {
+                    'token': token,
+                    'data': list(cached.values()),
+                }
+            asins = ','.join(misses)
     tk = export_tk(asins)
     session: requests.Session = requests.Session()
 
     def re_data(u, k, p):
+        nonlocal token
         response = session.get(url=u, headers=_sellersprite_headers(token=k), params=p, timeout=20)
+        account_pool.record_request(token_manager.owner(k))
         time.sleep(random.uniform(2, 5))
         response.raise_for_status()
         data = response.json()
         message = ['令牌过期，请退出再重新登录。', '抱歉，目前您使用过于频繁，请验证后再使用。', '令牌过期，请续签令牌。']
+
+        def check_account(d, key):
+            """限流 / 配额用完: 标记账号后交给调用方换一个账号重新占用 (占用计数由账号池维护)"""
+            if d.get('message') == message[1]:
+                owner = token_manager.owner(key)
+                account_pool.mark_rate_limited(owner)
+                raise SellerSpriteAccountUnavailable(owner, '使用过于频繁')
+            if d.get('message') in _QUOTA_MESSAGES:
+                owner = token_manager.owner(key)
+                account_pool.mark_exhausted(owner)
+                raise SellerSpriteAccountUnavailable(owner, '当日配额已用完')
+
+        check_account(data, k)
         # todo 处理令牌过期情况
         if data.get('message') in message:
             logger.warning('令牌失效，尝试刷新令牌')
-            user = _read_user()
-            k = export_token(user.get('username'), user.get('password'))
-            if token != '4480':
+            # todo 多线程同时失效时只会登录一次
+            k = token_manager.refresh(k)
+            user = token_manager.owner(k)
+            if k != FAILED_TOKEN:
+                token = k
                 try:
                     new_response = session.get(url=u, headers=_sellersprite_headers(token=k), timeout=20,
                                                params=p)
+                    account_pool.record_request(user)
                     time.sleep(random.uniform(2, 5))
                     new_response.raise_for_status()
                     data = new_response.json()
                 except Exception as e:
                     logger.error(f"刷新令牌请求失败: {e}")
                     raise Exception(f'令牌刷新失败，请检查账号状态！{user}')
+            check_account(data, k)
         reData = data.get('data')
         if not reData:
             raise Exception("无效数据！")
@@ -762,24 +831,30 @@ def fetch_amazon_detailed_data(token: str, asins: str, site: str, t=False) -> Di
             try:
                 items = re_data(u=baseurl, k=token, p=params)
                 logger.info(f"请求asin: {asins} 成功！")
+                if use_cache:
+                    lookup_cache.put_many(site, endpoint, items)
                 return {
                     'token': token,
-                    'data': items
+                    'data': list(cached.values()) + items
                 }
+            except SellerSpriteAccountUnavailable:
+                raise
             except Exception as e:
                 logger.error(f'请求数据失败: {e} 正在重试 asins: {asins}')
                 if i == 2:
                     raise Exception('多次请求失败!')
         return {
             'token': token,
-            'data': [],
+            'data': list(cached.values()),
         }
 
+    except SellerSpriteAccountUnavailable:
+        raise
     except Exception as e:
         logger.error(f"请求asin: {asins} 时出错: {e}")
         return {
             'token': token,
-            'data': [],
+            'data': list(cached.values()),
             'message': str(e)
         }
 
@@ -797,17 +872,60 @@ def merge_json(left: dict, right: dict) -> dict:
 
 def merge_list_of_dicts(left: List[Dict[str, Any]], right: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    列表字典合并数据
+    列表字典合并数据 (左连接，右侧非 None 的值覆盖左侧)
     :param left: 列表 Json
     :param right: 列表 Json
     :return:
     """
+    return merge_records(left, right, how='left', policy='non_none')
+
+
+def merge_records(left: List[Dict[str, Any]], right: List[Dict[str, Any]], how: str = 'left',
+                  policy: str = 'non_none', key: str = 'asin') -> List[Dict[str, Any]]:
+    """
+    按 key 哈希连接两组记录，右侧只建一次索引，O(len(left) + len(right))
+    左侧记录原地更新；同一 key 在右侧出现多次时按顺序依次合并，左侧重复的 key 每条都会合并；
+    key 为 None 的记录不参与匹配
+    :param left: 列表 Json
+    :param right: 列表 Json
+    :param how: left 左连接 / inner 内连接 / outer 全连接 (右侧未匹配的记录追加在末尾)
+    :param policy: non_none 右侧非 None 的值覆盖左侧 / left_wins 左侧已有的字段不更新 (merge_json)
+    :param key: 连接字段
+    :return: 合并后的列表
+    """
+    if how not in ('left', 'inner', 'outer'):
+        raise ValueError(f'不支持的连接方式: {how}')
+    if policy == 'non_none':
+        merge = lambda l, r: l.update({k: v for k, v in r.items() if v is not None})
+    elif policy == 'left_wins':
+        merge = merge_json
+    else:
+        raise ValueError(f'不支持的合并策略: {policy}')
+
+    # todo 1. 右侧建索引
+    index = {}
+    for item_right in right:
+        k = item_right.get(key)
+        if k is not None:
+            index.setdefault(k, []).append(item_right)
+
+    # todo 2. 遍历左侧探测索引
     new_list = []
+    matched = set()
     for item_left in left:
-        for item_right in right:
-            if item_left.get('asin') == item_right.get('asin'):
-                item_left.update({k: v for k, v in item_right.items() if v is not None})
-        new_list.append(item_left)
+        k = item_left.get(key)
+        rights = index.get(k) if k is not None else None
+        if rights:
+            matched.add(k)
+            for item_right in rights:
+                merge(item_left, item_right)
+            new_list.append(item_left)
+        elif how != 'inner':
+            new_list.append(item_left)
+
+    # todo 3. 全连接追加右侧未匹配的记录
+    if how == 'outer':
+        new_list.extend(r for r in right if r.get(key) is None or r.get(key) not in matched)
     return new_list
 
 def process_intercepted_data(data):
@@ -932,7 +1050,7 @@ def fetch_amazon_similar_products(origin, image_url, max_retries=3):
     driver = webdriver.Edge(options=_get_browser_options())
     try:
         # todo 钩子提前注入，收集 url+body
-        with open(os.path.join(os.getcwd(), 'js\\selenium_hook.js'), 'r', encoding='utf-8') as f:
+        with open(os.path.join(os.getcwd(), 'js', 'selenium_hook.js'), 'r', encoding='utf-8') as f:
             js_hook = f.read()
         driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': js_hook})
         # todo 访问页面
@@ -961,24 +1079,12 @@ def update_ranks_sequentially(data_list):
     return data_list
 
 def update_database_items(items):
-    newItems = []
-    for item in items:
-        newItem = {}
-        keys_to_delete = [
-            'asin', 'image', 'rank', 'title', 'rating',
-            'reviewCount', 'current_price', 'discount_percentage',
-            'original_price', 'material', 'similarList', 'aliexpress',
-            'description'
-        ]
-        # 1. 先添加要保留的独立字段
-        for key in keys_to_delete:
-            if key in item:
-                newItem[key] = item[key]
-            else:
-                newItem[key] = None  # 或者设置默认值
-        newItem['item'] = json.dumps({k: v for k, v in item.items() if k not in keys_to_delete})
-        newItems.append(newItem)
-    return newItems
+    """
+    转换为 MySQL 行: 核心字段独立成列，其余字段存入 item (JSON)
+    :param items: 管道中的 items
+    :return: MySQL 行列表
+    """
+    return [ProductRecord.from_item(item).to_mysql_row() for item in items]
 
 
 def click_to_operate(driver, image_url):